@@ -4,22 +4,86 @@
 #
 # SPDX-License-Identifier: BSD-3-Clause
 
+import os
+
 import reframe as rfm
 import reframe.utility.sanity as sn
 
+import fasrclib.hooks as hooks
+
+
 @rfm.simple_test
-class AllocSpeedTest(rfm.RegressionTest):
-    hugepages = parameter(['no', '2M'])
+class AllocSpeedTest(rfm.RegressionTest, hooks.Benchmark):
+    '''Time to allocate and first touch 1 MB to 4096 MB.
+
+    ``hugepages`` selects plain ``malloc`` (``no``), transparent huge pages
+    via ``madvise`` (``thp``) or explicit huge pages of 2 MB or 1 GB from
+    the hugetlbfs pool, which must be large enough for 4096 MB; the latter
+    are skipped on nodes without a pool of their page size. With
+    ``populate`` the pages are faulted in by ``mmap`` itself, or by
+    ``madvise`` after the huge page advice for ``thp``.
+    '''
+
+    hugepages = parameter(['no', 'thp', '2M', '1G'])
+    populate = parameter([False, True])
     sourcepath = 'alloc_speed.cpp'
     build_system = 'SingleSource'
     valid_systems = ['cannon:local','cannon:local-gpu','cannon:test','fasse:login','fasse:fasse','test:login','test:rc-testing','arm:local']
     valid_prog_environs = ['*']
     time_limit = '10m'
 
+    sizes = [2**i for i in range(13)]
+
     @run_after('init')
     def set_descr(self):
         self.descr = (f'Time to allocate 4096 MB using {self.hugepages} '
                       f'hugepages')
+        if self.populate:
+            self.descr += ' and MAP_POPULATE'
+
+    @run_after('init')
+    def skip_populate_malloc(self):
+        # malloc has no populate option
+        self.skip_if(self.hugepages == 'no' and self.populate,
+                     'MAP_POPULATE does not apply to malloc')
+
+    @run_before('run')
+    def set_executable_opts(self):
+        mode = {'no': 'malloc'}.get(self.hugepages, self.hugepages)
+        self.executable_opts = [mode]
+        if self.populate:
+            self.executable_opts.append('populate')
+
+    @run_before('run')
+    def report_hugetlb_pool(self):
+        if self.hugepages not in ('2M', '1G'):
+            return
+
+        kb = {'2M': 2048, '1G': 1048576}[self.hugepages]
+        pool = f'/sys/kernel/mm/hugepages/hugepages-{kb}kB/nr_hugepages'
+        self.prerun_cmds = [
+            f'echo "hugetlbfs pool: $(cat {pool} 2>/dev/null || echo 0) '
+            f'pages"'
+        ]
+
+    @run_before('sanity')
+    def skip_without_hugetlb_pool(self):
+        if self.hugepages not in ('2M', '1G'):
+            return
+
+        # Hooks run outside the stage directory
+        stdout = os.path.join(self.stagedir, self.stdout.evaluate())
+        pages = sn.evaluate(sn.extractsingle(r'^hugetlbfs pool: (\d+) pages',
+                                             stdout, 1, int))
+        self.skip_if(pages == 0,
+                     f'no hugetlbfs pool of {self.hugepages} pages')
+
+    @run_before('performance')
+    def set_size_perf_variables(self):
+        for mb in self.sizes:
+            self.perf_variables[f'time_{mb}MB'] = sn.make_performance_function(
+                sn.extractsingle(rf'^{mb} MB, allocation time (?P<time>\S+)',
+                                 self.stdout, 'time', float), 's')
 
     @run_before('compile')
     def set_cxxflags(self):
@@ -27,7 +91,14 @@ class AllocSpeedTest(rfm.RegressionTest):
 
     @sanity_function
     def assert_4GB(self):
-        return sn.assert_found('4096 MB', self.stdout)
+        return sn.all([
+            sn.assert_not_found(r'allocation failed', self.stdout,
+                                msg='allocation failed; is the hugetlbfs '
+                                    'pool large enough?'),
+            sn.assert_eq(sn.count(sn.findall(r'allocation time',
+                                             self.stdout)),
+                         len(self.sizes))
+        ])
 
     @run_before('performance')
     def set_reference(self):
@@ -73,7 +144,8 @@ class AllocSpeedTest(rfm.RegressionTest):
                 }
             },
         }
-        self.reference = sys_reference[self.hugepages]
+        self.reference = sys_reference.get(self.hugepages,
+                                           {'*': {'time': (0, None, None, 's')}})
 
     @performance_function('s')
     def time(self):
@@ -1,6 +1,89 @@
 #include <chrono>
+#include <cstring>
 #include <iostream>
 #include <algorithm>
+#include <string>
+
+#include <errno.h>
+#include <sys/mman.h>
+
+#ifndef MAP_HUGE_SHIFT
+#define MAP_HUGE_SHIFT 26
+#endif
+
+#ifndef MAP_HUGE_2MB
+#define MAP_HUGE_2MB (21 << MAP_HUGE_SHIFT)
+#endif
+
+#ifndef MAP_HUGE_1GB
+#define MAP_HUGE_1GB (30 << MAP_HUGE_SHIFT)
+#endif
+
+#ifndef MADV_POPULATE_WRITE
+#define MADV_POPULATE_WRITE 23
+#endif
+
+/* how the memory is allocated:
+   malloc: plain malloc (default)
+   thp:    anonymous mmap with madvise(MADV_HUGEPAGE)
+   2M, 1G: mmap from the hugetlbfs pool of that page size */
+std::string mode = "malloc";
+bool populate = false;
+
+size_t mapped_size(size_t n)
+{
+    size_t page = 4096;
+    if (mode == "2M")
+        page = 1L << 21;
+    else if (mode == "1G")
+        page = 1L << 30;
+
+    return (n + page - 1) / page * page;
+}
+
+char* allocate(size_t n)
+{
+    if (mode == "malloc")
+        return (char*)std::malloc(n);
+
+    /* transparent huge pages are populated after the madvise, otherwise
+       the pages are faulted in as 4K pages */
+    int flags = MAP_PRIVATE | MAP_ANONYMOUS;
+    if (populate && mode != "thp")
+        flags |= MAP_POPULATE;
+
+    if (mode == "2M")
+        flags |= MAP_HUGETLB | MAP_HUGE_2MB;
+    else if (mode == "1G")
+        flags |= MAP_HUGETLB | MAP_HUGE_1GB;
+
+    void* ptr = mmap(nullptr, mapped_size(n), PROT_READ | PROT_WRITE, flags,
+                     -1, 0);
+    if (ptr == MAP_FAILED)
+        return nullptr;
+
+    if (mode == "thp")
+    {
+        madvise(ptr, mapped_size(n), MADV_HUGEPAGE);
+        if (populate &&
+            madvise(ptr, mapped_size(n), MADV_POPULATE_WRITE) != 0)
+        {
+            /* kernels before 5.14: touch every page */
+            for (size_t i = 0; i < n; i += 4096)
+                ((volatile char*)ptr)[i] = 0;
+        }
+    }
+
+    return (char*)ptr;
+}
+
+void deallocate(char* ptr, size_t n)
+{
+    if (mode == "malloc")
+        std::free(ptr);
+    else
+        munmap(ptr, mapped_size(n));
+}
 
 double test_alloc(size_t n, char c)
 {
@@ -9,7 +92,10 @@ double test_alloc(size_t n, char c)
     /* memory is allocated using "malloc" since
        "std::unique_ptr<char[]> ptr(new char[n])"
        also creates the objects via "new[]" */
-    char* ptr = (char*)std::malloc(n);
+    char* ptr = allocate(n);
+    if (ptr == nullptr)
+        return -1;
+
     std::fill(ptr, ptr + n, c);
     auto t1 = std::chrono::high_resolution_clock::now();
 
@@ -25,16 +111,35 @@ double test_alloc(size_t n, char c)
     /* prevent compiler optimizations */
     t_fill += static_cast<double>(*ptr);
 
-    std::free(ptr);
+    deallocate(ptr, n);
 
     return t_alloc_fill - t_fill;
 }
 
 int main(int argc, char** argv)
 {
+    for (int iarg = 1; iarg < argc; ++iarg)
+    {
+        std::string arg = argv[iarg];
+        if (arg == "populate")
+            populate = true;
+        else if (arg == "malloc" || arg == "thp" || arg == "2M" || arg == "1G")
+            mode = arg;
+        else
+        {
+            std::cout << "Usage: alloc_speed [malloc|thp|2M|1G] [populate]\n";
+            return 1;
+        }
+    }
+
     for (size_t i = 20; i < 33; ++i)
     {
-        std::cout << (1L << i) / static_cast<double>(1024.0*1024.0) << " MB, allocation time " << test_alloc(1L << i, 0) << " sec.\n";
+        double t = test_alloc(1L << i, 0);
+        std::cout << (1L << i) / static_cast<double>(1024.0*1024.0) << " MB, ";
+        if (t < 0)
+            std::cout << "allocation failed: " << std::strerror(errno) << "\n";
+        else
+            std::cout << "allocation time " << t << " sec.\n";
     }
 
     return 0;
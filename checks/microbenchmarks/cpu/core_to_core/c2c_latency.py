@@ -0,0 +1,96 @@
+# Copyright 2021 FAS Research Computing Harvard University
+# ReFrame Project Developers. See the top-level LICENSE file for details.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+import os
+import statistics
+
+import reframe as rfm
+import reframe.utility.sanity as sn
+from reframe.core.backends import getlauncher
+
+import fasrclib.hooks as hooks
+import fasrclib.topology as topology
+
+
+@rfm.simple_test
+class CoreToCoreLatencyTest(rfm.RegressionTest, hooks.Benchmark):
+    '''Cache line transfer latency between every pair of cores.
+
+    One hardware thread of every core takes part. The pairs are grouped by
+    whether the two cores share the last-level cache (``intra_ccx``), only
+    the socket (``intra_socket``) or nothing (``cross_socket``), and the
+    median latency of every group present on the node is reported. The full
+    matrix is kept as ``c2c_matrix.csv``.
+    '''
+
+    def __init__(self):
+        self.descr = 'Core-to-core latency matrix'
+        self.sourcepath = 'c2c_latency.cpp'
+        self.build_system = 'SingleSource'
+        self.valid_systems = ['cannon:local','cannon:local-gpu','cannon:test','fasse:login','fasse:fasse','test:login','test:rc-testing','arm:local']
+        self.valid_prog_environs = ['*']
+        self.build_system.cxxflags = ['-std=c++11','-pthread','-O3']
+        self.num_tasks = 1
+        self.num_tasks_per_node = 1
+        self.exclusive_access = True
+        self.time_limit = '20m'
+        self.prerun_cmds = [
+            # One hardware thread per core
+            "cpus=$(lscpu -p=CPU,CORE | grep -v '^#' | sort -t, -k2,2n -u | "
+            "cut -d, -f1 | sort -n)"
+        ]
+        self.executable_opts = ['-o', 'c2c_matrix.csv', '$cpus']
+        self.keep_files = ['c2c_matrix.csv']
+        self.perf_patterns = {}
+        self.reference = {}
+
+    @run_after('setup')
+    def set_num_cpus(self):
+        self.num_cpus_per_task = topology.load(
+            self.current_partition).num_cores
+
+    @run_before('run')
+    def set_launcher(self):
+        # The program pins its threads to every core of the node itself
+        self.job.launcher = getlauncher('local')()
+
+    @run_before('run')
+    def set_memory_limit(self):
+        self.job.options = ['--mem=1G']
+
+    @sanity_function
+    def eval_sanity(self):
+        cpus = {
+            cpu: (socket, llc) for cpu, socket, llc in sn.evaluate(
+                sn.extractall(r'^cpu (\d+) socket (\d+) llc (-?\d+)',
+                              self.stdout, [1, 2, 3], int))
+        }
+        pairs = sn.evaluate(sn.extractall(
+            r'^latency \(ns\) between cpu (\d+) and cpu (\d+): (\S+)',
+            self.stdout, [1, 2, 3], [int, int, float]))
+        groups = {}
+        for a, b, latency in pairs:
+            if cpus[a][0] != cpus[b][0]:
+                group = 'cross_socket'
+            elif cpus[a][1] == cpus[b][1] and cpus[a][1] >= 0:
+                group = 'intra_ccx'
+            else:
+                group = 'intra_socket'
+
+            groups.setdefault(group, []).append(latency)
+
+        partname = self.current_partition.fullname
+        for group, latencies in groups.items():
+            var = f'latency_{group}'
+            self.perf_patterns[var] = sn.defer(statistics.median(latencies))
+            self.reference[f'{partname}:{var}'] = (0, None, None, 'ns')
+
+        num_cpus = len(cpus)
+        return sn.all([
+            sn.assert_gt(num_cpus, 1, msg='found less than two cores'),
+            sn.assert_eq(len(pairs), num_cpus * (num_cpus - 1) // 2),
+            sn.assert_true(os.path.exists(
+                os.path.join(self.stagedir, 'c2c_matrix.csv')))
+        ])
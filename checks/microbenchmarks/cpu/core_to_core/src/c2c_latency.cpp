@@ -0,0 +1,171 @@
+// Core-to-core cache line transfer latency
+//
+// Two threads pinned to different cores pass a counter in a single cache
+// line back and forth; half of the round trip time is the one-way latency
+// of moving the line between the two cores.
+
+#include <atomic>
+#include <chrono>
+#include <fstream>
+#include <iostream>
+#include <string>
+#include <thread>
+#include <vector>
+#include <algorithm>
+
+#include <sched.h>
+#include <pthread.h>
+
+#ifndef CACHELINESIZE
+#define CACHELINESIZE 64
+#endif
+
+struct alignas(CACHELINESIZE) Line
+{
+    std::atomic<long> value;
+    char padding[CACHELINESIZE - sizeof(std::atomic<long>)];
+};
+
+void set_affinity(pthread_t t, int i)
+{
+    cpu_set_t cpuset;
+    CPU_ZERO(&cpuset);
+    CPU_SET(i, &cpuset);
+    int rc = pthread_setaffinity_np(t, sizeof(cpu_set_t), &cpuset);
+    if (rc != 0)
+        std::cerr << "Error calling pthread_setaffinity_np: " << rc << "\n";
+}
+
+long read_sysfs(std::string const& path, long fallback)
+{
+    std::ifstream f(path);
+    long ret;
+    if (f >> ret)
+        return ret;
+
+    return fallback;
+}
+
+// id of the last-level cache of a cpu, or -1 if unknown
+long llc_id(int cpu)
+{
+    std::string base = "/sys/devices/system/cpu/cpu" + std::to_string(cpu)
+                       + "/cache/index";
+    long id = -1, level = -1;
+    for (int i = 0; ; ++i)
+    {
+        long l = read_sysfs(base + std::to_string(i) + "/level", -1);
+        if (l < 0)
+            break;
+
+        if (l > level)
+        {
+            level = l;
+            id = read_sysfs(base + std::to_string(i) + "/id", -1);
+        }
+    }
+
+    return id;
+}
+
+// one-way latency in ns between cpus a and b
+double pingpong(int a, int b, long iterations)
+{
+    Line line;
+    line.value = 0;
+    std::atomic<int> ready(0);
+
+    std::thread pong([&]() {
+        set_affinity(pthread_self(), b);
+        ready++;
+        for (long i = 0; i < iterations; ++i)
+        {
+            while (line.value.load(std::memory_order_acquire) != 2*i + 1)
+                ;
+            line.value.store(2*i + 2, std::memory_order_release);
+        }
+    });
+
+    set_affinity(pthread_self(), a);
+    while (ready.load() == 0)
+        ;
+
+    auto t0 = std::chrono::high_resolution_clock::now();
+    for (long i = 0; i < iterations; ++i)
+    {
+        line.value.store(2*i + 1, std::memory_order_release);
+        while (line.value.load(std::memory_order_acquire) != 2*i + 2)
+            ;
+    }
+    auto t1 = std::chrono::high_resolution_clock::now();
+    pong.join();
+
+    std::chrono::duration<double> elapsed = t1 - t0;
+    return elapsed.count() / iterations / 2 * 1e9;
+}
+
+int main(int argc, char ** argv)
+{
+    long iterations = 10000;
+    int repeats = 5;
+    std::string matrix_file = "c2c_matrix.csv";
+    std::vector<int> cpus;
+    for (int iarg = 1; iarg < argc; ++iarg)
+    {
+        std::string arg = argv[iarg];
+        if (arg == "-n" && iarg + 1 < argc)
+            iterations = std::stol(argv[++iarg]);
+        else if (arg == "-o" && iarg + 1 < argc)
+            matrix_file = argv[++iarg];
+        else
+            cpus.push_back(std::stoi(arg));
+    }
+
+    if (cpus.size() < 2)
+    {
+        std::cout << "Measure the cache line transfer latency between every "
+                  << "pair of cpus" << std::endl;
+        std::cout << "Usage: c2c_latency [-n iterations] [-o matrix.csv] "
+                  << "<cpu> <cpu> [<cpu> ...]" << std::endl;
+        return 1;
+    }
+
+    for (int cpu: cpus)
+    {
+        std::string base = "/sys/devices/system/cpu/cpu"
+                           + std::to_string(cpu) + "/topology/";
+        std::cout << "cpu " << cpu
+                  << " socket " << read_sysfs(base + "physical_package_id", 0)
+                  << " llc " << llc_id(cpu) << std::endl;
+    }
+
+    size_t n = cpus.size();
+    std::vector<double> matrix(n*n, 0.0);
+    for (size_t i = 0; i < n; ++i)
+        for (size_t j = i + 1; j < n; ++j)
+        {
+            // best of a few repetitions, to filter out interrupts
+            double best = pingpong(cpus[i], cpus[j], iterations);
+            for (int r = 1; r < repeats; ++r)
+                best = std::min(best, pingpong(cpus[i], cpus[j], iterations));
+
+            matrix[i*n + j] = matrix[j*n + i] = best;
+            std::cout << "latency (ns) between cpu " << cpus[i] << " and cpu "
+                      << cpus[j] << ": " << best << std::endl;
+        }
+
+    std::ofstream out(matrix_file);
+    out << "cpu";
+    for (int cpu: cpus)
+        out << "," << cpu;
+
+    out << "\n";
+    for (size_t i = 0; i < n; ++i)
+    {
+        out << cpus[i];
+        for (size_t j = 0; j < n; ++j)
+            out << "," << matrix[i*n + j];
+
+        out << "\n";
+    }
+}
@@ -6,10 +6,18 @@
 
 import reframe as rfm
 import reframe.utility.sanity as sn
+from reframe.core.backends import getlauncher
+
+import fasrclib.hooks as hooks
+import fasrclib.nodeinfo as nodeinfo
+import fasrclib.peak as peak
+import fasrclib.references as references
+import fasrclib.topology as topology
 
 
 @rfm.simple_test
-class DGEMMTest(rfm.RegressionTest):
+class DGEMMTest(rfm.RegressionTest, hooks.SizedJob, hooks.NodeFingerprint,
+                hooks.CachedBuild):
     def __init__(self):
         self.descr = 'DGEMM performance test'
         self.sourcepath = 'dgemm.c'
@@ -49,17 +57,8 @@ class DGEMMTest(rfm.RegressionTest):
 
     @run_before('run')
     def set_tasks(self):
-        if self.current_partition.fullname in ['test:rc-testing']:
-            self.num_cpus_per_task = 32
-        elif self.current_partition.fullname in ['cannon:local','cannon:test', 'fasse:fasse']:
-            self.num_cpus_per_task = 48
-        else:
-            self.num_cpus_per_task = 32
-
-        if self.num_cpus_per_task:
-            self.env_vars = {
-                'OMP_NUM_THREADS': str(self.num_cpus_per_task)
-            }
+        topology.apply(self, 'compute')
+
     def set_memory_limit(self):
         self.job.options = ['--mem-per-cpu=3G']
 
@@ -74,14 +73,148 @@ class DGEMMTest(rfm.RegressionTest):
         sn.evaluate(sn.assert_eq(num_tested_nodes, self.job.num_tasks,
                                  msg=failure_msg))
 
+        # The performance variables are the hostnames, and so are the
+        # variables of the calibrated references
+        calibrated = references.lookup(self)
         for hostname in all_tested_nodes:
             partition_name = self.current_partition.fullname
             ref_name = '%s:%s' % (partition_name, hostname)
-            self.reference[ref_name] = self.sys_reference.get(
-                partition_name, (0.0, None, None, 'Gflop/s')
+            self.reference[ref_name] = calibrated.get(
+                hostname, self.sys_reference.get(
+                    partition_name, (0.0, None, None, 'Gflop/s')
+                )
             )
             self.perf_patterns[hostname] = sn.extractsingle(
                 r'%s:\s+Avg\. performance\s+:\s+(?P<gflops>\S+)'
                 r'\sGflop/s' % hostname, self.stdout, 'gflops', float)
 
         return True
+
+
+@rfm.simple_test
+class DGEMMSweepTest(rfm.RegressionTest, hooks.Benchmark):
+    '''DGEMM over a sweep of square matrix sizes and thread counts, as a
+    percentage of the theoretical peak of the node.
+
+    The peak is computed from the cores, the widest FMA instruction set and
+    the all-core frequency sampled during the runs on all cores (see
+    :mod:`fasrclib.peak`); set ``frequency`` (GHz), ``fma_units`` (per
+    core) or ``flops_per_cycle`` where the detection is off. The plateau is the best performance on all
+    cores over the sizes and ``efficiency`` its percentage of the peak,
+    which unlike Gflop/s has the same reference on every node type. The
+    efficiency at every thread count is relative to the peak of as many
+    cores at the all-core frequency, so it may exceed 100% where a few
+    cores turbo higher.
+    '''
+
+    frequency = variable(float, type(None), value=None)
+    flops_per_cycle = variable(int, type(None), value=None)
+    fma_units = variable(int, type(None), value=None)
+
+    def __init__(self):
+        self.descr = 'DGEMM size and thread sweep'
+        self.sourcepath = 'dgemm.c'
+        self.modules = ['intel-mkl']
+        self.valid_systems = ['cannon:local','cannon:local-gpu','cannon:test','fasse:fasse','test:rc-testing']
+        self.valid_prog_environs = ['intel']
+        self.num_tasks = 1
+        self.num_tasks_per_node = 1
+        self.exclusive_access = True
+        self.time_limit = '30m'
+        self.use_multithreading = False
+        self.build_system = 'SingleSource'
+        self.build_system.cppflags = ['-DMKL_ILP64', '-I${MKLROOT}/include']
+        self.build_system.cflags = ['-O3', '-qopenmp']
+        self.build_system.ldflags = [
+            '-qmkl', '-static-intel', '-liomp5', '-lpthread', '-lm', '-ldl'
+        ]
+        self.sizes = [1024, 2048, 4096, 6144, 8192]
+        self.loop_count = 3
+        self.keep_files = [peak.FREQUENCY_FILE]
+        self.perf_patterns = {}
+        self.efficiency_reference = (75, -0.2, None, '%')
+
+    @run_after('setup')
+    def set_threads(self):
+        topo = topology.load(self.current_partition)
+        self.threads = topology.thread_sweep(topo)
+        self.num_cpus_per_task = topo.num_cores
+        self.env_vars = {
+            'OMP_PLACES': 'cores',
+            'OMP_PROC_BIND': 'close'
+        }
+
+    @run_before('run')
+    def set_executable(self):
+        # The sweep runs in the job script, on the node itself; the
+        # frequency is sampled while all cores are busy
+        self.job.launcher = getlauncher('local')()
+        sweep = (
+            f'for s in {" ".join(str(s) for s in self.sizes)}; do '
+            f'{self.executable} $s $s $s {self.loop_count} | '
+            'sed "s/^/threads=$OMP_NUM_THREADS size=$s: /"; done'
+        )
+        cmds = []
+        for n in self.threads:
+            if n == self.threads[-1]:
+                cmds += [peak.sample_frequency_cmd(),
+                         f'export OMP_NUM_THREADS={n}', sweep,
+                         peak.stop_sampling_cmd()]
+            else:
+                cmds += [f'export OMP_NUM_THREADS={n}', sweep]
+
+        self.executable = '; '.join(cmds)
+
+    @run_before('run')
+    def set_memory_limit(self):
+        self.job.options = ['--mem=4G']
+
+    @sanity_function
+    def eval_sanity(self):
+        def gflops(n, s):
+            return sn.extractsingle(
+                rf'^threads={n} size={s}: \S+:\s+Avg\. performance\s+:'
+                rf'\s+(?P<gflops>\S+)', self.stdout, 'gflops', float)
+
+        info = nodeinfo.load(self)
+        ghz = (self.frequency or peak.sustained_frequency(self.stagedir) or
+               peak.max_frequency(info))
+        num_cores = peak.num_cores(info) or self.num_cpus_per_task
+        node_peak = peak.theoretical_peak(info, ghz, num_cores,
+                                          self.flops_per_cycle,
+                                          self.fma_units)
+        num_runs = sn.count(sn.findall(r'Avg\. performance', self.stdout))
+        sn.evaluate(sn.all([
+            sn.assert_eq(num_runs, len(self.threads) * len(self.sizes)),
+            sn.assert_true(node_peak, msg='could not determine the '
+                                          'theoretical peak of the node')
+        ]))
+
+        units = {}
+        for n in self.threads:
+            for s in self.sizes:
+                self.perf_patterns[f'gflops_t{n}_s{s}'] = gflops(n, s)
+
+            best = sn.max([gflops(n, s) for s in self.sizes])
+            self.perf_patterns[f'efficiency_t{n}'] = (
+                100 * best / (node_peak * n / num_cores)
+            )
+            units[f'efficiency_t{n}'] = '%'
+
+        plateau = sn.evaluate(sn.max(
+            [gflops(self.threads[-1], s) for s in self.sizes]))
+        self.perf_patterns['plateau_gflops'] = sn.defer(plateau)
+        self.perf_patterns['plateau_size'] = sn.defer(min(
+            s for s in self.sizes
+            if sn.evaluate(gflops(self.threads[-1], s)) >= 0.95 * plateau
+        ))
+        self.perf_patterns['peak_gflops'] = sn.defer(node_peak)
+        self.perf_patterns['frequency'] = sn.defer(ghz)
+        self.perf_patterns['efficiency'] = sn.defer(100 * plateau / node_peak)
+        units.update({'plateau_size': 'N', 'frequency': 'GHz',
+                      'efficiency': '%'})
+        refs = {var: (0, None, None, units.get(var, 'Gflop/s'))
+                for var in self.perf_patterns}
+        refs['efficiency'] = self.efficiency_reference
+        self.reference = {'*': refs}
+        return True
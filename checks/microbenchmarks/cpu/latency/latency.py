@@ -6,10 +6,15 @@
 
 import reframe as rfm
 import reframe.utility.sanity as sn
+from reframe.core.backends import getlauncher
+
+import fasrclib.hooks as hooks
+import fasrclib.latency_curve as latency_curve
+import fasrclib.topology as topology
 
 
 @rfm.simple_test
-class CPULatencyTest(rfm.RegressionTest):
+class CPULatencyTest(rfm.RegressionTest, hooks.Benchmark):
     def __init__(self):
         self.sourcepath = 'latency.cpp'
         self.build_system = 'SingleSource'
@@ -86,3 +91,172 @@ class CPULatencyTest(rfm.RegressionTest):
     @deferrable
     def num_tasks_assigned(self):
         return self.job.num_tasks
+
+
+@sn.deferrable
+def cache_levels(sizes, latencies, num_levels):
+    return latency_curve.detect_levels(sizes, latencies, num_levels)
+
+
+@rfm.simple_test
+class CPULatencyCurveTest(rfm.RegressionTest, hooks.Benchmark):
+    '''Memory latency over log-spaced working sets from 4 KiB to well
+    beyond the last-level cache.
+
+    The plateaus of the curve are detected automatically, so the latency
+    and the capacity of every cache level are reported as measured on the
+    node instead of assuming fixed sizes.
+    '''
+
+    def __init__(self):
+        self.descr = 'Memory latency curve'
+        self.sourcepath = 'latency.cpp'
+        self.build_system = 'SingleSource'
+        self.valid_systems = ['cannon:local','cannon:local-gpu','cannon:test','fasse:login','fasse:fasse','test:login','test:rc-testing','arm:local']
+        self.valid_prog_environs = ['*']
+        self.num_tasks = 1
+        self.num_tasks_per_node = 1
+        self.time_limit = '20m'
+        self.build_system.cxxflags = ['-std=c++11','-lpthread','-O3']
+
+    @run_after('setup')
+    def set_sizes(self):
+        topo = topology.load(self.current_partition)
+        levels = topo.cache_levels or ['L1', 'L2', 'L3']
+        self.build_system.cppflags = [
+            f'-D{level}={topo.caches(level)[0][0]}'
+            for level in topo.cache_levels if level in ('L1', 'L2', 'L3')
+        ]
+
+        # latency.cpp takes the sizes as int
+        largest = min(max(4 * topo.llc_size, 512 * 1024**2),
+                      2**31 - 2**20)
+        self.mem_request = f'{largest // 1024**2 + 1024}M'
+        sizes = latency_curve.log_sizes(4096, largest)
+        self.executable_opts = [str(size) for size in sizes]
+
+        latencies = sn.extractall(
+            r'latency \(ns\) for input size \d+: (?P<lat>\S+)',
+            self.stdout, 'lat', float)
+        self.sanity_patterns = sn.assert_eq(sn.count(latencies), len(sizes))
+
+        detected = cache_levels(sizes, latencies, len(levels) + 1)
+        self.perf_patterns = {}
+        refs = {}
+        for i, level in enumerate(levels):
+            self.perf_patterns[f'latency{level}'] = sn.getattr(
+                sn.getitem(detected, i), 'latency')
+            self.perf_patterns[f'size{level}'] = sn.getattr(
+                sn.getitem(detected, i), 'size') / 1024
+            refs[f'latency{level}'] = (0, None, None, 'ns')
+            refs[f'size{level}'] = (0, None, None, 'KiB')
+
+        self.perf_patterns['latencyMem'] = sn.getattr(
+            sn.getitem(detected, len(levels)), 'latency')
+        refs['latencyMem'] = (0, None, None, 'ns')
+        self.reference = {'*': refs}
+
+    @run_before('run')
+    def set_memory_limit(self):
+        self.job.options = [f'--mem={self.mem_request}']
+
+
+@sn.deferrable
+def knee_bandwidth(idle, latencies, bandwidths, factor=2.0):
+    '''Return the traffic bandwidth at which the loaded latency first
+    exceeds ``factor`` times the idle latency, or the highest bandwidth
+    reached if it never does.'''
+
+    for latency, bw in zip(latencies, bandwidths):
+        if latency > factor * idle:
+            return bw
+
+    return max(bandwidths)
+
+
+@rfm.simple_test
+class CPULoadedLatencyTest(rfm.RegressionTest, hooks.Benchmark):
+    '''Memory latency while all other cores generate memory traffic.
+
+    The pointer chase runs on the first core while every other core reads
+    (or writes) its own buffer, pausing a number of delay loop iterations
+    after every cache line. The delay steps down from 5000 to 0, so every
+    step adds traffic; the loaded latency and the traffic bandwidth of
+    every step are the points of the latency-bandwidth curve. The knee of
+    the curve is reported as the bandwidth at which the latency doubles.
+    '''
+
+    traffic = parameter(['read', 'write'])
+
+    def __init__(self):
+        self.descr = 'Loaded memory latency'
+        self.sourcepath = 'latency.cpp'
+        self.build_system = 'SingleSource'
+        self.valid_systems = ['cannon:local','cannon:local-gpu','cannon:test','fasse:login','fasse:fasse','test:login','test:rc-testing','arm:local']
+        self.valid_prog_environs = ['*']
+        self.num_tasks = 1
+        self.num_tasks_per_node = 1
+        self.exclusive_access = True
+        self.time_limit = '20m'
+        self.build_system.cxxflags = ['-std=c++11','-pthread','-O3']
+        self.delays = [5000, 2000, 1000, 500, 200, 100, 50, 20, 10, 0]
+
+    @run_after('setup')
+    def set_traffic(self):
+        topo = topology.load(self.current_partition)
+        self.num_cpus_per_task = topo.num_cores
+        num_threads = max(topo.num_cores - 1, 1)
+        chase_size = min(max(4 * topo.llc_size, 512 * 1024**2),
+                         2**31 - 2**20)
+        traffic_size = max(64 * 1024**2, 4 * topo.llc_size // num_threads)
+        self.mem_request = (
+            f'{(chase_size + num_threads*traffic_size) // 1024**2 + 1024}M'
+        )
+        self.executable_opts = [
+            '-t', str(num_threads), '-b', str(traffic_size),
+            '-d', ','.join(str(d) for d in self.delays)
+        ]
+        if self.traffic == 'write':
+            self.executable_opts.append('-w')
+
+        self.executable_opts.append(str(chase_size))
+
+        idle = sn.extractsingle(
+            r'^latency \(ns\) for input size \d+: (?P<lat>\S+)',
+            self.stdout, 'lat', float)
+
+        def step(delay, group):
+            return sn.extractsingle(
+                rf'^loaded latency \(ns\) for input size \d+ and delay '
+                rf'{delay}: (?P<lat>\S+) clocks: \S+ traffic \(GB/s\): '
+                rf'(?P<bw>\S+)', self.stdout, group, float)
+
+        # Without traffic threads the loaded latency is the idle one
+        self.sanity_patterns = sn.all([
+            sn.assert_eq(
+                sn.count(sn.findall(r'^loaded latency', self.stdout)),
+                len(self.delays)),
+            *(sn.assert_gt(step(d, 'bw'), 0) for d in self.delays)
+        ])
+        self.perf_patterns = {'latency_idle': idle}
+        refs = {'latency_idle': (0, None, None, 'ns')}
+        for i, delay in enumerate(self.delays):
+            self.perf_patterns[f'latency_step{i}'] = step(delay, 'lat')
+            self.perf_patterns[f'bandwidth_step{i}'] = step(delay, 'bw')
+            refs[f'latency_step{i}'] = (0, None, None, 'ns')
+            refs[f'bandwidth_step{i}'] = (0, None, None, 'GB/s')
+
+        self.perf_patterns['knee_bandwidth'] = knee_bandwidth(
+            idle, [step(d, 'lat') for d in self.delays],
+            [step(d, 'bw') for d in self.delays])
+        refs['knee_bandwidth'] = (0, None, None, 'GB/s')
+        self.reference = {'*': refs}
+
+    @run_before('run')
+    def set_launcher(self):
+        # The program pins the traffic threads to the other cores itself
+        self.job.launcher = getlauncher('local')()
+
+    @run_before('run')
+    def set_memory_limit(self):
+        self.job.options = [f'--mem={self.mem_request}']
@@ -6,6 +6,9 @@
 #include <chrono>
 #include <random>
 
+#include <atomic>
+#include <sstream>
+#include <string>
 #include <thread>
 #include <pthread.h>
 
@@ -18,9 +21,17 @@
 #endif
 
 // only used for runtime estimation
+#ifndef L1
 #define L1 32768
+#endif
+
+#ifndef L2
 #define L2 262144
+#endif
+
+#ifndef L3
 #define L3 25600*1024
+#endif
 
 #ifndef GHZ
 #define GHZ 3.3
@@ -41,6 +52,8 @@ void convert_to_pointers(CacheLine*, std::vector<unsigned> const&);
 size_t chainload(CacheLine*, size_t reps);
 size_t estimate_reps(unsigned sz, unsigned l1, unsigned l2, unsigned l3);
 void set_affinity(pthread_t t, int i);
+int first_allowed_cpu();
+std::vector<int> allowed_cpus();
 
 template <class F, class ...Args>
 double time_function(F func, Args&& ...args)
@@ -54,24 +67,164 @@ double time_function(F func, Args&& ...args)
 }
 
 
+/**********************************************/
+
+// Memory traffic of threads pinned to the other cpus, throttled by a delay
+// loop after every cache line they touch
+class Traffic
+{
+public:
+    Traffic(int nthreads, size_t nbytes, bool write,
+            const std::vector<int>& allowed, int skip_cpu)
+        : nwords(nbytes / sizeof(size_t)), write(write), done(true)
+    {
+        for (int cpu: allowed)
+            if (cpu != skip_cpu && int(cpus.size()) < nthreads)
+                cpus.push_back(cpu);
+
+        if (int(cpus.size()) < nthreads)
+            std::cerr << "Only " << cpus.size() << " cpus available for "
+                      << nthreads << " traffic threads\n";
+
+        // first touch by the thread that generates the traffic
+        buffers.resize(cpus.size());
+        for (size_t i = 0; i < cpus.size(); ++i)
+        {
+            std::thread t([this, i]() {
+                set_affinity(pthread_self(), cpus[i]);
+                if (posix_memalign(reinterpret_cast<void**>(&buffers[i]),
+                                   PAGESIZE, nwords * sizeof(size_t)))
+                    throw std::bad_alloc();
+
+                std::fill(buffers[i], buffers[i] + nwords, 1);
+            });
+            t.join();
+        }
+    }
+
+    ~Traffic()
+    {
+        for (auto buf: buffers)
+            std::free(buf);
+    }
+
+    void start(unsigned delay)
+    {
+        done = false;
+        bytes = 0;
+        t0 = std::chrono::high_resolution_clock::now();
+        for (size_t i = 0; i < cpus.size(); ++i)
+            workers.emplace_back([this, i, delay]() {
+                set_affinity(pthread_self(), cpus[i]);
+                run(buffers[i], delay);
+            });
+    }
+
+    // stop the traffic and return its bandwidth in GB/s
+    double stop()
+    {
+        done = true;
+        for (auto& t: workers)
+            t.join();
+
+        workers.clear();
+        auto t1 = std::chrono::high_resolution_clock::now();
+        double elapsed = std::chrono::duration<double>(t1 - t0).count();
+        return double(bytes) / (1024*1024*1024) / elapsed;
+    }
+
+private:
+    void run(size_t* buf, unsigned delay)
+    {
+        const size_t step = CACHELINESIZE / sizeof(size_t);
+        size_t lines = 0, sum = 0;
+        while (!done.load(std::memory_order_relaxed))
+            for (size_t i = 0; i < nwords; i += step)
+            {
+                if (write)
+                    buf[i] = i;
+                else
+                    sum += buf[i];
+
+                for (volatile unsigned k = 0; k < delay; ++k)
+                    ;
+
+                if ((++lines & 1023) == 0 &&
+                    done.load(std::memory_order_relaxed))
+                    break;
+            }
+
+        // a written line is read for ownership and written back
+        bytes += lines * CACHELINESIZE * (write ? 2 : 1);
+        volatile size_t sink = sum;
+    }
+
+    size_t nwords;
+    bool write;
+    std::vector<int> cpus;
+    std::vector<size_t*> buffers;
+    std::vector<std::thread> workers;
+    std::atomic<bool> done;
+    std::atomic<size_t> bytes;
+    std::chrono::high_resolution_clock::time_point t0;
+};
+
+
 /**********************************************/
 
 int main(int argc, char ** argv)
 {
-    set_affinity(pthread_self(), 0);
+    // the cpus of the traffic threads, read before the affinity of the
+    // process is narrowed to the cpu of the pointer chase
+    std::vector<int> cpus = allowed_cpus();
+    int cpu = first_allowed_cpu();
+    set_affinity(pthread_self(), cpu);
     bool simulate_large_pages = false;
 
-    if (argc < 2)
+    // loaded latency
+    int traffic_threads = 0;
+    size_t traffic_bytes = 256 * 1024 * 1024;
+    bool traffic_write = false;
+    std::vector<unsigned> delays;
+
+    std::vector<unsigned> sizes;
+    for (int iarg = 1; iarg < argc; ++iarg)
+    {
+        std::string arg = argv[iarg];
+        if (arg == "-t" && iarg + 1 < argc)
+            traffic_threads = std::stoi(argv[++iarg]);
+        else if (arg == "-b" && iarg + 1 < argc)
+            traffic_bytes = std::stoull(argv[++iarg]);
+        else if (arg == "-w")
+            traffic_write = true;
+        else if (arg == "-d" && iarg + 1 < argc)
+        {
+            std::stringstream list(argv[++iarg]);
+            std::string delay;
+            while (std::getline(list, delay, ','))
+                delays.push_back(std::stoul(delay));
+        }
+        else
+            sizes.push_back(std::stoi(arg));
+    }
+
+    if (sizes.empty())
     {
         std::cout << "Measure latencies for various levels of "
                   << "the memory hierarchy (buffer sizes)" << std::endl;
-        std::cout << "Usage: latency <buffer sizes>" << std::endl;
+        std::cout << "Usage: latency [-t traffic_threads [-b bytes_per_thread]"
+                  << " [-d delay,...] [-w]] <buffer sizes>" << std::endl;
+        std::cout << "With -t, the latency is also measured while the other "
+                  << "cpus read (or write, -w) memory, pausing <delay> loop "
+                  << "iterations after every cache line" << std::endl;
     }
 
-    for (int iarg = 1; iarg < argc; ++iarg)
-    {
-        unsigned buffer_size_inp = std::stoi(argv[iarg]);
+    if (traffic_threads > 0 && delays.empty())
+        delays.push_back(0);
 
+    Traffic traffic(traffic_threads, traffic_bytes, traffic_write, cpus, cpu);
+    for (unsigned buffer_size_inp: sizes)
+    {
         unsigned buffer_size = (buffer_size_inp / PAGESIZE + 1) * PAGESIZE;
 
         unsigned group_size;
@@ -112,6 +265,20 @@ int main(int argc, char ** argv)
                   << " clocks: " << clocks << " size " << buffer_size
                   << " ngroups: " << buffer_size/group_size << std::endl;
 
+        for (unsigned delay: delays)
+        {
+            traffic.start(delay);
+            std::this_thread::sleep_for(std::chrono::milliseconds(50));
+            duration = time_function(chainload, chain, reps);
+            double bandwidth = traffic.stop();
+
+            ns_per_load = duration / reps * 1e9;
+            std::cout << "loaded latency (ns) for input size "
+                      << buffer_size_inp << " and delay " << delay << ": "
+                      << ns_per_load << " clocks: " << GHZ * ns_per_load
+                      << " traffic (GB/s): " << bandwidth << std::endl;
+        }
+
         std::free(chain);
     }
 }
@@ -239,3 +406,25 @@ void set_affinity(pthread_t t, int i)
     if (rc != 0)
         std::cerr << "Error calling pthread_setaffinity_np: " << rc << "\n";
 }
+
+
+// CPUs of the affinity mask we were started with, e.g. by numactl
+std::vector<int> allowed_cpus()
+{
+    std::vector<int> ret;
+    cpu_set_t cpuset;
+    CPU_ZERO(&cpuset);
+    if (sched_getaffinity(0, sizeof(cpu_set_t), &cpuset) == 0)
+        for (int i = 0; i < CPU_SETSIZE; ++i)
+            if (CPU_ISSET(i, &cpuset))
+                ret.push_back(i);
+
+    return ret;
+}
+
+
+int first_allowed_cpu()
+{
+    std::vector<int> cpus = allowed_cpus();
+    return cpus.empty() ? 0 : cpus[0];
+}
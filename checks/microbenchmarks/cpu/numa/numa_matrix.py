@@ -0,0 +1,166 @@
+# Copyright 2021 FAS Research Computing Harvard University
+# ReFrame Project Developers. See the top-level LICENSE file for details.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+import os
+import statistics
+
+import reframe as rfm
+import reframe.utility.sanity as sn
+from reframe.core.backends import getlauncher
+
+import fasrclib.hooks as hooks
+import fasrclib.topology as topology
+
+
+class NUMAMatrixBase(rfm.RegressionTest, hooks.Benchmark):
+    '''Run a benchmark for every pair of CPU and memory NUMA node.
+
+    The benchmark is run under ``numactl --cpunodebind=<c> --membind=<m>``
+    for every NUMA node ``c`` with CPUs and every node ``m`` with memory,
+    and every line of its output is prefixed with ``cpu=<c> mem=<m>:``.
+    Each pair is a performance variable, so that a fault of the memory
+    subsystem shows up on the NUMA node it belongs to.
+
+    Unless calibrated references are available, every pair is compared
+    against the median of the pairs of the same kind (local or remote) of
+    the same run.
+    '''
+
+    def __init__(self):
+        self.build_system = 'SingleSource'
+        self.valid_systems = ['cannon:local','cannon:local-gpu','cannon:test','fasse:login','fasse:fasse','test:login','test:rc-testing','arm:local']
+        self.num_tasks = 1
+        self.num_tasks_per_node = 1
+        self.exclusive_access = True
+        self.time_limit = '20m'
+        self.use_multithreading = False
+        self.prerun_cmds = [
+            "cpu_nodes=$(numactl --hardware | "
+            "sed -n 's/^node \\([0-9]*\\) cpus: [0-9].*/\\1/p')",
+            "mem_nodes=$(numactl --hardware | "
+            "sed -n 's/^node \\([0-9]*\\) size: [1-9].*/\\1/p')",
+            'echo "cpu nodes:" $cpu_nodes',
+            'echo "memory nodes:" $mem_nodes'
+        ]
+        self.benchmark_opts = []
+        self.perf_patterns = {}
+        self.reference = {}
+
+    @run_before('run')
+    def set_executable(self):
+        # The loop runs in the job script, on the node itself
+        self.job.launcher = getlauncher('local')()
+        cmd = ' '.join([self.executable] + self.benchmark_opts)
+        self.executable = (
+            'for c in $cpu_nodes; do for m in $mem_nodes; do '
+            f'numactl --cpunodebind=$c --membind=$m {cmd} | '
+            'sed "s/^/cpu=$c mem=$m: /"; done; done'
+        )
+
+    @run_before('run')
+    def set_memory_limit(self):
+        self.job.options = ['--mem=0']
+
+    def node_list(self, name):
+        return sn.evaluate(sn.extractsingle(rf'^{name}:(.*)$', self.stdout,
+                                            1)).split()
+
+    def eval_matrix(self, pattern, prefix, unit, lower, upper):
+        '''Set up a performance variable for every pair of NUMA nodes.
+
+        :arg pattern: regular expression extracting the result of one pair
+            from the benchmark output.
+        :returns: the number of pairs found.
+        '''
+
+        results = sn.evaluate(sn.extractall(
+            rf'^cpu=(?P<c>\d+) mem=(?P<m>\d+): {pattern}', self.stdout,
+            ['c', 'm', 'value'], [str, str, float]))
+        local = [v for c, m, v in results if c == m]
+        remote = [v for c, m, v in results if c != m]
+        partname = self.current_partition.fullname
+        for c, m, value in results:
+            var = f'{prefix}_cpu{c}_mem{m}'
+            self.perf_patterns[var] = sn.extractsingle(
+                rf'^cpu={c} mem={m}: {pattern}', self.stdout, 'value', float)
+            same = local if c == m else remote
+            self.reference[f'{partname}:{var}'] = (
+                statistics.median(same), lower, upper, unit
+            )
+
+        return len(results)
+
+
+@rfm.simple_test
+class NUMABandwidthMatrixTest(NUMAMatrixBase):
+    '''STREAM Triad bandwidth for every (CPU node, memory node) pair.'''
+
+    def __init__(self):
+        super().__init__()
+        self.descr = 'NUMA STREAM bandwidth matrix'
+        self.sourcesdir = os.path.join(os.path.dirname(__file__),
+                                       '../stream/src')
+        self.sourcepath = 'stream.c'
+        self.valid_prog_environs = ['builtin','gnu','intel']
+        self.prgenv_flags = {
+            'builtin': ['-fopenmp', '-O3'],
+            'gnu': ['-fopenmp', '-O3'],
+            'intel': ['-qopenmp', '-O3']
+        }
+
+    @run_after('setup')
+    def set_num_threads(self):
+        topo = topology.load(self.current_partition)
+        self.num_cpus_per_task = topo.num_cores
+        self.env_vars = {
+            'OMP_NUM_THREADS': str(topo.num_cores_per_numa_node),
+            'OMP_PLACES': 'cores',
+            'OMP_PROC_BIND': 'close'
+        }
+        self.build_system.cflags = self.prgenv_flags.get(
+            self.current_environ.name, ['-O3'])
+
+        # The job gets the memory of the whole node anyway
+        topology.size_stream(self)
+
+    @sanity_function
+    def eval_sanity(self):
+        num_pairs = (len(self.node_list('cpu nodes')) *
+                     len(self.node_list('memory nodes')))
+        num_found = self.eval_matrix(r'Triad:\s+(?P<value>\S+)', 'triad',
+                                     'MB/s', -0.1, None)
+        return sn.all([
+            sn.assert_gt(num_pairs, 0, msg='numactl found no NUMA nodes'),
+            sn.assert_eq(num_found, num_pairs),
+            sn.assert_eq(sn.count(sn.findall(r'Solution Validates',
+                                             self.stdout)), num_pairs)
+        ])
+
+
+@rfm.simple_test
+class NUMALatencyMatrixTest(NUMAMatrixBase):
+    '''Memory latency for every (CPU node, memory node) pair.'''
+
+    def __init__(self):
+        super().__init__()
+        self.descr = 'NUMA memory latency matrix'
+        self.sourcesdir = os.path.join(os.path.dirname(__file__),
+                                       '../latency/src')
+        self.sourcepath = 'latency.cpp'
+        self.valid_prog_environs = ['*']
+        self.build_system.cxxflags = ['-std=c++11','-lpthread','-O3']
+        self.benchmark_opts = ['500000000']
+
+    @sanity_function
+    def eval_sanity(self):
+        num_pairs = (len(self.node_list('cpu nodes')) *
+                     len(self.node_list('memory nodes')))
+        num_found = self.eval_matrix(
+            r'latency \(ns\) for input size \d+: (?P<value>\S+)', 'latency',
+            'ns', None, 0.1)
+        return sn.all([
+            sn.assert_gt(num_pairs, 0, msg='numactl found no NUMA nodes'),
+            sn.assert_eq(num_found, num_pairs)
+        ])
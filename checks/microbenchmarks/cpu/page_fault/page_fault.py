@@ -0,0 +1,85 @@
+# Copyright 2021 FAS Research Computing Harvard University
+# ReFrame Project Developers. See the top-level LICENSE file for details.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+import reframe as rfm
+import reframe.utility.sanity as sn
+from reframe.core.backends import getlauncher
+
+import fasrclib.hooks as hooks
+import fasrclib.topology as topology
+
+
+@rfm.simple_test
+class FirstTouchScalingTest(rfm.RegressionTest, hooks.Benchmark):
+    '''Page fault throughput of a parallel first touch.
+
+    Every thread first touches its own chunk of ``size_per_thread`` MB of one
+    shared mapping, one base page at a time (transparent huge pages are
+    disabled for the mapping), as a large OpenMP code does at start.
+    The threads are pinned to one hardware thread per core, so the pages are
+    placed on the NUMA node of the thread touching them. For every thread
+    count of the sweep the throughput in GB/s and the scaling efficiency,
+    i.e., the throughput relative to ``n`` times the single thread one, are
+    reported. Poor efficiency at high thread counts points to contention in
+    the kernel's memory management.
+    '''
+
+    def __init__(self):
+        self.descr = 'First touch page fault scaling'
+        self.sourcepath = 'first_touch.cpp'
+        self.build_system = 'SingleSource'
+        self.valid_systems = ['cannon:local','cannon:local-gpu','cannon:test','fasse:login','fasse:fasse','test:login','test:rc-testing','arm:local']
+        self.valid_prog_environs = ['*']
+        self.build_system.cxxflags = ['-std=c++11','-pthread','-O3']
+        self.num_tasks = 1
+        self.num_tasks_per_node = 1
+        self.exclusive_access = True
+        self.time_limit = '20m'
+        self.size_per_thread = 512
+        self.prerun_cmds = [
+            # One hardware thread per core
+            "cpus=$(lscpu -p=CPU,CORE | grep -v '^#' | sort -t, -k2,2n -u | "
+            "cut -d, -f1 | sort -n)"
+        ]
+
+    @run_after('setup')
+    def set_sweep(self):
+        topo = topology.load(self.current_partition)
+        self.threads = topology.thread_sweep(topo)
+        self.num_cpus_per_task = topo.num_cores
+        self.executable_opts = [
+            '-s', str(self.size_per_thread),
+            '-n', ','.join(str(n) for n in self.threads), '$cpus'
+        ]
+        self.mem_request = (
+            f'{self.threads[-1] * self.size_per_thread + 1024}M'
+        )
+
+        def bw(n):
+            return sn.extractsingle(
+                rf'^threads {n}: .*bandwidth (?P<bw>\S+) GB/s',
+                self.stdout, 'bw', float)
+
+        self.perf_patterns = {}
+        refs = {}
+        for n in self.threads:
+            self.perf_patterns[f'bandwidth_{n}'] = bw(n)
+            self.perf_patterns[f'efficiency_{n}'] = bw(n) / (n * bw(1))
+            refs[f'bandwidth_{n}'] = (0, None, None, 'GB/s')
+            refs[f'efficiency_{n}'] = (0, None, None, '')
+
+        self.reference = {'*': refs}
+        self.sanity_patterns = sn.assert_eq(
+            sn.count(sn.findall(r'^threads \d+: time', self.stdout)),
+            len(self.threads))
+
+    @run_before('run')
+    def set_launcher(self):
+        # The program pins its threads to the cores of the node itself
+        self.job.launcher = getlauncher('local')()
+
+    @run_before('run')
+    def set_memory_limit(self):
+        self.job.options = [f'--mem={self.mem_request}']
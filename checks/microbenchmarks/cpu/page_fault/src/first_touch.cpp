@@ -0,0 +1,151 @@
+// Page fault throughput of a parallel first touch
+//
+// Like the start of an OpenMP code, every thread first touches its own chunk
+// of one large anonymous mapping. The threads are pinned to the given cpus,
+// so with the default memory policy every chunk ends up on the NUMA node of
+// the thread touching it. Every page is written once, hence the time is
+// dominated by the page faults, including zeroing the pages in the kernel
+// and the contention on the locks of the address space. Transparent huge
+// pages are disabled for the mapping, so that every page touched is a base
+// page fault whatever the THP setting of the node.
+
+#include <atomic>
+#include <chrono>
+#include <iostream>
+#include <sstream>
+#include <string>
+#include <thread>
+#include <vector>
+#include <algorithm>
+
+#include <pthread.h>
+#include <sched.h>
+#include <unistd.h>
+#include <sys/mman.h>
+
+void set_affinity(pthread_t t, int i)
+{
+    cpu_set_t cpuset;
+    CPU_ZERO(&cpuset);
+    CPU_SET(i, &cpuset);
+    int rc = pthread_setaffinity_np(t, sizeof(cpu_set_t), &cpuset);
+    if (rc != 0)
+        std::cerr << "Error calling pthread_setaffinity_np: " << rc << "\n";
+}
+
+std::vector<int> parse_list(std::string const& s)
+{
+    std::vector<int> ret;
+    std::stringstream ss(s);
+    std::string item;
+    while (std::getline(ss, item, ','))
+        ret.push_back(std::stoi(item));
+
+    return ret;
+}
+
+// seconds for the first nthreads cpus to first touch nbytes each,
+// or a negative value if the mapping failed
+double first_touch(std::vector<int> const& cpus, int nthreads, size_t nbytes)
+{
+    size_t page = sysconf(_SC_PAGESIZE);
+    size_t total = nbytes * nthreads;
+    void* ptr = mmap(nullptr, total, PROT_READ | PROT_WRITE,
+                     MAP_PRIVATE | MAP_ANONYMOUS, -1, 0);
+    if (ptr == MAP_FAILED)
+        return -1;
+
+    // with THP, the first touch of every 2 MB would fault in a huge page
+    madvise(ptr, total, MADV_NOHUGEPAGE);
+
+    char* buffer = static_cast<char*>(ptr);
+    std::atomic<int> ready(0);
+    std::atomic<bool> go(false);
+    std::vector<double> elapsed(nthreads, 0.0);
+    std::vector<std::thread> threads;
+    for (int i = 0; i < nthreads; ++i)
+        threads.emplace_back([&, i]() {
+            set_affinity(pthread_self(), cpus[i]);
+            char* chunk = buffer + i * nbytes;
+            ready++;
+            while (!go.load())
+                ;
+
+            auto t0 = std::chrono::high_resolution_clock::now();
+            for (size_t j = 0; j < nbytes; j += page)
+                chunk[j] = 1;
+
+            auto t1 = std::chrono::high_resolution_clock::now();
+            elapsed[i] = std::chrono::duration<double>(t1 - t0).count();
+        });
+
+    while (ready.load() < nthreads)
+        ;
+
+    go = true;
+    for (auto& t: threads)
+        t.join();
+
+    munmap(ptr, total);
+
+    // the slowest thread, i.e., the time until all memory is touched
+    return *std::max_element(elapsed.begin(), elapsed.end());
+}
+
+int main(int argc, char** argv)
+{
+    size_t mbytes = 512;
+    int repeats = 3;
+    std::vector<int> counts;
+    std::vector<int> cpus;
+    for (int iarg = 1; iarg < argc; ++iarg)
+    {
+        std::string arg = argv[iarg];
+        if (arg == "-s" && iarg + 1 < argc)
+            mbytes = std::stoul(argv[++iarg]);
+        else if (arg == "-r" && iarg + 1 < argc)
+            repeats = std::stoi(argv[++iarg]);
+        else if (arg == "-n" && iarg + 1 < argc)
+            counts = parse_list(argv[++iarg]);
+        else
+            cpus.push_back(std::stoi(arg));
+    }
+
+    if (counts.empty())
+        counts.push_back(cpus.size());
+
+    if (cpus.empty() || *std::max_element(counts.begin(), counts.end()) >
+                        int(cpus.size()))
+    {
+        std::cout << "Measure the page fault throughput of a parallel "
+                  << "first touch" << std::endl;
+        std::cout << "Usage: first_touch [-s MB per thread] [-r repeats] "
+                  << "[-n threads,threads,...] <cpu> [<cpu> ...]" << std::endl;
+        return 1;
+    }
+
+    size_t nbytes = mbytes * 1024 * 1024;
+    for (int n: counts)
+    {
+        // best of a few repetitions
+        double best = -1;
+        for (int r = 0; r < repeats; ++r)
+        {
+            double t = first_touch(cpus, n, nbytes);
+            if (t < 0)
+            {
+                std::cout << "threads " << n << ": mmap failed" << std::endl;
+                return 1;
+            }
+
+            if (best < 0 || t < best)
+                best = t;
+        }
+
+        std::cout << "threads " << n << ": time " << best
+                  << " s, bandwidth " << n * nbytes / best / 1e9 << " GB/s"
+                  << std::endl;
+    }
+
+    return 0;
+}
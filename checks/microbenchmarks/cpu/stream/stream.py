@@ -6,10 +6,14 @@
 
 import reframe as rfm
 import reframe.utility.sanity as sn
+from reframe.core.backends import getlauncher
+
+import fasrclib.hooks as hooks
+import fasrclib.topology as topology
 
 
 @rfm.simple_test
-class StreamTest(rfm.RegressionTest):
+class StreamTest(rfm.RegressionTest, hooks.Benchmark):
     '''This test checks the stream test:
        Function    Best Rate MB/s  Avg time     Min time     Max time
        Triad:          13991.7     0.017174     0.017153     0.017192
@@ -35,20 +39,6 @@ class StreamTest(rfm.RegressionTest):
         self.num_tasks = 1
         self.time_limit = '10m'
         self.num_tasks_per_node = 1
-        self.stream_cpus_per_task = {
-            'cannon:local': 96,
-            'cannon:local-gpu': 32,
-            'cannon:gpu_test': 16,
-            'cannon:test': 48,
-            'fasse:fasse': 48,
-            'arm:local': 72,
-            '*': 32,
-        }
-
-        self.env_vars = {
-            'OMP_PLACES': 'threads',
-            'OMP_PROC_BIND': 'spread'
-        }
         self.sanity_patterns = sn.assert_found(
             r'Solution Validates: avg error less than', self.stdout)
         self.perf_patterns = {
@@ -82,15 +72,103 @@ class StreamTest(rfm.RegressionTest):
 
     @run_before('run')
     def set_memory_limit(self):
-        self.job.options = ['--mem=4G']
+        self.job.options = [f'--mem={self.mem_request}']
 
     @run_after('setup')
     def prepare_test(self):
-        self.num_cpus_per_task = self.stream_cpus_per_task.get(
-            self.current_partition.fullname, 1)
-        self.env_vars['OMP_NUM_THREADS'] = str(self.num_cpus_per_task)
+        topology.apply(self, 'memory')
         envname = self.current_environ.name
 
         self.build_system.cflags = self.prgenv_flags.get(envname, ['-O3'])
+        self.mem_request = topology.size_stream(self)
 
         self.reference = self.stream_bw_reference[envname]
+
+
+@sn.deferrable
+def saturation_point(threads, bandwidth, fraction=0.9):
+    '''Return the smallest thread count that reaches ``fraction`` of the
+    peak bandwidth.'''
+
+    peak = max(bandwidth)
+    return min(t for t, bw in zip(threads, bandwidth) if bw >= fraction*peak)
+
+
+@rfm.simple_test
+class StreamScalingTest(rfm.RegressionTest, hooks.Benchmark):
+    '''STREAM over a sweep of OpenMP thread counts.
+
+    With ``close`` placement the threads fill one socket before the next,
+    with ``spread`` they are distributed over all sockets. All four kernels
+    are recorded at every thread count, together with the thread count at
+    which Triad saturates (reaches 90% of its peak) and the Triad bandwidth
+    per core of the fully populated node.
+    '''
+
+    placement = parameter(['close', 'spread'])
+
+    def __init__(self):
+        self.descr = 'STREAM thread scaling'
+        self.exclusive_access = True
+        self.valid_systems = ['cannon:local','cannon:local-gpu','cannon:test','fasse:login','fasse:fasse','test:login','test:rc-testing','arm:local']
+        self.valid_prog_environs = ['builtin','gnu','intel']
+        self.use_multithreading = False
+        self.prgenv_flags = {
+            'builtin': ['-fopenmp', '-O3'],
+            'gnu': ['-fopenmp', '-O3'],
+            'intel': ['-qopenmp', '-O3']
+        }
+        self.sourcepath = 'stream.c'
+        self.build_system = 'SingleSource'
+        self.num_tasks = 1
+        self.num_tasks_per_node = 1
+        self.time_limit = '30m'
+        self.kernels = ['Copy', 'Scale', 'Add', 'Triad']
+
+    @run_after('setup')
+    def prepare_test(self):
+        topo = topology.load(self.current_partition)
+        self.threads = topology.thread_sweep(topo)
+        self.num_cpus_per_task = topo.num_cores
+        self.env_vars = {
+            'OMP_PLACES': 'cores',
+            'OMP_PROC_BIND': self.placement
+        }
+        self.build_system.cflags = self.prgenv_flags.get(
+            self.current_environ.name, ['-O3'])
+        self.mem_request = topology.size_stream(self)
+
+        def bw(kernel, n):
+            return sn.extractsingle(rf'^threads={n}: {kernel}:\s+(\S+)',
+                                    self.stdout, 1, float)
+
+        self.perf_patterns = {
+            f'{k.lower()}_{n}': bw(k, n)
+            for k in self.kernels for n in self.threads
+        }
+        triad = [bw('Triad', n) for n in self.threads]
+        self.perf_patterns['saturation_threads'] = saturation_point(
+            self.threads, triad)
+        self.perf_patterns['triad_per_core'] = triad[-1] / topo.num_cores
+        units = {'saturation_threads': 'threads'}
+        self.reference = {
+            '*': {var: (0, None, None, units.get(var, 'MB/s'))
+                  for var in self.perf_patterns}
+        }
+        self.sanity_patterns = sn.assert_eq(
+            sn.count(sn.findall(r'Solution Validates', self.stdout)),
+            len(self.threads))
+
+    @run_before('run')
+    def set_executable(self):
+        # The sweep runs in the job script, on the node itself
+        self.job.launcher = getlauncher('local')()
+        self.executable = (
+            f'for n in {" ".join(str(n) for n in self.threads)}; do '
+            f'OMP_NUM_THREADS=$n {self.executable} | '
+            'sed "s/^/threads=$n: /"; done'
+        )
+
+    @run_before('run')
+    def set_memory_limit(self):
+        self.job.options = [f'--mem={self.mem_request}']
@@ -118,12 +118,14 @@ void update_stride(size_t*, size_t, size_t, size_t);
 
 int main(int argc, char ** argv)
 {
-    if (argc != 4)
+    if (argc != 4 && argc != 5)
     {
-        std::cout << "Usage: ./<prog_name> buffer_size stride nthreads\n"
+        std::cout << "Usage: ./<prog_name> buffer_size stride nthreads [cpus]\n"
                      "\n"
                      "buffer_size: in bytes\n"
-                     "stride: in multiples of 8 bytes\n";
+                     "stride: in multiples of 8 bytes\n"
+                     "cpus: comma-separated CPUs to pin the threads to,\n"
+                     "      0,1,...,nthreads-1 by default\n";
         exit(1);
     }
 
@@ -131,6 +133,23 @@ int main(int argc, char ** argv)
     size_t stride = std::stoi(argv[2]);
     int nthreads = std::stoi(argv[3]);
 
+    std::vector<int> cpus;
+    if (argc == 5)
+    {
+        std::string list = argv[4];
+        size_t pos = 0;
+        while (pos < list.size())
+        {
+            size_t end = list.find(',', pos);
+            if (end == std::string::npos)
+                end = list.size();
+            cpus.push_back(std::stoi(list.substr(pos, end - pos)));
+            pos = end + 1;
+        }
+    }
+    for (int i = cpus.size(); i < nthreads; ++i)
+        cpus.push_back(i);
+
     double time_per_run = 2.0;
 
     std::vector<Buffer> buf(nthreads);
@@ -141,7 +160,7 @@ int main(int argc, char ** argv)
                 std::this_thread::sleep_for(std::chrono::milliseconds(20));
                 buf[i] = Buffer(s);
             });
-        set_affinity(t, i);
+        set_affinity(t, cpus[i]);
         t.join();
     }
 
@@ -157,7 +176,7 @@ int main(int argc, char ** argv)
     for (int i = 0; i < nthreads; ++i)
     {
         workers[i] = std::thread(tasks[i]);
-        set_affinity(workers[i], i);
+        set_affinity(workers[i], cpus[i]);
     }
 
     for (auto& t: workers)
@@ -4,157 +4,145 @@
 #
 # SPDX-License-Identifier: BSD-3-Clause
 
+import os
+
 import reframe as rfm
 import reframe.utility.sanity as sn
+from reframe.core.backends import getlauncher
 
+import fasrclib.hooks as hooks
+import fasrclib.references as references
+import fasrclib.topology as topology
 
-class StridedBase(rfm.RegressionTest):
-    def __init__(self):
-        self.sourcepath = 'strides.cpp'
-        self.build_system = 'SingleSource'
-        self.valid_systems = ['cannon:local','cannon:local-gpu','cannon:test','fasse:fasse','test:rc-testing','arm:local']
-        self.valid_prog_environs = ['builtin','gnu','gpu','intel']
-        self.build_system.cxxflags = ['-std=c++11','-lpthread']
-        self.num_tasks = 1
-        self.num_tasks_per_node = 1
-        self.time_limit = '10m'
-
-        self.sanity_patterns = sn.assert_eq(
-            sn.count(sn.findall(r'bandwidth', self.stdout)),
-            self.num_tasks_assigned)
-
-        self.perf_patterns = {
-            'bandwidth': sn.extractsingle(
-                r'bandwidth: (?P<bw>\S+) GB/s',
-                self.stdout, 'bw', float)
-        }
-
-        self.system_num_cpus = {
-            'cannon:local': 96,
-            'cannon:local-gpu': 32,
-            'cannon:gpu_test': 16,
-            'cannon:test': 48,
-            'fasse:fasse': 48,
-            'test:rc-testing':  32,
-            'arm:local': 72,
-            '*': 32,
-        }
 
+class StridesBuild(rfm.CompileOnlyRegressionTest, hooks.CachedBuild):
+    descr = 'Build of the strided bandwidth benchmark'
+    valid_systems = ['*']
+    valid_prog_environs = ['*']
+    build_system = 'SingleSource'
+    sourcepath = 'strides.cpp'
+    executable = 'strides'
 
-    @property
-    @deferrable
-    def num_tasks_assigned(self):
-        return self.job.num_tasks
+    @run_before('compile')
+    def set_flags(self):
+        self.build_system.cxxflags = ['-std=c++11', '-O3', '-pthread']
 
+    @sanity_function
+    def assert_built(self):
+        return sn.assert_true(
+            os.path.exists(os.path.join(self.stagedir, self.executable)))
 
-@rfm.simple_test
-class StridedBandwidthTest(StridedBase):
-    def __init__(self):
-        super().__init__()
-
-        self.reference = {
-            'cannon:local': {
-                'bandwidth': (185, -0.1, None, 'GB/s')
-            },
-            'cannon:local-gpu': {
-                'bandwidth': (156, -0.1, None, 'GB/s')
-            },
-            'cannon:gpu_test': {
-                'bandwidth': (84, -0.1, None, 'GB/s')
-            },
-            'cannon:test': {
-                'bandwidth': (185, -0.1, None, 'GB/s')
-            },
-            'fasse:fasse': {
-                'bandwidth': (90, -0.1, None, 'GB/s')
-            },
-            '*': {
-                'bandwidth': (270, None, None, 'GB/s')
-            },
-        }
-
-    @run_before('run')
-    def set_exec_opts(self):
-        self.num_cpus_per_task = self.system_num_cpus[self.current_partition.fullname]
-
-        # 8-byte stride, using the full cacheline
-        self.executable_opts = ['100000000', '1', '%s' % self.num_cpus_per_task]
-
-    @run_before('run')
-    def set_memory_limit(self):
-        self.job.options = ['--mem-per-cpu=3G']
 
 @rfm.simple_test
-class StridedBandwidthTest64(StridedBase):
-    def __init__(self):
-        super().__init__()
-
-        self.reference = {
-            'cannon:local': {
-                'bandwidth': (23, -0.1, None, 'GB/s')
-            },
-            'cannon:local-gpu': {
-                'bandwidth': (22, -0.1, None, 'GB/s')
-            },
-            'cannon:gpu_test': {
-                'bandwidth': (12, -0.1, None, 'GB/s')
-            },
-            'cannon:test': {
-                'bandwidth': (23, -0.1, None, 'GB/s')
-            },
-            'fasse:fasse': {
-                'bandwidth': (23, -0.1, None, 'GB/s')
-            },
-            '*': {
-                'bandwidth': (270, None, None, 'GB/s')
-            },
-        }
+class StridedBandwidthTest(rfm.RunOnlyRegressionTest, hooks.SizedJob,
+                           hooks.CalibratedReference, hooks.NodeFingerprint):
+    '''Bandwidth of strided updates over a sweep of strides.
+
+    Every thread increments every ``stride``-th 8-byte element of its own
+    buffer. The check runs on one core, the cores of one socket or the whole
+    node, with one thread pinned to every core as laid out by
+    :mod:`fasrclib.topology`, and reports for every stride the useful
+    bandwidth (only the bytes updated count) and the bytes used per cache
+    line, estimated as ``64 * bandwidth(stride) / bandwidth(1)``. Ideally
+    that is ``64/stride`` up to a stride of 8 and 8 bytes beyond; less means
+    that the hardware moves lines which are not used, e.g., due to the
+    prefetchers.
+
+    The history and calibrated references of the former single-stride
+    checks carry over to the whole-node variant, see
+    :data:`fasrclib.references.RENAMED`.
+    '''
+
+    threads = parameter(['single', 'socket', 'node'])
+    strides_binary = fixture(StridesBuild, scope='environment')
+
+    descr = 'Strided bandwidth sweep'
+    valid_systems = ['cannon:local','cannon:local-gpu','cannon:test','fasse:fasse','test:rc-testing','arm:local']
+    valid_prog_environs = ['builtin','gnu','gpu','intel']
+    num_tasks = 1
+    num_tasks_per_node = 1
+    exclusive_access = True
+    time_limit = '20m'
+
+    # Stride in elements of 8 bytes
+    strides = [1, 2, 3, 4, 5, 6, 7, 8, 12, 16, 24, 32, 48, 64]
+
+    # Unit stride, 8-byte stride (1/8 of every cacheline) and 16-byte stride
+    # (1/8 of every 2nd cacheline) on the whole node
+    node_reference = {
+        'cannon:local': {'bandwidth_s1': 185, 'bandwidth_s8': 23,
+                         'bandwidth_s16': 12},
+        'cannon:local-gpu': {'bandwidth_s1': 156, 'bandwidth_s8': 22,
+                             'bandwidth_s16': 14},
+        'cannon:gpu_test': {'bandwidth_s1': 84, 'bandwidth_s8': 12,
+                            'bandwidth_s16': 8},
+        'cannon:test': {'bandwidth_s1': 185, 'bandwidth_s8': 23,
+                        'bandwidth_s16': 12},
+        'fasse:fasse': {'bandwidth_s1': 90, 'bandwidth_s8': 23,
+                        'bandwidth_s16': 17},
+    }
+
+    @run_after('setup')
+    def set_sweep(self):
+        topo = topology.load(self.current_partition)
+        cpus = {
+            'single': topo.core_cpus(0)[:1],
+            'socket': topo.core_cpus(0),
+            'node': topo.core_cpus()
+        }[self.threads]
+        num_threads = len(cpus)
+        self.num_cpus_per_task = topo.num_cores
+
+        # Large enough to stream from memory, but an int for strides.cpp
+        buffer_size = min(max(100000000, 4 * topo.llc_size // num_threads),
+                          2**31 - 2**20)
+        self.mem_request = (
+            f'{num_threads * buffer_size // 1024**2 + 1024}M'
+        )
+        binary = os.path.join(self.strides_binary.stagedir,
+                              self.strides_binary.executable)
+        self.executable = (
+            f'for s in {" ".join(str(s) for s in self.strides)}; do '
+            f'{binary} {buffer_size} $s {num_threads} '
+            f'{",".join(str(c) for c in cpus)} | '
+            'sed "s/^/stride=$s: /"; done'
+        )
+
+        def bandwidth(stride):
+            return sn.extractsingle(
+                rf'^stride={stride}: .*bandwidth: (?P<bw>\S+) GB/s',
+                self.stdout, 'bw', float)
 
-    @run_before('run')
-    def set_memory_limit(self):
-        self.job.options = ['--mem-per-cpu=3G']
+        self.sanity_patterns = sn.assert_eq(
+            sn.count(sn.findall(r'bandwidth', self.stdout)),
+            len(self.strides))
+        self.perf_patterns = {}
+        refs = {}
+        part_refs = {}
+        if self.threads == 'node':
+            part_refs = self.node_reference.get(
+                self.current_partition.fullname, {})
+
+        for s in self.strides:
+            self.perf_patterns[f'bandwidth_s{s}'] = bandwidth(s)
+            self.perf_patterns[f'bytes_per_line_s{s}'] = (
+                64 * bandwidth(s) / bandwidth(1)
+            )
+            if f'bandwidth_s{s}' in part_refs:
+                refs[f'bandwidth_s{s}'] = (part_refs[f'bandwidth_s{s}'],
+                                           -0.1, None, 'GB/s')
+            else:
+                refs[f'bandwidth_s{s}'] = (0, None, None, 'GB/s')
+
+            refs[f'bytes_per_line_s{s}'] = (0, None, None, 'B')
+
+        self.reference = {'*': refs}
 
     @run_before('run')
-    def set_exec_opts(self):
-        self.num_cpus_per_task = self.system_num_cpus[self.current_partition.fullname]
-
-        # 64-byte stride, using 1/8 of the cacheline
-        self.executable_opts = ['100000000', '8', '%s' % self.num_cpus_per_task]
-
-
-@rfm.simple_test
-class StridedBandwidthTest128(StridedBase):
-    def __init__(self):
-        super().__init__()
-
-        self.reference = {
-            'cannon:local': {
-                'bandwidth': (12, -0.1, None, 'GB/s')
-            },
-            'cannon:local-gpu': {
-                'bandwidth': (14, -0.1, None, 'GB/s')
-            },
-            'cannon:gpu_test': {
-                'bandwidth': (8, -0.1, None, 'GB/s')
-            },
-            'cannon:test': {
-                'bandwidth': (12, -0.1, None, 'GB/s')
-            },
-            'fasse:fasse': {
-                'bandwidth': (17, -0.1, None, 'GB/s')
-            },
-            '*': {
-                'bandwidth': (270, None, None, 'GB/s')
-            },
-        }
+    def set_launcher(self):
+        # strides.cpp pins its threads to the cores it is given itself
+        self.job.launcher = getlauncher('local')()
 
     @run_before('run')
     def set_memory_limit(self):
-        self.job.options = ['--mem-per-cpu=3G']
-
-    @run_before('run')
-    def set_exec_opts(self):
-        self.num_cpus_per_task = self.system_num_cpus[self.current_partition.fullname]
-
-        # 128-byte stride, using 1/8 of every 2nd cacheline
-        self.executable_opts = ['100000000', '16', '%s' % self.num_cpus_per_task]
+        self.job.options = [f'--mem={self.mem_request}']
@@ -7,9 +7,11 @@
 import reframe as rfm
 import reframe.utility.sanity as sn
 
+import fasrclib.hooks as hooks
+
 
 @rfm.simple_test
-class GPUdgemmTest(rfm.RegressionTest):
+class GPUdgemmTest(rfm.RegressionTest, hooks.SizedJob, hooks.CachedBuild):
     def __init__(self):
         self.valid_systems = ['cannon:local-gpu','cannon:gpu_test','fasse:fasse_gpu','test:gpu','arm:local']
         self.valid_prog_environs = ['gpu']
@@ -10,8 +10,11 @@ import reframe as rfm
 import reframe.utility.sanity as sn
 import reframe.utility.osext as osext
 
+import fasrclib.hooks as hooks
+
+
 @rfm.simple_test
-class GpuBurnTest(rfm.RegressionTest):
+class GpuBurnTest(rfm.RegressionTest, hooks.Benchmark):
     def __init__(self):
         self.valid_systems = ['cannon:local-gpu','cannon:gpu_test','fasse:fasse_gpu','test:gpu','arm:local']
         self.descr = 'GPU burn test'
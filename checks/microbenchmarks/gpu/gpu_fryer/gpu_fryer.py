@@ -7,9 +7,11 @@
 import reframe as rfm
 import reframe.utility.sanity as sn
 
+import fasrclib.hooks as hooks
+
 
 @rfm.simple_test
-class GPUFryerFP32TensorTest(rfm.RunOnlyRegressionTest):
+class GPUFryerFP32TensorTest(rfm.RunOnlyRegressionTest, hooks.SizedJob):
     def __init__(self):
         self.valid_systems = ['cannon:local-gpu','cannon:gpu_test','fasse:fasse_gpu','test:gpu','arm:local']
         self.build_system = 'SingleSource'
@@ -66,7 +68,7 @@ class GPUFryerFP32TensorTest(rfm.RunOnlyRegressionTest):
         self.job.options = ['--mem-per-cpu=4G']
 
 @rfm.simple_test
-class GPUFryerBF16TensorTest(rfm.RunOnlyRegressionTest):
+class GPUFryerBF16TensorTest(rfm.RunOnlyRegressionTest, hooks.SizedJob):
     def __init__(self):
         self.valid_systems = ['cannon:local-gpu','cannon:gpu_test','fasse:fasse_gpu','test:gpu','arm:local']
         self.build_system = 'SingleSource'
@@ -123,7 +125,7 @@ class GPUFryerBF16TensorTest(rfm.RunOnlyRegressionTest):
         self.job.options = ['--mem-per-cpu=4G']
 
 @rfm.simple_test
-class GPUFryerFP8TensorTest(rfm.RunOnlyRegressionTest):
+class GPUFryerFP8TensorTest(rfm.RunOnlyRegressionTest, hooks.SizedJob):
     def __init__(self):
         self.valid_systems = ['cannon:local-gpu','cannon:gpu_test','fasse:fasse_gpu','test:gpu','arm:local']
         self.build_system = 'SingleSource'
@@ -7,8 +7,11 @@
 import reframe as rfm
 import reframe.utility.sanity as sn
 
+import fasrclib.hooks as hooks
+
+
 @rfm.simple_test
-class KernelLatencyTest(rfm.RegressionTest):
+class KernelLatencyTest(rfm.RegressionTest, hooks.CachedBuild):
     valid_systems = ['cannon:local-gpu','cannon:gpu_test','fasse:fasse_gpu','test:gpu','arm:local']
     valid_prog_environs = ['gpu']
 
@@ -7,9 +7,11 @@
 import reframe.utility.sanity as sn
 import reframe as rfm
 
+import fasrclib.hooks as hooks
+
 
 @rfm.simple_test
-class GpuBandwidthCheck(rfm.RegressionTest):
+class GpuBandwidthCheck(rfm.RegressionTest, hooks.SizedJob, hooks.CachedBuild):
     def __init__(self):
         self.valid_systems = ['cannon:local-gpu','cannon:gpu_test','fasse:fasse_gpu','test:gpu']
         self.valid_prog_environs = ['gpu']
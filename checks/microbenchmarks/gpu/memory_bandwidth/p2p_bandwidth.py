@@ -7,9 +7,11 @@
 import reframe.utility.sanity as sn
 import reframe as rfm
 
+import fasrclib.hooks as hooks
+
 
 @rfm.simple_test
-class P2pBandwidthCheck(rfm.RegressionTest):
+class P2pBandwidthCheck(rfm.RegressionTest, hooks.CachedBuild):
     valid_systems = ['cannon:local-gpu','fasse:fasse_gpu','test:gpu']
     valid_prog_environs = ['gpu']
 
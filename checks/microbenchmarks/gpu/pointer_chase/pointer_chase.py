@@ -10,6 +10,8 @@ import reframe as rfm
 
 import os
 
+import fasrclib.hooks as hooks
+
 
 class PchaseGlobal(rfm.RegressionTestPlugin):
     '''Handy class to store common test settings.
@@ -28,7 +30,8 @@ class PchaseGlobal(rfm.RegressionTestPlugin):
 
 
 @rfm.simple_test
-class CompileGpuPointerChase(rfm.CompileOnlyRegressionTest, PchaseGlobal):
+class CompileGpuPointerChase(rfm.CompileOnlyRegressionTest, PchaseGlobal,
+                             hooks.CachedBuild):
     def __init__(self):
         self.valid_systems = (
             self.single_device_systems + self.multi_device_systems
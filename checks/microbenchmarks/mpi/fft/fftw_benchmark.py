@@ -7,8 +7,12 @@
 import reframe as rfm
 import reframe.utility.sanity as sn
 
+import fasrclib.hooks as hooks
+
+
 @rfm.simple_test
-class FFTWTest(rfm.RegressionTest):
+class FFTWTest(rfm.RegressionTest, hooks.SizedJob, hooks.CalibratedReference,
+               hooks.CachedBuild):
     exec_mode = parameter(['nompi', 'mpi'])
     sourcepath = 'fftw_benchmark.c'
     build_system = 'SingleSource'
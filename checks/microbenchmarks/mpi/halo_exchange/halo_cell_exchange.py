@@ -7,9 +7,12 @@
 import reframe as rfm
 import reframe.utility.sanity as sn
 
+import fasrclib.hooks as hooks
+
 
 @rfm.simple_test
-class HaloCellExchangeTest(rfm.RegressionTest):
+class HaloCellExchangeTest(rfm.RegressionTest, hooks.SizedJob,
+                           hooks.CalibratedReference, hooks.CachedBuild):
     def __init__(self):
         self.sourcepath = 'halo_cell_exchange.c'
         self.build_system = 'SingleSource'
@@ -9,8 +9,14 @@ import reframe as rfm
 import reframe.utility.sanity as sn
 from reframe.core.backends import getlauncher
 
+import fasrclib.hooks as hooks
+import fasrclib.mirror as mirror
+import fasrclib.topology as topology
+
+
 @rfm.simple_test
-class HPCGCheckRef(rfm.RegressionTest):
+class HPCGCheckRef(rfm.RegressionTest, hooks.SizedJob,
+                   hooks.CalibratedReference, hooks.CachedBuild):
     def __init__(self):
         self.descr = 'HPCG reference benchmark'
         self.valid_systems = ['cannon:test','fasse:fasse','test:rc-testing']
@@ -18,23 +24,13 @@ class HPCGCheckRef(rfm.RegressionTest):
 
         self.build_system = 'Make'
         self.build_system.options = ['arch=MPI_GCC_OMP']
-        self.sourcesdir = 'https://github.com/hpcg-benchmark/hpcg.git'
         self.executable = 'bin/xhpcg'
         self.executable_opts = ['--nx=104', '--ny=104', '--nz=104', '-t2']
         # use glob to catch the output file suffix dependent on execution time
         self.output_file = sn.getitem(sn.glob('HPCG*.txt'), 0)
 
-        self.num_tasks = 96
-        self.num_cpus_per_task = 1
         self.time_limit = '10m'
 
-        self.system_num_tasks = {
-            'cannon:test':  48,
-            'fasse:fasse': 48,
-            'test:rc-testing':  32,
-            '*': 32
-        }
-
         self.reference = {
             'cannon:test': {
                 'gflops': (28, -0.1, None, 'Gflop/s')
@@ -53,11 +49,14 @@ class HPCGCheckRef(rfm.RegressionTest):
     def num_tasks_assigned(self):
         return self.job.num_tasks
 
+    @run_before('setup')
+    def set_sourcesdir(self):
+        # Pinned release from the local mirror instead of cloning GitHub
+        self.sourcesdir = mirror.git_tree('hpcg')
+
     @run_before('compile')
     def set_tasks(self):
-        self.num_tasks_per_node = self.system_num_tasks.get(
-            self.current_partition.fullname, 1
-        )
+        topology.apply(self, 'mpi', num_nodes=2)
 
     @run_before('run')
     def set_memory_limit(self):
@@ -83,7 +82,8 @@ class HPCGCheckRef(rfm.RegressionTest):
 
 
 @rfm.simple_test
-class HPCGCheckMKL(rfm.RegressionTest):
+class HPCGCheckMKL(rfm.RegressionTest, hooks.SizedJob,
+                   hooks.CalibratedReference, hooks.CachedBuild):
     def __init__(self):
         self.descr = 'HPCG benchmark Intel MKL implementation'
         self.valid_systems = ['cannon:test','fasse:fasse','test:rc-testing']
@@ -94,7 +94,6 @@ class HPCGCheckMKL(rfm.RegressionTest):
         self.prebuild_cmds = ['cp -r ${MKLROOT}/share/mkl/benchmarks/hpcg/hpcg_cpu/* .',
                              './configure IMPI_IOMP_AVX512']
 
-        self.num_tasks = 4
         self.problem_size = 104
 
         self.env_vars = {
@@ -136,19 +135,7 @@ class HPCGCheckMKL(rfm.RegressionTest):
 
     @run_before('compile')
     def set_tasks(self):
-        if self.current_partition.fullname in ['cannon:test', 'fasse:fasse']:
-            self.num_tasks_per_node = 2
-            self.num_cpus_per_task = 24
-        elif self.current_partition.fullname in ['test:rc-testing']:
-            self.num_tasks_per_node = 2
-            self.num_cpus_per_task = 16
-        else:
-            self.num_tasks_per_node = 2
-            self.num_cpus_per_task = 16
-
-    @run_after('setup')
-    def prepare_test(self):
-        self.env_vars['OMP_NUM_THREADS'] = str(self.num_cpus_per_task)
+        topology.apply(self, 'hybrid', num_nodes=2)
 
     @run_after('setup')
     def set_launcher(self):
@@ -7,8 +7,13 @@
 import reframe as rfm
 import reframe.utility.sanity as sn
 
+import fasrclib.hooks as hooks
+import fasrclib.topology as topology
+
+
 @rfm.simple_test
-class AlltoallTest(rfm.RegressionTest):
+class AlltoallTest(rfm.RegressionTest, hooks.SizedJob,
+                   hooks.CalibratedReference, hooks.CachedBuild):
     variant = parameter(['production'])
     strict_check = False
     valid_systems = ['cannon:test','fasse:fasse','test:rc-testing']
@@ -64,7 +69,7 @@ class AlltoallTest(rfm.RegressionTest):
 
 
 @rfm.simple_test
-class FlexAlltoallTest(rfm.RegressionTest):
+class FlexAlltoallTest(rfm.RegressionTest, hooks.SizedJob, hooks.CachedBuild):
     def __init__(self):
         self.valid_systems = ['cannon:test','fasse:fasse','test:rc-testing']
         self.valid_prog_environs = ['gnu-mpi', 'intel-mpi']
@@ -81,18 +86,11 @@ class FlexAlltoallTest(rfm.RegressionTest):
 
     @run_before('run')
     def set_tasks(self):
-        if self.current_partition.fullname in ['test:rc-testing']:
-            self.num_tasks_per_node = 32
-            self.num_tasks = 64
-        elif self.current_partition.fullname in ['cannon:test', 'fasse:fasse']:
-            self.num_tasks_per_node = 48
-            self.num_tasks = 96
-        else:
-            self.num_tasks_per_node = 32
-            self.num_tasks = 64
+        topology.apply(self, 'mpi', num_nodes=2)
 
 @rfm.simple_test
-class AllreduceTest(rfm.RegressionTest):
+class AllreduceTest(rfm.RegressionTest, hooks.SizedJob,
+                    hooks.CalibratedReference, hooks.CachedBuild):
     variant = parameter(['small', 'large'])
     strict_check = False
     valid_systems = ['cannon:test','fasse:fasse','test:rc-testing']
@@ -161,7 +159,8 @@ class AllreduceTest(rfm.RegressionTest):
         }
 
 @rfm.simple_test
-class P2PBaseTest(rfm.RegressionTest):
+class P2PBaseTest(rfm.RegressionTest, hooks.SizedJob,
+                  hooks.CalibratedReference, hooks.CachedBuild):
     def __init__(self):
         self.strict_check = False
         self.num_tasks = 2
@@ -10,26 +10,38 @@ import reframe as rfm
 import reframe.utility.sanity as sn
 import reframe.utility.udeps as udeps
 
+import fasrclib.hooks as hooks
+import fasrclib.images as images
+
 
 @rfm.simple_test
-class PyTorch(rfm.RunOnlyRegressionTest):
+class PyTorch(rfm.RunOnlyRegressionTest, hooks.SizedJob, hooks.UserCode):
     descr = 'Runs a PyTorch example using a singularity container'
     valid_systems = ['cannon:local-gpu','cannon:gpu_test','fasse:fasse_gpu','test:gpu']
     valid_prog_environs = ['gpu']
-    prerun_cmds = ['module purge',
-                   'wget https://raw.githubusercontent.com/fasrc/User_Codes/master/AI/PyTorch/check_gpu.py']
+    prerun_cmds = ['module purge']
     build_system = 'SingleSource'
     sourcepath = 'check_gpu.py'
-    executable = 'singularity exec --nv pytorch_latest.sif python check_gpu.py'
+    user_codes_dir = 'AI/PyTorch'
     time_limit = '10m'
 
+    # Digest of the image the check ran, recorded in the perflog
+    image_digest = variable(str, value='', loggable=True)
+
     @run_after('init')
     def inject_dependencies(self):
         self.depends_on('PyTorchSingularity', udeps.fully)
 
     @require_deps
-    def set_sourcedir(self, PyTorchSingularity):
-        self.sourcesdir = os.path.join(PyTorchSingularity(environ='gpu').stagedir)
+    def set_image(self, PyTorchSingularity):
+        # The image in the shared cache, by digest
+        image = PyTorchSingularity(environ='gpu').image
+        self.image_digest = image.digest
+        self.prerun_cmds = self.prerun_cmds + [
+            f'echo "image: {image.pinned_ref}"'
+        ]
+        self.executable = (f'singularity exec --nv {image.path} '
+                           f'python check_gpu.py')
 
     @run_before('run')
     def set_memory_limit(self):
@@ -43,28 +55,30 @@ class PyTorch(rfm.RunOnlyRegressionTest):
     def assert_sanity(self):
         return sn.assert_found(r'Using device: cuda', self.stdout)
 
+
 @rfm.simple_test
 class PyTorchSingularity(rfm.RunOnlyRegressionTest):
+    '''Pulls the image into the shared image cache unless the digest
+    ``image_ref`` points to is cached already (see :mod:`fasrclib.images`).
+    The pull needs network access, not a GPU, so it runs locally.
+    '''
+
     descr = 'Pulls (downloads) singularity container with PyTorch'
     valid_systems = ['cannon:local-gpu','cannon:gpu_test','fasse:fasse_gpu','test:gpu']
     valid_prog_environs = ['gpu']
     build_system = 'SingleSource'
-    executable = 'singularity pull --disable-cache docker://pytorch/pytorch:latest'
-    time_limit = '10m'
+    image_ref = 'docker://pytorch/pytorch:latest'
+    local = True
+    time_limit = '30m'
 
-    @run_before('run')
-    def set_memory_limit(self):
-        self.job.options = ['--mem=8G']
-
-    @run_before('run')
-    def set_num_threads(self):
-        self.num_cpus_per_task = 8
-
-    @run_before('run')
-    def set_job_options(self):
-        self.job.options += ['--gres=gpu:1']
+    @run_after('setup')
+    def resolve_image(self):
+        self.image = images.resolve(self.image_ref)
+        if self.image.cached:
+            self.executable = f'echo "cached image: {self.image.path}"'
+        else:
+            self.executable = images.pull_cmd(self.image)
 
     @sanity_function
     def assert_sanity(self):
-        return sn.assert_true(os.path.exists('pytorch_latest.sif'))
-
+        return sn.assert_true(os.path.exists(self.image.path))
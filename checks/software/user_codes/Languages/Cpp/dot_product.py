@@ -7,16 +7,16 @@
 import reframe as rfm
 import reframe.utility.sanity as sn
 
+import fasrclib.hooks as hooks
+
 
 @rfm.simple_test
-class CppDotProduct(rfm.RegressionTest):
+class CppDotProduct(rfm.RegressionTest, hooks.SizedJob, hooks.UserCode):
     valid_systems = ['cannon:test','fasse:fasse','test:rc-testing']
     valid_prog_environs = ['builtin','gnu','intel']
-    prebuild_cmds = [
-        'wget https://raw.githubusercontent.com/fasrc/User_Codes/master/Languages/Cpp/Example5/dot_prod.cpp'  # noqa: E501
-    ]
     build_system = 'SingleSource'
     sourcepath = 'dot_prod.cpp'
+    user_codes_dir = 'Languages/Cpp/Example5'
     time_limit = '10m'
 
     @run_before('compile')
@@ -30,4 +30,3 @@ class CppDotProduct(rfm.RegressionTest):
     @sanity_function
     def assert_hello(self):
         return sn.assert_found(r' Scallar product of x1 and x2', self.stdout)
-
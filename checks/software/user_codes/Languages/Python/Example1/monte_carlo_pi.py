@@ -7,20 +7,21 @@
 import reframe as rfm
 import reframe.utility.sanity as sn
 
+import fasrclib.hooks as hooks
+
 
 @rfm.simple_test
-class PyMonteCarloPi(rfm.RunOnlyRegressionTest):
+class PyMonteCarloPi(rfm.RunOnlyRegressionTest, hooks.UserCode):
     descr = 'Estimating pi in serial using Python'
     valid_systems = ['cannon:local','cannon:test','fasse:fasse','test:rc-testing']
     valid_prog_environs = ['builtin']
-    prerun_cmds = ['wget https://raw.githubusercontent.com/fasrc/User_Codes/master/Languages/Python/Example1/mc_pi.py']
     build_system = 'SingleSource'
     sourcepath = 'mc_pi.py'
     modules = ['python']
     executable = 'python mc_pi.py'
+    user_codes_dir = 'Languages/Python/Example1'
     time_limit = '10m'
 
     @sanity_function
     def assert_sanity(self):
         return sn.assert_found(r'3.14', self.stdout)
-
@@ -4,18 +4,28 @@
 #
 # SPDX-License-Identifier: BSD-3-Clause
 
+import hashlib
+import os
+
 import reframe as rfm
 import reframe.utility.sanity as sn
 
+import fasrclib.hooks as hooks
+
+# Cached environments, on a filesystem shared by the nodes
+ENV_CACHE_DIR = os.environ.get(
+    'FASRC_ENV_CACHE_DIR',
+    os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                 '../../../../../../envs'))
+)
+
 
 @rfm.simple_test
-class PyMambaEnv(rfm.RunOnlyRegressionTest):
+class PyMambaEnv(rfm.RunOnlyRegressionTest, hooks.SizedJob, hooks.UserCode):
     descr = 'Creates a conda environment, test numpy and pandas, deletes conda environment'
     valid_systems = ['cannon:local','cannon:test','fasse:fasse','test:rc-testing']
     valid_prog_environs = ['builtin']
-    prerun_cmds = ['wget https://raw.githubusercontent.com/fasrc/User_Codes/master/Languages/Python/Example2/build_env.sh',
-                   'wget https://raw.githubusercontent.com/fasrc/User_Codes/master/Languages/Python/Example2/numpy_pandas_ex.py',
-                   'sh build_env.sh',
+    prerun_cmds = ['sh build_env.sh',
                    'source activate my_env']
     build_system = 'SingleSource'
     sourcepath = 'numpy_pandas_ex.py'
@@ -24,6 +34,7 @@ class PyMambaEnv(rfm.RunOnlyRegressionTest):
     postrun_cmds= ['source deactivate',
                    'mamba env remove -n my_env']
 
+    user_codes_dir = 'Languages/Python/Example2'
     time_limit = '20m'
 
     @run_before('run')
@@ -34,3 +45,99 @@ class PyMambaEnv(rfm.RunOnlyRegressionTest):
     def assert_sanity(self):
         return sn.assert_found(r'0      1       2', self.stdout)
 
+
+@rfm.simple_test
+class PyMambaEnvCached(rfm.RunOnlyRegressionTest, hooks.SizedJob,
+                       hooks.UserCode):
+    '''Times solving, creating and importing a mamba environment, keeping
+    the environment between runs.
+
+    The environment is cached in ``envs/`` next to the checks (or
+    ``$FASRC_ENV_CACHE_DIR``) under the hash of its spec, i.e., the
+    ``channels`` and ``packages``, and is only created when the spec
+    changed. It is created once from the spec and then pinned by an
+    explicit lock file, from which it is recreated without solving if it is
+    deleted. The solve is timed on every run as a dry run, the import of
+    the packages from the cached environment as well; the create time is
+    reported on the runs that created the environment.
+    '''
+
+    channels = variable(list, value=['conda-forge'])
+    packages = variable(list, value=['python=3.11', 'numpy', 'pandas'])
+
+    descr = 'Times solve, create and import of a cached mamba environment'
+    valid_systems = ['cannon:local','cannon:test','fasse:fasse','test:rc-testing']
+    valid_prog_environs = ['builtin']
+    modules = ['python']
+    executable = 'python numpy_pandas_ex.py'
+    keep_files = ['mamba_env.lock']
+    user_codes_dir = 'Languages/Python/Example2'
+    time_limit = '20m'
+
+    @run_after('setup')
+    def set_environment(self):
+        spec = '\n'.join(sorted(self.channels) + sorted(self.packages))
+        key = hashlib.sha256(spec.encode()).hexdigest()[:16]
+        prefix = os.path.join(ENV_CACHE_DIR, f'py-{key}')
+        lockfile = f'{prefix}.lock'
+        channels = ' '.join(f'-c {c}' for c in self.channels)
+        packages = ' '.join(f"'{p}'" for p in self.packages)
+
+        def timed(name, cmd):
+            return (f't0=$(date +%s.%N); {cmd} && '
+                    f'echo "{name} time: $(awk "BEGIN {{print $(date +%s.%N) '
+                    f'- $t0}}") s"')
+
+        self.prerun_cmds = [
+            f'mkdir -p {ENV_CACHE_DIR}',
+            timed('solve', f'mamba create --dry-run --json -p {prefix}.solve '
+                           f'{channels} {packages} > solve.json'),
+            # One creation at a time; a prefix without the marker is a
+            # partial environment of a failed creation
+            f'(\n'
+            f'flock 9\n'
+            f'if [ -f {prefix}/.rfm_complete ]; then\n'
+            f'    echo "cached environment: {prefix}"\n'
+            f'else\n'
+            f'    rm -rf {prefix}\n'
+            f'    if [ -f {lockfile} ]; then\n'
+            f'        ' + timed('create', f'mamba create -y -p {prefix} '
+                                          f'--file {lockfile}') + '\n'
+            f'    else\n'
+            f'        ' + timed('create', f'mamba create -y -p {prefix} '
+                                          f'{channels} {packages}') + ' && '
+            f'conda list -p {prefix} --explicit --md5 > {lockfile}\n'
+            f'    fi && touch {prefix}/.rfm_complete\n'
+            f'fi\n'
+            f') 9> {prefix}.flock',
+            f'cp {lockfile} mamba_env.lock',
+            f'source activate {prefix}',
+            timed('import', 'python -c "import numpy, pandas"')
+        ]
+
+    @run_before('run')
+    def set_memory_limit(self):
+        self.job.options = ['--mem-per-cpu=4G']
+
+    @sanity_function
+    def assert_sanity(self):
+        self.perf_patterns = {
+            'solve_time': self.phase_time('solve'),
+            'import_time': self.phase_time('import')
+        }
+        # Only the runs that created the environment have a create time
+        if sn.evaluate(sn.count(sn.findall(r'^create time', self.stdout))):
+            self.perf_patterns['create_time'] = self.phase_time('create')
+
+        self.reference = {
+            '*': {var: (0, None, None, 's') for var in self.perf_patterns}
+        }
+        return sn.all([
+            sn.assert_found(r'^solve time', self.stdout),
+            sn.assert_found(r'^import time', self.stdout),
+            sn.assert_found(r'0      1       2', self.stdout)
+        ])
+
+    def phase_time(self, name):
+        return sn.extractsingle(rf'^{name} time: (?P<time>\S+) s',
+                                self.stdout, 'time', float)
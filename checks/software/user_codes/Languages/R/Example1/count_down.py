@@ -7,22 +7,23 @@
 import reframe as rfm
 import reframe.utility.sanity as sn
 
+import fasrclib.hooks as hooks
+
 
 @rfm.simple_test
-class RCountDown(rfm.RunOnlyRegressionTest):
+class RCountDown(rfm.RunOnlyRegressionTest, hooks.UserCode):
     descr = 'Count down from 10 to 1 using R'
     valid_systems = ['cannon:local','cannon:test','fasse:fasse','test:rc-testing']
     valid_prog_environs = ['builtin']
-    prerun_cmds = ['wget https://raw.githubusercontent.com/fasrc/User_Codes/master/Languages/R/Example1/count_down.R']
     build_system = 'SingleSource'
     sourcepath = 'count_down.R'
     modules = ['R']
     #executable = 'Rscript count_down.R > count_down.Rout'
     executable = 'R CMD BATCH --no-save --no-restore count_down.R'
 
+    user_codes_dir = 'Languages/R/Example1'
     time_limit = '10m'
 
     @sanity_function
     def assert_sanity(self):
         return sn.assert_found(r'CountDown\( 10 \)', "count_down.Rout")
-
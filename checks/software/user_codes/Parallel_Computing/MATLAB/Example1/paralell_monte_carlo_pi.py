@@ -7,17 +7,20 @@
 import reframe as rfm
 import reframe.utility.sanity as sn
 
+import fasrclib.hooks as hooks
+
 
 @rfm.simple_test
-class MatlabParallelMonteCarloPi(rfm.RunOnlyRegressionTest):
+class MatlabParallelMonteCarloPi(rfm.RunOnlyRegressionTest, hooks.SizedJob,
+                                 hooks.UserCode):
     descr = 'Uses Matlab to compute Pi in parallel using Monte Carlo method'
     valid_systems = ['cannon:local','cannon:test','fasse:fasse','test:rc-testing']
     valid_prog_environs = ['builtin']
-    prerun_cmds = ['wget https://raw.githubusercontent.com/fasrc/User_Codes/master/Parallel_Computing/MATLAB/Example1/parallel_monte_carlo.m']
     build_system = 'SingleSource'
     sourcepath = 'parallel_monte_carlo.m'
     modules = ['matlab']
     executable = 'matlab -nosplash -nodesktop -r parallel_monte_carlo'
+    user_codes_dir = 'Parallel_Computing/MATLAB/Example1'
     time_limit = '10m'
 
     @run_before('run')
@@ -31,4 +34,3 @@ class MatlabParallelMonteCarloPi(rfm.RunOnlyRegressionTest):
     @sanity_function
     def assert_sanity(self):
         return sn.assert_found(r'Starting parallel pool', self.stdout)
-
@@ -11,8 +11,11 @@ import re
 import reframe as rfm
 import reframe.utility.sanity as sn
 
+import fasrclib.hooks as hooks
+
+
 @rfm.simple_test
-class IorCheck(rfm.RunOnlyRegressionTest):
+class IorCheck(rfm.RunOnlyRegressionTest, hooks.SizedJob):
     base_dir = parameter(['/scratch/','/n/netscratch/rc_admin/test'])
     valid_systems = ['cannon:test','fasse:fasse','test:rc-testing']
     valid_prog_environs = ['builtin']
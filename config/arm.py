@@ -7,10 +7,16 @@
 # ReFrame test cluster settings
 #
 
+import os
+import sys
+
 import reframe.utility.osext as osext
 from reframe.core.backends import register_launcher
 from reframe.core.launchers import JobLauncher
 
+# The checks import fasrclib from the top of the repository
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                             '..')))
 
 site_configuration = {
     'systems': [
@@ -116,6 +122,7 @@ site_configuration = {
                         'ref=%(check_perf_ref)s '
                         '(l=%(check_perf_lower_thres)s, '
                         'u=%(check_perf_upper_thres)s)|'
+                        'image=%(check_image_digest)s|'
                         '%(check_perf_unit)s'
                     ),
                     'append': True
@@ -7,10 +7,18 @@
 # ReFrame Cannon cluster settings
 #
 
+import os
+import sys
+
 import reframe.utility.osext as osext
 from reframe.core.backends import register_launcher
 from reframe.core.launchers import JobLauncher
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                             '..')))
+import fasrclib.concurrency  # noqa: E402,F401
+import fasrclib.packing as packing  # noqa: E402
+
 
 @register_launcher('srun-harvard')
 class MySmartLauncher(JobLauncher):
@@ -60,7 +68,7 @@ site_configuration = {
                 },
                 {
                     'name': 'test',
-                    'scheduler': 'slurm',
+                    'scheduler': 'slurm-adaptive',
                     'environs': [
                          'builtin',
                          'gnu',
@@ -70,20 +78,32 @@ site_configuration = {
                          'intel-intelmpi'
                     ],
                     'descr': 'Cannon test partition',
-                    'max_jobs': 5,
+                    'max_jobs': 20,
+                    'sched_options': {'default_jobs': 5},
                     'launcher': 'srun-harvard',
-                    'access': ['-p test']
+                    'access': ['-p test'],
+                    'processor': {
+                        'num_cpus': 48,
+                        'num_cpus_per_core': 1,
+                        'num_sockets': 2,
+                        'num_cpus_per_socket': 24
+                    }
                 },
                 {
                     'name': 'gpu_test',
-                    'scheduler': 'slurm',
+                    'scheduler': 'slurm-adaptive',
                     'environs': [
                          'gpu'
                     ],
                     'descr': 'Cannon gpu_test partition',
-                    'max_jobs': 2,
+                    'max_jobs': 8,
+                    'sched_options': {'default_jobs': 2},
                     'launcher': 'srun-harvard',
                     'access': ['-p gpu_test'],
+                    'processor': {
+                        'num_cpus': 16,
+                        'num_cpus_per_core': 1
+                    },
                     'resources': [
                         {
                             'name': '_rfm_gpu',
@@ -173,6 +193,7 @@ site_configuration = {
                         'ref=%(check_perf_ref)s '
                         '(l=%(check_perf_lower_thres)s, '
                         'u=%(check_perf_upper_thres)s)|'
+                        'image=%(check_image_digest)s|'
                         '%(check_perf_unit)s'
                     ),
                     'append': True
@@ -181,3 +202,6 @@ site_configuration = {
         }
     ],
 }
+
+# Jobs of a partition become job steps inside a packed allocation
+site_configuration = packing.apply(site_configuration)
@@ -7,10 +7,18 @@
 # ReFrame FASSE cluster settings
 #
 
+import os
+import sys
+
 import reframe.utility.osext as osext
 from reframe.core.backends import register_launcher
 from reframe.core.launchers import JobLauncher
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                             '..')))
+import fasrclib.concurrency  # noqa: E402,F401
+import fasrclib.packing as packing  # noqa: E402
+
 
 @register_launcher('srun-harvard')
 class MySmartLauncher(JobLauncher):
@@ -48,7 +56,7 @@ site_configuration = {
                 },
                 {
                     'name': 'fasse',
-                    'scheduler': 'slurm',
+                    'scheduler': 'slurm-adaptive',
                     'environs': [
                          'builtin',
                          'gnu',
@@ -60,11 +68,17 @@ site_configuration = {
                     'descr': 'FASSE CPU',
                     'max_jobs': 100,
                     'launcher': 'srun-harvard',
-                    'access': ['-p fasse']
+                    'access': ['-p fasse'],
+                    'processor': {
+                        'num_cpus': 48,
+                        'num_cpus_per_core': 1,
+                        'num_sockets': 2,
+                        'num_cpus_per_socket': 24
+                    }
                 },
                 {
                     'name': 'fasse_gpu',
-                    'scheduler': 'slurm',
+                    'scheduler': 'slurm-adaptive',
                     'environs': [
                          'gpu'
                     ],
@@ -161,6 +175,7 @@ site_configuration = {
                         'ref=%(check_perf_ref)s '
                         '(l=%(check_perf_lower_thres)s, '
                         'u=%(check_perf_upper_thres)s)|'
+                        'image=%(check_image_digest)s|'
                         '%(check_perf_unit)s'
                     ),
                     'append': True
@@ -169,3 +184,6 @@ site_configuration = {
         }
     ],
 }
+
+# Jobs of a partition become job steps inside a packed allocation
+site_configuration = packing.apply(site_configuration)
@@ -0,0 +1,6 @@
+# Copyright 2021 FAS Research Computing Harvard University
+# ReFrame Project Developers. See the top-level LICENSE file for details.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+'''Shared helpers for the FASRC ReFrame checks and the tools around them.'''
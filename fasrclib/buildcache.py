@@ -0,0 +1,199 @@
+# Copyright 2021 FAS Research Computing Harvard University
+# ReFrame Project Developers. See the top-level LICENSE file for details.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+'''Content-addressed cache of build artifacts shared across sessions.
+
+A build is identified by a key over
+
+- the sources, i.e., the contents of the sources directory of the check,
+  which ReFrame copies into the stage directory only when it compiles,
+  including those behind symlinked directories such as ``Xdevice``;
+- the check, its build system and the options of the latter (flags,
+  makefile, make options, ...), the source path, the executable and the
+  pre- and post-build commands;
+- the programming environment, its compilers, flags and environment
+  variables and the modules of the environment and the check;
+- the identity of the compilers (their ``--version``), including ``nvcc``
+  for the checks built by a CUDA makefile, and the versions of the loaded
+  modules (``$LOADEDMODULES``).
+
+The last part is only known in the build job, after the modules are
+loaded, so the key is completed and looked up by the build script itself.
+On a hit the artifacts are unpacked into the stage directory and the build
+script exits before compiling; on a miss the files the build created are
+stored under the key once it succeeded.
+
+The cache lives in ``buildcache/`` next to the checks, or in
+``$FASRC_BUILD_CACHE_DIR``, which should be on a filesystem shared by the
+login nodes; set it to an empty string to disable the cache. Entries are
+never invalidated, only superseded by new keys, so the directory may be
+cleaned at any time.
+
+Checks enable it by inheriting :class:`fasrclib.hooks.CachedBuild`, whose
+hook calls :func:`apply` after their own compile hooks.
+'''
+
+import hashlib
+import os
+import shlex
+
+import reframe.utility.osext as osext
+
+
+CACHE_DIR = os.environ.get(
+    'FASRC_BUILD_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                 'buildcache')
+)
+
+# Marker of the start of the build; the files newer than it are cached
+_MARKER = '.rfm_build_start'
+
+
+def hash_tree(path):
+    '''SHA-256 of the names and contents of the files below ``path``,
+    ignoring ReFrame's own files and version control metadata.'''
+
+    h = hashlib.sha256()
+    for root, dirs, files in os.walk(path, followlinks=True):
+        dirs[:] = sorted(d for d in dirs if d != '.git')
+        for name in sorted(files):
+            if name.startswith('rfm_') or name == _MARKER:
+                continue
+
+            filename = os.path.join(root, name)
+            h.update(os.path.relpath(filename, path).encode())
+            with open(filename, 'rb') as fp:
+                for block in iter(lambda: fp.read(1 << 20), b''):
+                    h.update(block)
+
+    return h.hexdigest()
+
+
+def sources_key(test):
+    '''Hash of the sources of ``test``.'''
+
+    sourcesdir = test.sourcesdir
+    if not sourcesdir:
+        return ''
+
+    if isinstance(sourcesdir, dict) or osext.is_url(sourcesdir):
+        # Cloned in the build; pin a commit in the URL to rebuild on change
+        return repr(sourcesdir)
+
+    # Relative to the check as in ReFrame; mirror paths are absolute
+    return hash_tree(os.path.join(test.prefix, sourcesdir))
+
+
+def _uses_cuda(test):
+    # The CUDA makefiles call nvcc directly, so neither the build system
+    # nor the environment names it
+    makefile = getattr(test.build_system, 'makefile', None)
+    if makefile and 'cuda' in makefile.lower():
+        return True
+
+    sourcesdir = test.sourcesdir
+    if (not sourcesdir or isinstance(sourcesdir, dict) or
+        osext.is_url(sourcesdir)):
+        return False
+
+    sourcesdir = os.path.join(test.prefix, sourcesdir)
+    candidates = [makefile] if makefile else ['GNUmakefile', 'makefile',
+                                              'Makefile']
+    for name in candidates:
+        try:
+            with open(os.path.join(sourcesdir, name)) as fp:
+                return 'nvcc' in fp.read()
+        except OSError:
+            continue
+
+    return False
+
+
+def _compilers(test):
+    environ = test.current_environ
+    bs = test.build_system
+    ret = []
+    for name in ('cc', 'cxx', 'ftn', 'nvcc'):
+        cmd = getattr(bs, name, '') or getattr(environ, name, '')
+        if cmd and cmd not in ret:
+            ret.append(cmd)
+
+    if 'nvcc' not in ret and _uses_cuda(test):
+        ret.append('nvcc')
+
+    return ret
+
+
+def static_key(test):
+    '''The part of the key of ``test``'s build known before submitting it.'''
+
+    environ = test.current_environ
+    options = {k: v for k, v in vars(test.build_system).items()
+               if not k.startswith('_')}
+    items = [
+        sources_key(test),
+        test.unique_name,
+        type(test.build_system).__name__,
+        repr(sorted(options.items())),
+        repr(test.sourcepath), repr(getattr(test, 'executable', None)),
+        repr(test.prebuild_cmds), repr(test.postbuild_cmds),
+        repr(sorted(test.env_vars.items())),
+        repr(sorted(environ.env_vars.items())),
+        environ.name, repr(environ.modules), repr(test.modules),
+        repr([environ.cflags, environ.cxxflags, environ.cppflags,
+              environ.fflags, environ.ldflags]),
+        repr(_compilers(test)),
+    ]
+    return hashlib.sha256('\n'.join(items).encode()).hexdigest()
+
+
+def key_cmd(test):
+    '''Shell command that sets ``$rfm_build_key`` to the full key.'''
+
+    # The whole output, since nvcc prints its version on the last line
+    versions = ' '.join(
+        f'"$({shlex.quote(c)} --version 2>&1)"' for c in _compilers(test)
+    )
+    return (
+        f'rfm_build_key=$(printf "%s\\n" {static_key(test)} {versions} '
+        f'"$LOADEDMODULES" | sha256sum | cut -c1-32)'
+    )
+
+
+def restore_cmds(cachedir):
+    cachedir = shlex.quote(cachedir)
+    return [
+        f'if [ -f {cachedir}/$rfm_build_key.tar ]; then '
+        f'tar xf {cachedir}/$rfm_build_key.tar && '
+        f'echo "build cache: restored $rfm_build_key" && exit 0; fi',
+        f'touch {_MARKER}'
+    ]
+
+
+def store_cmds(cachedir):
+    cachedir = shlex.quote(cachedir)
+
+    # Written under a temporary name and renamed, so that concurrent builds
+    # never see a partial entry
+    return [
+        f'mkdir -p {cachedir}',
+        f'find . -type f -newer {_MARKER} ! -name "rfm_*" | '
+        f'tar cf {cachedir}/.$rfm_build_key.$$ -T -',
+        f'mv {cachedir}/.$rfm_build_key.$$ {cachedir}/$rfm_build_key.tar',
+        f'echo "build cache: stored $rfm_build_key"'
+    ]
+
+
+def apply(test, cachedir=None):
+    '''Make the build of ``test`` go through the cache.'''
+
+    cachedir = CACHE_DIR if cachedir is None else cachedir
+    if not cachedir:
+        return
+
+    test.prebuild_cmds = ([key_cmd(test)] + restore_cmds(cachedir) +
+                          test.prebuild_cmds)
+    test.postbuild_cmds = test.postbuild_cmds + store_cmds(cachedir)
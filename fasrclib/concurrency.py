@@ -0,0 +1,225 @@
+# Copyright 2021 FAS Research Computing Harvard University
+# ReFrame Project Developers. See the top-level LICENSE file for details.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+'''Number of jobs in flight per Slurm partition driven by its idle nodes.
+
+A static ``max_jobs`` either floods a busy partition or trickles jobs into
+an idle one. Partitions with the ``slurm-adaptive`` scheduler submit every
+job held (``sbatch --hold``) and release the held jobs with ``scontrol
+release`` only while the partition has room for them. The number of jobs
+in flight is recomputed from ``sinfo`` at most every
+``$FASRC_SINFO_INTERVAL`` (default 60) seconds as
+
+   idle nodes + mixed nodes // 2 + headroom
+
+bounded by the ``min_jobs`` scheduler option of the partition (default 1)
+below and by its ``max_jobs`` above; ``headroom`` (default 1) is another
+scheduler option. Until ``sinfo`` answers and whenever it fails, the limit
+is the ``default_jobs`` scheduler option, by default ``max_jobs``, so that
+a host without a working ``sinfo`` runs as many jobs as a static limit
+would. For example::
+
+   'scheduler': 'slurm-adaptive',
+   'max_jobs': 20,
+   'sched_options': {'min_jobs': 2, 'default_jobs': 5},
+
+To try the controller without Slurm, point ``$FASRC_SINFO_STUB`` to a JSON
+file with the node counts by partition, which is re-read on every query::
+
+   {"test": {"idle": 3, "mixed": 4}}
+'''
+
+import json
+import math
+import os
+import re
+import subprocess
+import time
+from typing import NamedTuple
+
+import reframe.core.runtime as runtime
+import reframe.core.schedulers.slurm as slurm
+from reframe.core.backends import register_scheduler
+
+
+INTERVAL = float(os.environ.get('FASRC_SINFO_INTERVAL', 60))
+
+STUB_ENV = 'FASRC_SINFO_STUB'
+
+
+class NodeCounts(NamedTuple):
+    idle: int
+    mixed: int
+    total: int
+
+
+def parse_sinfo(out):
+    '''Node counts from the output of ``sinfo -h -o '%T %D'``.'''
+
+    counts = {'idle': 0, 'mixed': 0}
+    total = 0
+    for line in out.splitlines():
+        if not line.strip():
+            continue
+
+        state, num = line.split()
+
+        # Flags such as `*` (not responding) or `~` (powered off) mean the
+        # node can not take a job right now
+        if state in counts:
+            counts[state] += int(num)
+
+        total += int(num)
+
+    return NodeCounts(counts['idle'], counts['mixed'], total)
+
+
+def sinfo(partition=None):
+    cmd = ['sinfo', '-h', '-o', '%T %D']
+    if partition:
+        cmd += ['-p', partition]
+
+    out = subprocess.run(cmd, check=True, capture_output=True, text=True,
+                         timeout=30).stdout
+    return parse_sinfo(out)
+
+
+def stub(partition, filename):
+    with open(filename) as fp:
+        counts = json.load(fp).get(partition or '', {})
+
+    idle, mixed = counts.get('idle', 0), counts.get('mixed', 0)
+    return NodeCounts(idle, mixed, counts.get('total', idle + mixed))
+
+
+def query(partition=None):
+    '''Node counts of ``partition``, from the stub if one is set.'''
+
+    filename = os.environ.get(STUB_ENV)
+    if filename:
+        return stub(partition, filename)
+
+    return sinfo(partition)
+
+
+def target(counts, min_jobs=1, max_jobs=None, headroom=1):
+    '''Jobs to have in flight given the node counts of the partition.'''
+
+    # Every idle node starts a job right away, a mixed one may take a job
+    # that does not need the whole node
+    num = counts.idle + counts.mixed // 2 + headroom
+    num = max(num, min_jobs)
+    if max_jobs:
+        num = min(num, max_jobs)
+
+    return num
+
+
+class Controller:
+    '''Limit of jobs in flight of one partition, recomputed every
+    ``interval`` seconds.'''
+
+    def __init__(self, partition=None, min_jobs=1, max_jobs=None,
+                 headroom=1, default_jobs=None, interval=INTERVAL,
+                 query=query):
+        self.partition = partition
+        self.min_jobs = min_jobs
+        self.max_jobs = max_jobs
+        self.headroom = headroom
+        self.default_jobs = default_jobs or max_jobs or min_jobs
+        self.interval = interval
+        self._query = query
+        self._limit = self.default_jobs
+        self._checked = -math.inf
+
+    def limit(self, now=None):
+        now = time.time() if now is None else now
+        if now - self._checked < self.interval:
+            return self._limit
+
+        self._checked = now
+        try:
+            counts = self._query(self.partition)
+        except (OSError, ValueError, subprocess.SubprocessError):
+            self._limit = self.default_jobs
+            return self._limit
+
+        self._limit = target(counts, self.min_jobs, self.max_jobs,
+                             self.headroom)
+        return self._limit
+
+
+def slurm_partition(access):
+    '''Slurm partition selected by the access options of a partition.'''
+
+    match = re.search(r'(?:^|\s)(?:-p\s*|--partition[=\s])(\S+)',
+                      ' '.join(access))
+    return match.group(1) if match else None
+
+
+@register_scheduler('slurm-adaptive')
+class AdaptiveSlurmJobScheduler(slurm.SlurmJobScheduler):
+    '''Slurm backend that releases its held jobs as the partition has room
+    for them.'''
+
+    def __init__(self):
+        super().__init__()
+        self._held = []
+        self._released = []
+        self._controller = None
+
+    def emit_preamble(self, job):
+        return super().emit_preamble(job) + [f'{self._prefix} --hold']
+
+    def submit(self, job):
+        super().submit(job)
+        self._held.append(job)
+        self._release()
+
+    def poll(self, *jobs):
+        super().poll(*jobs)
+        self._release()
+
+    def cancel_many(self, jobs):
+        # Jobs compare by job id, so they are looked up by identity
+        self._held = [j for j in self._held if all(j is not c for c in jobs)]
+        self._released = [j for j in self._released
+                          if all(j is not c for c in jobs)]
+        super().cancel_many(jobs)
+
+    def _max_jobs(self):
+        # max_jobs of the partition, next to its scheduler options
+        prefix = self._config_prefix.rpartition('/')[0]
+        return runtime.runtime().get_option(f'{prefix}/max_jobs')
+
+    def _release(self):
+        if not self._held:
+            return
+
+        if self._controller is None:
+            headroom = self.get_option('headroom')
+            self._controller = Controller(
+                slurm_partition(self._held[0].sched_access),
+                min_jobs=self.get_option('min_jobs') or 1,
+                max_jobs=self._max_jobs(),
+                headroom=1 if headroom is None else headroom,
+                default_jobs=self.get_option('default_jobs')
+            )
+
+        self._released = [j for j in self._released
+                          if not slurm.slurm_state_completed(j.state)]
+        limit = self._controller.limit()
+        num = limit - len(self._released)
+        if num <= 0:
+            return
+
+        jobs, self._held = self._held[:num], self._held[num:]
+        slurm._run_strict(
+            f'scontrol release {" ".join(job.jobid for job in jobs)}',
+            timeout=self._submit_timeout
+        )
+        self._released += jobs
+        self.log(f'released {len(jobs)} job(s); {len(self._released)} '
+                 f'in flight, limit {limit}, {len(self._held)} held')
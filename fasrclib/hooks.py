@@ -0,0 +1,85 @@
+# Copyright 2021 FAS Research Computing Harvard University
+# ReFrame Project Developers. See the top-level LICENSE file for details.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+'''Pipeline hooks shared by the checks.
+
+The job sizing, the calibrated references, the node fingerprint, the build
+cache and the mirrored user codes are each wired into a check by a hook. Instead of defining these
+hooks in every check, the checks inherit them from the plugins of this
+module::
+
+   @rfm.simple_test
+   class StreamTest(rfm.RegressionTest, hooks.Benchmark):
+       ...
+
+:class:`Benchmark` bundles all four; checks that need only some of them
+inherit :class:`SizedJob`, :class:`CalibratedReference`,
+:class:`NodeFingerprint` and :class:`CachedBuild` individually. The hooks run
+after those of the check in their stage, so that they see its final job
+options, commands, references and build options. The user code checks
+inherit :class:`UserCode`.
+'''
+
+import reframe as rfm
+
+import fasrclib.buildcache as buildcache
+import fasrclib.mirror as mirror
+import fasrclib.nodeinfo as nodeinfo
+import fasrclib.references as references
+import fasrclib.sizing as sizing
+
+
+class SizedJob(rfm.RegressionTestPlugin):
+    '''Applies the time limit and memory request derived from past jobs
+    (see :mod:`fasrclib.sizing`).'''
+
+    @run_before('run', always_last=True)
+    def right_size_job(self):
+        sizing.apply(self)
+
+
+class CalibratedReference(rfm.RegressionTestPlugin):
+    '''Overrides the references with the calibrated ones (see
+    :mod:`fasrclib.references`).'''
+
+    @run_before('performance', always_last=True)
+    def load_calibrated_reference(self):
+        references.apply(self)
+
+
+class NodeFingerprint(rfm.RegressionTestPlugin):
+    '''Records the fingerprint of the node the job runs on (see
+    :mod:`fasrclib.nodeinfo`).'''
+
+    @run_before('run', always_last=True)
+    def capture_node_info(self):
+        nodeinfo.capture(self)
+
+
+class CachedBuild(rfm.RegressionTestPlugin):
+    '''Restores the executables from the build cache instead of compiling
+    when nothing changed (see :mod:`fasrclib.buildcache`).'''
+
+    @run_before('compile', always_last=True)
+    def use_build_cache(self):
+        buildcache.apply(self)
+
+
+class UserCode(rfm.RegressionTestPlugin):
+    '''Takes the sources from the directory ``user_codes_dir`` of
+    User_Codes in the local mirror instead of downloading them on the node
+    (see :mod:`fasrclib.mirror`).'''
+
+    #: The directory of the example in User_Codes, e.g. ``AI/PyTorch``
+    user_codes_dir = variable(str)
+
+    @run_before('setup', always_last=True)
+    def set_user_codes_sourcesdir(self):
+        self.sourcesdir = mirror.user_codes_dir(self.user_codes_dir)
+
+
+class Benchmark(SizedJob, CalibratedReference, NodeFingerprint,
+                CachedBuild):
+    '''All hooks of this module, for the compiled benchmarks.'''
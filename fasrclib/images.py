@@ -0,0 +1,203 @@
+# Copyright 2021 FAS Research Computing Harvard University
+# ReFrame Project Developers. See the top-level LICENSE file for details.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+'''Shared cache of container images, keyed by registry digest.
+
+A tag such as ``docker://pytorch/pytorch:latest`` is resolved to the digest
+of the manifest it currently points to and the image is stored as
+``<cache>/<repository>/<digest>.sif``, pulled by digest. Which digest a tag
+resolved to, and when, is recorded in ``<cache>/<repository>/<tag>.json``.
+
+A tag is re-resolved with the registry only when its record is older than
+the TTL, so within the TTL the checks start without any network access; an
+image is pulled only when the upstream digest changed. If the registry can
+not be reached, the last recorded image is used.
+
+The cache is ``images/`` next to the checks or ``$FASRC_IMAGE_CACHE_DIR``
+and the TTL is ``$FASRC_IMAGE_TTL_DAYS`` (default 7) days. Images of
+superseded digests are not removed automatically.
+'''
+
+import json
+import os
+import re
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from typing import NamedTuple
+
+
+CACHE_DIR = os.environ.get(
+    'FASRC_IMAGE_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                 'images')
+)
+
+TTL = float(os.environ.get('FASRC_IMAGE_TTL_DAYS', 7)) * 86400
+
+DOCKER_HUB = 'registry-1.docker.io'
+
+# Manifest types, so that multi-platform images resolve to their index
+_MANIFEST_TYPES = ', '.join([
+    'application/vnd.oci.image.index.v1+json',
+    'application/vnd.docker.distribution.manifest.list.v2+json',
+    'application/vnd.oci.image.manifest.v1+json',
+    'application/vnd.docker.distribution.manifest.v2+json',
+])
+
+
+class ImageError(Exception):
+    pass
+
+
+class Image(NamedTuple):
+    #: Reference the image was resolved from, e.g.
+    #: ``docker://pytorch/pytorch:latest``
+    ref: str
+
+    #: Reference pinned to the digest, e.g.
+    #: ``docker://pytorch/pytorch@sha256:...``
+    pinned_ref: str
+    digest: str
+
+    #: Path of the SIF file in the cache
+    path: str
+
+    @property
+    def cached(self):
+        return os.path.exists(self.path)
+
+
+def parse_ref(ref):
+    '''Split ``docker://[registry/]repository[:tag]`` into registry,
+    repository and tag.'''
+
+    if not ref.startswith('docker://'):
+        raise ImageError(f'not a docker reference: {ref}')
+
+    name = ref[len('docker://'):]
+    registry = DOCKER_HUB
+    first, sep, rest = name.partition('/')
+    if sep and ('.' in first or ':' in first or first == 'localhost'):
+        registry, name = first, rest
+
+    name, _, tag = name.partition(':')
+    if registry == DOCKER_HUB and '/' not in name:
+        name = f'library/{name}'
+
+    return registry, name, tag or 'latest'
+
+
+def _token(challenge):
+    '''Anonymous pull token for a ``WWW-Authenticate: Bearer`` challenge.'''
+
+    params = dict(re.findall(r'(\w+)="([^"]*)"', challenge))
+    realm = params.pop('realm', None)
+    if not realm:
+        raise ImageError(f'unsupported registry authentication: {challenge}')
+
+    url = f'{realm}?{urllib.parse.urlencode(params)}'
+    with urllib.request.urlopen(url, timeout=30) as resp:
+        data = json.load(resp)
+
+    return data.get('token') or data.get('access_token')
+
+
+def remote_digest(ref):
+    '''Digest of the manifest ``ref`` points to in its registry.'''
+
+    registry, name, tag = parse_ref(ref)
+    url = f'https://{registry}/v2/{name}/manifests/{tag}'
+    headers = {'Accept': _MANIFEST_TYPES}
+    try:
+        for attempt in range(2):
+            req = urllib.request.Request(url, headers=headers, method='HEAD')
+            try:
+                with urllib.request.urlopen(req, timeout=30) as resp:
+                    digest = resp.headers.get('Docker-Content-Digest')
+                    if not digest:
+                        raise ImageError(f'{registry} returned no digest '
+                                         f'for {ref}')
+
+                    return digest
+            except urllib.error.HTTPError as err:
+                challenge = err.headers.get('WWW-Authenticate', '')
+                if err.code != 401 or attempt or not challenge:
+                    raise
+
+                headers['Authorization'] = f'Bearer {_token(challenge)}'
+    except (OSError, ValueError) as err:
+        raise ImageError(f'could not resolve {ref}: {err}') from None
+
+
+def _repo_dir(ref, cachedir):
+    registry, name, _ = parse_ref(ref)
+    repo = name if registry == DOCKER_HUB else f'{registry}/{name}'
+    return os.path.join(cachedir, repo.replace('/', '_'))
+
+
+def record_file(ref, cachedir=None):
+    _, _, tag = parse_ref(ref)
+    return os.path.join(_repo_dir(ref, cachedir or CACHE_DIR), f'{tag}.json')
+
+
+def _image(ref, digest, cachedir):
+    registry, name, _ = parse_ref(ref)
+    repo = name if registry == DOCKER_HUB else f'{registry}/{name}'
+    path = os.path.join(_repo_dir(ref, cachedir),
+                        f'{digest.replace(":", "_")}.sif')
+    return Image(ref, f'docker://{repo}@{digest}', digest, path)
+
+
+def resolve(ref, cachedir=None, ttl=None, now=None):
+    '''Resolve ``ref`` to an :class:`Image` in the cache, which may still
+    have to be pulled (see :attr:`Image.cached`).
+
+    :raises ImageError: if the registry can not be reached and nothing is
+        cached for ``ref``.
+    '''
+
+    cachedir = cachedir or CACHE_DIR
+    ttl = TTL if ttl is None else ttl
+    now = time.time() if now is None else now
+    filename = record_file(ref, cachedir)
+    try:
+        with open(filename) as fp:
+            record = json.load(fp)
+    except (FileNotFoundError, ValueError):
+        record = None
+
+    if record:
+        image = _image(ref, record['digest'], cachedir)
+        if image.cached and now - record['checked'] < ttl:
+            return image
+
+    try:
+        digest = remote_digest(ref)
+    except ImageError:
+        if record and image.cached:
+            # Offline; the last known image is better than none
+            return image
+
+        raise
+
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    tmpfile = f'{filename}.tmp{os.getpid()}'
+    with open(tmpfile, 'w') as fp:
+        json.dump({'digest': digest, 'checked': now}, fp)
+
+    os.replace(tmpfile, filename)
+    return _image(ref, digest, cachedir)
+
+
+def pull_cmd(image):
+    '''Shell command that pulls ``image`` by digest into the cache.'''
+
+    # Pulled under a temporary name, so that a failed or concurrent pull
+    # never leaves a partial image at the final path
+    tmp = f'{image.path}.tmp$$'
+    return (f'singularity pull --disable-cache {tmp} {image.pinned_ref} && '
+            f'mv {tmp} {image.path}')
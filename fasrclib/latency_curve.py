@@ -0,0 +1,111 @@
+# Copyright 2021 FAS Research Computing Harvard University
+# ReFrame Project Developers. See the top-level LICENSE file for details.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+'''Cache levels from a memory latency curve.
+
+The latency of a pointer chase over a growing working set forms plateaus,
+one per cache level and a last one for main memory. The curve is split into
+``num_levels`` segments of roughly constant latency by an optimal piecewise
+constant fit of the log latency (dynamic programming, the curves have a few
+dozen points). The latency of a level is the median of its segment and its
+capacity is the largest working set whose latency is still below the
+geometric mean of that plateau and the next one.
+'''
+
+import math
+import statistics
+from typing import NamedTuple
+
+
+class Level(NamedTuple):
+    # Capacity in bytes; None for main memory
+    size: int
+    latency: float
+
+
+def log_sizes(smallest, largest, per_octave=4):
+    '''Log-spaced working set sizes in bytes from ``smallest`` to
+    ``largest``, rounded to multiples of 64 bytes.'''
+
+    n = int(math.log2(largest / smallest) * per_octave)
+    ret = []
+    for i in range(n + 1):
+        size = int(smallest * 2**(i / per_octave)) // 64 * 64
+        if not ret or size > ret[-1]:
+            ret.append(size)
+
+    return ret
+
+
+def segment(values, num_segments, min_length=2):
+    '''Split ``values`` into ``num_segments`` consecutive segments that
+    minimize the total squared deviation from the segment means.
+
+    :returns: the list of the start indices of the segments.
+    '''
+
+    n = len(values)
+    num_segments = max(1, min(num_segments, n // min_length))
+    s1 = [0.0]
+    s2 = [0.0]
+    for v in values:
+        s1.append(s1[-1] + v)
+        s2.append(s2[-1] + v*v)
+
+    def cost(i, j):
+        return s2[j] - s2[i] - (s1[j] - s1[i])**2 / (j - i)
+
+    # best[k][j]: cost of splitting values[:j] into k segments
+    inf = float('inf')
+    best = [[inf] * (n + 1) for _ in range(num_segments + 1)]
+    start = [[0] * (n + 1) for _ in range(num_segments + 1)]
+    best[0][0] = 0.0
+    for k in range(1, num_segments + 1):
+        for j in range(k * min_length, n + 1):
+            for i in range((k-1) * min_length, j - min_length + 1):
+                c = best[k-1][i] + cost(i, j)
+                if c < best[k][j]:
+                    best[k][j] = c
+                    start[k][j] = i
+
+    ret = []
+    j = n
+    for k in range(num_segments, 0, -1):
+        j = start[k][j]
+        ret.append(j)
+
+    return ret[::-1]
+
+
+def detect_levels(sizes, latencies, num_levels, rise=0.5):
+    '''Detect the plateaus of a latency curve.
+
+    :arg sizes: the working set sizes in increasing order.
+    :arg latencies: the latency at every size.
+    :arg num_levels: number of plateaus, i.e., cache levels plus one.
+    :arg rise: fraction of the (logarithmic) step to the next plateau after
+        which a working set no longer counts as fitting in a level.
+    :returns: a list of :class:`Level`, the last one main memory.
+    '''
+
+    logs = [math.log(max(v, 1e-3)) for v in latencies]
+    starts = segment(logs, num_levels) + [len(logs)]
+    plateaus = [statistics.median(logs[i:j])
+                for i, j in zip(starts, starts[1:])]
+    ret = []
+    for k, (i, j) in enumerate(zip(starts, starts[1:])):
+        latency = math.exp(plateaus[k])
+        if k == len(plateaus) - 1:
+            ret.append(Level(None, latency))
+            break
+
+        limit = plateaus[k] + rise * (plateaus[k+1] - plateaus[k])
+        last = i
+        while last + 1 < len(logs) and logs[last + 1] <= limit:
+            last += 1
+
+        ret.append(Level(sizes[last], latency))
+
+    return ret
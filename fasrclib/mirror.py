@@ -0,0 +1,254 @@
+# Copyright 2021 FAS Research Computing Harvard University
+# ReFrame Project Developers. See the top-level LICENSE file for details.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+'''Local mirror of the sources the checks download.
+
+Checks that build third-party code take it from a pinned copy in the mirror
+instead of cloning it on every run, so that they are reproducible and keep
+working when the nodes lose outbound access. Every source is registered in
+:data:`GIT_SOURCES` under a name, with its URL and the tag or commit it is
+pinned to, and stored in ``<mirror>/<name>-<ref>/`` without the git
+metadata. The commit the ref resolved to is recorded in ``.mirror`` in the
+tree.
+
+The mirror is ``mirror/`` next to the checks or ``$FASRC_MIRROR_DIR``.
+Sources missing from it are fetched when a check needs them; to fill it
+ahead of time, e.g. before the nodes lose access::
+
+   python -m fasrclib.mirror fetch [NAME ...]
+
+Checks use a source as their sources directory::
+
+   @run_before('setup')
+   def set_sourcesdir(self):
+       self.sourcesdir = mirror.git_tree('hpcg')
+
+The files of `fasrc/User_Codes <https://github.com/fasrc/User_Codes>`__ the
+user code checks run are mirrored one by one, as listed in
+:data:`USER_CODES_FILES`, from the commit ``$FASRC_USER_CODES_REF``
+(default ``master``) resolved to when the mirror first needed it. The
+commit is recorded in ``<mirror>/User_Codes-<ref>.commit``; delete that file
+to move to the current commit of the ref. The files are stored in
+``<mirror>/User_Codes-<commit>/`` under their path in the repository.
+Checks use the directory of their example as sources directory by
+inheriting :class:`fasrclib.hooks.UserCode`::
+
+   class PyMonteCarloPi(rfm.RunOnlyRegressionTest, hooks.UserCode):
+       user_codes_dir = 'Languages/Python/Example1'
+'''
+
+import argparse
+import fcntl
+import os
+import re
+import shutil
+import subprocess
+import sys
+import urllib.request
+
+
+MIRROR_DIR = os.environ.get(
+    'FASRC_MIRROR_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                 'mirror')
+)
+
+# name: (URL, tag or commit)
+GIT_SOURCES = {
+    'hpcg': ('https://github.com/hpcg-benchmark/hpcg.git',
+             'HPCG-release-3-1-0'),
+}
+
+USER_CODES_URL = 'https://github.com/fasrc/User_Codes.git'
+
+USER_CODES_RAW_URL = 'https://raw.githubusercontent.com/fasrc/User_Codes'
+
+USER_CODES_REF = os.environ.get('FASRC_USER_CODES_REF', 'master')
+
+# Files of User_Codes used by the checks
+USER_CODES_FILES = (
+    'AI/PyTorch/check_gpu.py',
+    'AI/TensorFlow/Example4/tf_test_multi_gpu.py',
+    'Languages/Cpp/Example5/dot_prod.cpp',
+    'Languages/Python/Example1/mc_pi.py',
+    'Languages/Python/Example2/build_env.sh',
+    'Languages/Python/Example2/numpy_pandas_ex.py',
+    'Languages/R/Example1/count_down.R',
+    'Parallel_Computing/MATLAB/Example1/parallel_monte_carlo.m',
+)
+
+
+class MirrorError(Exception):
+    pass
+
+
+def tree_path(name, mirrordir=None):
+    _, ref = GIT_SOURCES[name]
+    return os.path.join(mirrordir or MIRROR_DIR, f'{name}-{ref}')
+
+
+def _git(*args, cwd=None):
+    try:
+        return subprocess.run(['git', *args], cwd=cwd, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError) as err:
+        msg = getattr(err, 'stderr', None) or str(err)
+        raise MirrorError(f'git {args[0]} failed: {msg.strip()}') from None
+
+
+def fetch_git(name, mirrordir=None):
+    '''Fetch source ``name`` into the mirror unless it is there already and
+    return its path.'''
+
+    url, ref = GIT_SOURCES[name]
+    path = tree_path(name, mirrordir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f'{path}.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if os.path.isdir(path):
+            return path
+
+        tmpdir = f'{path}.tmp{os.getpid()}'
+        shutil.rmtree(tmpdir, ignore_errors=True)
+        try:
+            # A commit can not be cloned directly, a tag or branch can
+            _git('init', '-q', tmpdir)
+            _git('fetch', '-q', '--depth', '1', url, ref, cwd=tmpdir)
+            _git('checkout', '-q', 'FETCH_HEAD', cwd=tmpdir)
+            commit = _git('rev-parse', 'HEAD', cwd=tmpdir)
+            shutil.rmtree(os.path.join(tmpdir, '.git'))
+            with open(os.path.join(tmpdir, '.mirror'), 'w') as fp:
+                fp.write(f'url: {url}\nref: {ref}\ncommit: {commit}\n')
+
+            os.rename(tmpdir, path)
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    return path
+
+
+def git_tree(name, mirrordir=None):
+    '''Path of the pinned tree of source ``name``, fetching it into the
+    mirror if needed.
+
+    :raises MirrorError: if the source is not mirrored and can not be
+        fetched.
+    '''
+
+    path = tree_path(name, mirrordir)
+    if os.path.isdir(path):
+        return path
+
+    return fetch_git(name, mirrordir)
+
+
+def user_codes_commit(mirrordir=None):
+    '''The commit of User_Codes the mirror is pinned to.'''
+
+    if re.fullmatch(r'[0-9a-f]{40}', USER_CODES_REF):
+        return USER_CODES_REF
+
+    mirrordir = mirrordir or MIRROR_DIR
+    pinfile = os.path.join(mirrordir, f'User_Codes-{USER_CODES_REF}.commit')
+    try:
+        with open(pinfile) as fp:
+            return fp.read().strip()
+    except FileNotFoundError:
+        pass
+
+    out = _git('ls-remote', USER_CODES_URL, USER_CODES_REF)
+    if not out:
+        raise MirrorError(f'{USER_CODES_REF} not found in {USER_CODES_URL}')
+
+    commit = out.split()[0]
+    os.makedirs(mirrordir, exist_ok=True)
+    tmpfile = f'{pinfile}.tmp{os.getpid()}'
+    with open(tmpfile, 'w') as fp:
+        fp.write(f'{commit}\n')
+
+    os.replace(tmpfile, pinfile)
+    return commit
+
+
+def fetch_user_code(path, mirrordir=None):
+    '''Fetch file ``path`` of User_Codes at the pinned commit into the
+    mirror unless it is there already and return its local path.'''
+
+    mirrordir = mirrordir or MIRROR_DIR
+    commit = user_codes_commit(mirrordir)
+    filename = os.path.join(mirrordir, f'User_Codes-{commit}', path)
+    if os.path.exists(filename):
+        return filename
+
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    tmpfile = f'{filename}.tmp{os.getpid()}'
+    try:
+        with urllib.request.urlopen(f'{USER_CODES_RAW_URL}/{commit}/{path}',
+                                    timeout=60) as resp:
+            with open(tmpfile, 'wb') as fp:
+                shutil.copyfileobj(resp, fp)
+
+        os.replace(tmpfile, filename)
+    except OSError as err:
+        raise MirrorError(f'could not fetch {path}: {err}') from None
+    finally:
+        if os.path.exists(tmpfile):
+            os.remove(tmpfile)
+
+    return filename
+
+
+def user_codes_dir(dirname, mirrordir=None):
+    '''Directory of User_Codes ``dirname`` in the mirror, with the files of
+    :data:`USER_CODES_FILES` in it fetched if needed.
+
+    :raises MirrorError: if a file is not mirrored and can not be fetched.
+    '''
+
+    files = [f for f in USER_CODES_FILES
+             if os.path.dirname(f) == dirname.strip('/')]
+    if not files:
+        raise MirrorError(f'no files of {dirname} in USER_CODES_FILES')
+
+    for f in files:
+        path = fetch_user_code(f, mirrordir)
+
+    return os.path.dirname(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m fasrclib.mirror')
+    parser.add_argument('--mirror', default=MIRROR_DIR,
+                        help='mirror directory (default: %(default)s)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    fetch = subparsers.add_parser('fetch', help='fetch missing sources')
+    names = [*GIT_SOURCES, 'user_codes']
+    fetch.add_argument('names', nargs='*', metavar='NAME',
+                       help=f'sources to fetch (default: all of '
+                            f'{", ".join(names)})')
+    args = parser.parse_args(argv)
+
+    ret = 0
+    for name in args.names or names:
+        if name not in names:
+            print(f'{name}: unknown source', file=sys.stderr)
+            ret = 1
+            continue
+
+        try:
+            if name == 'user_codes':
+                for f in USER_CODES_FILES:
+                    print(f'{name}: {fetch_user_code(f, args.mirror)}')
+            else:
+                print(f'{name}: {fetch_git(name, args.mirror)}')
+        except MirrorError as err:
+            print(f'{name}: {err}', file=sys.stderr)
+            ret = 1
+
+    return ret
+
+
+if __name__ == '__main__':
+    sys.exit(main())
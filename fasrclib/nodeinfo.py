@@ -0,0 +1,150 @@
+# Copyright 2021 FAS Research Computing Harvard University
+# ReFrame Project Developers. See the top-level LICENSE file for details.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+'''Hardware fingerprint of the node a job actually ran on.
+
+Partitions such as ``cannon:test`` mix node generations, so the partition
+alone does not tell what hardware a result comes from. Checks capture a
+fingerprint of the node in the job script by inheriting
+:class:`fasrclib.hooks.NodeFingerprint`, which calls :func:`capture`, and
+:func:`fasrclib.references.apply` uses it to resolve node-specific
+references.
+
+A node is described by a small dictionary, e.g.::
+
+   {'cpu': 'Intel(R) Xeon(R) Platinum 8268 CPU @ 2.90GHz', 'sockets': 2,
+    'numa_nodes': 2, 'dimms': 12, 'gpu': 'NVIDIA A100-SXM4-40GB', ...}
+
+and node models are written as *specs*, ``;``-separated ``field=value``
+pairs of a subset of these fields, e.g. ``cpu=AMD EPYC 7763 64-Core
+Processor;sockets=2``.
+'''
+
+import os
+import re
+
+
+NODE_INFO_FILE = 'rfm_node_info.txt'
+
+# Fields that identify a node model, in the order they appear in specs
+SPEC_FIELDS = ('cpu', 'sockets', 'dimms', 'gpu')
+
+_LSCPU_FIELDS = {
+    'Model name': ('cpu', str),
+    'Socket(s)': ('sockets', int),
+    'Core(s) per socket': ('cores_per_socket', int),
+    'Thread(s) per core': ('threads_per_core', int),
+    'NUMA node(s)': ('numa_nodes', int),
+    'CPU(s)': ('num_cpus', int),
+    'CPU max MHz': ('max_mhz', float),
+    'Flags': ('flags', str),
+    'SVE vector length': ('sve_vector_length', int),
+}
+
+
+def detect_cmd(filename=NODE_INFO_FILE):
+    '''Shell command that writes the fingerprint of the current node.'''
+
+    return (
+        f'{{ lscpu; '
+        f'echo "DIMMs: $(ls -d /sys/devices/system/edac/mc/mc*/dimm* '
+        f'2>/dev/null | wc -l)"; '
+        f'echo "SVE vector length: $(cat '
+        f'/proc/sys/abi/sve_default_vector_length 2>/dev/null)"; '
+        f'nvidia-smi --query-gpu=name --format=csv,noheader 2>/dev/null | '
+        f'sed "s/^/GPU: /"; '
+        f'}} > {filename}'
+    )
+
+
+def capture(test):
+    '''Make ``test`` record the fingerprint of its node before running.'''
+
+    cmd = detect_cmd()
+    if cmd not in test.prerun_cmds:
+        test.prerun_cmds = [cmd] + test.prerun_cmds
+        test.keep_files = test.keep_files + [NODE_INFO_FILE]
+
+
+def parse(text):
+    '''Parse the output of :func:`detect_cmd`.'''
+
+    info = {}
+    gpus = []
+    for line in text.splitlines():
+        key, sep, value = line.partition(':')
+        if not sep:
+            continue
+
+        key, value = key.strip(), value.strip()
+        if key in _LSCPU_FIELDS:
+            name, conv = _LSCPU_FIELDS[key]
+            try:
+                info.setdefault(name, conv(value))
+            except ValueError:
+                pass
+        elif key == 'DIMMs' and value.isdigit() and int(value):
+            info['dimms'] = int(value)
+        elif key == 'GPU':
+            gpus.append(value)
+
+    if gpus:
+        info['gpu'] = gpus[0]
+        info['num_gpus'] = len(gpus)
+
+    return info
+
+
+def load(test):
+    '''Return the fingerprint recorded by ``test`` or an empty dictionary
+    if none was captured.'''
+
+    try:
+        with open(os.path.join(test.stagedir, NODE_INFO_FILE)) as fp:
+            return parse(fp.read())
+    except (FileNotFoundError, TypeError):
+        return {}
+
+
+def spec(info):
+    '''Return the spec of the node model described by ``info``.'''
+
+    return ';'.join(f'{f}={info[f]}' for f in SPEC_FIELDS if f in info)
+
+
+def parse_spec(s):
+    ret = {}
+    for item in s.split(';'):
+        name, sep, value = item.partition('=')
+        if sep:
+            ret[name.strip()] = value.strip()
+
+    return ret
+
+
+def match(s, info):
+    '''Return how many fields of spec ``s`` match ``info``, or ``-1`` if
+    any of them does not.
+
+    CPU and GPU models match if the spec is a case-insensitive substring of
+    the detected model, so ``cpu=Platinum 8268`` matches the full model
+    name.
+    '''
+
+    score = 0
+    for name, value in parse_spec(s).items():
+        actual = info.get(name)
+        if actual is None:
+            return -1
+
+        if name in ('cpu', 'gpu'):
+            if not re.search(re.escape(value), str(actual), re.IGNORECASE):
+                return -1
+        elif str(actual) != value:
+            return -1
+
+        score += 1
+
+    return score
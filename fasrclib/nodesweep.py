@@ -0,0 +1,316 @@
+# Copyright 2021 FAS Research Computing Harvard University
+# ReFrame Project Developers. See the top-level LICENSE file for details.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+'''Run single-node checks on every node of a partition and compare the
+nodes with the fleet.
+
+A sweep runs the chosen checks of :data:`CHECKS` once on every node of a
+partition, a node list or a reservation with ReFrame's ``--distribute``:
+every check is pinned to one node per test case and the cases run in
+parallel, as many at a time as the partition allows. The results are read
+back from the run report and put in one table with a row per node and a
+column per check and performance variable. Every value comes with its
+robust z-score against all nodes, ``(value - median) / (1.4826 * MAD)``,
+so that the few bad nodes a sweep is looking for do not hide themselves by
+inflating the spread; values beyond the threshold are marked.
+
+::
+
+   python -m fasrclib.nodesweep run -C config/cannon.py --system cannon:test \\
+       [--nodelist 'holy7c[0101-0148]' | --reservation maint] \\
+       [--checks dgemm,stream,latency] [--report FILE] [-- REFRAME_ARGS]
+   python -m fasrclib.nodesweep table REPORT [...] [--threshold 3] [--csv FILE]
+'''
+
+import argparse
+import csv
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import NamedTuple
+
+
+CHECKS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'checks'
+)
+
+# name: (check file relative to the checks, test name)
+CHECKS = {
+    'dgemm': ('microbenchmarks/cpu/dgemm/dgemm.py', 'DGEMMTest'),
+    'stream': ('microbenchmarks/cpu/stream/stream.py', 'StreamTest'),
+    'latency': ('microbenchmarks/cpu/latency/latency.py', 'CPULatencyTest'),
+    'gpu_burn': ('microbenchmarks/gpu/gpu_burn/gpu_burn_test.py',
+                 'GpuBurnTest'),
+}
+
+DEFAULT_CHECKS = ('dgemm', 'stream', 'latency')
+
+# Scale of the MAD to the standard deviation of a normal distribution
+_MAD_SCALE = 1.4826
+
+
+class Result(NamedTuple):
+    node: str
+    check: str
+    environ: str
+    perf_var: str
+    value: float
+    unit: str
+
+
+def reframe_cmd(config, system, checks=DEFAULT_CHECKS, nodelist=None,
+                reservation=None, state='avail', report=None,
+                reframe_args=()):
+    '''Command line of ``reframe`` running ``checks`` on every node.'''
+
+    cmd = ['reframe', '-C', config, '--system', system]
+    for name in checks:
+        cmd += ['-c', os.path.join(CHECKS_DIR, CHECKS[name][0])]
+
+    names = '|'.join(CHECKS[name][1] for name in checks)
+    cmd += ['-n', f'^({names})$', f'--distribute={state}']
+    if nodelist:
+        cmd += ['-J', f'nodelist={nodelist}']
+
+    if reservation:
+        cmd += ['-J', f'reservation={reservation}']
+
+    if report:
+        cmd += [f'--report-file={report}']
+
+    return cmd + ['-r', *reframe_args]
+
+
+def load_results(filename):
+    '''Performance values of the single-node test cases of a run report.'''
+
+    with open(filename) as fp:
+        report = json.load(fp)
+
+    ret = []
+    for run in report['runs']:
+        for tc in run['testcases']:
+            nodes = tc.get('job_nodelist') or []
+            if len(nodes) != 1:
+                continue
+
+            node = nodes[0]
+            for key, perf in (tc.get('perfvalues') or {}).items():
+                value, unit = perf[0], perf[4]
+                if value is None:
+                    continue
+
+                # Variables named after the node, as those of DGEMMTest,
+                # are the one value of the check
+                perf_var = key.split(':', 2)[-1]
+                if perf_var in (node, node.split('.')[0]):
+                    perf_var = ''
+
+                ret.append(Result(node, tc['name'], tc['environ'], perf_var,
+                                  float(value), unit or ''))
+
+    return ret
+
+
+def failures(filename):
+    '''Node and name of the single-node test cases that failed.'''
+
+    with open(filename) as fp:
+        report = json.load(fp)
+
+    return [(tc['job_nodelist'][0], tc['name'])
+            for run in report['runs'] for tc in run['testcases']
+            if tc['result'] == 'fail' and
+            len(tc.get('job_nodelist') or []) == 1]
+
+
+def zscores(values):
+    '''Robust z-scores of ``values`` against their median.'''
+
+    if len(values) < 2:
+        return [0.0] * len(values)
+
+    median = statistics.median(values)
+    scale = _MAD_SCALE * statistics.median(abs(v - median) for v in values)
+    if not scale:
+        # More than half of the values are equal
+        scale = statistics.pstdev(values)
+
+    if not scale:
+        return [0.0] * len(values)
+
+    return [(v - median) / scale for v in values]
+
+
+def column_names(results):
+    '''Column of every result, with the environment only for the checks
+    that ran in more than one.'''
+
+    environs = {}
+    for r in results:
+        environs.setdefault(r.check, set()).add(r.environ)
+
+    ret = []
+    for r in results:
+        name = r.check
+        if len(environs[r.check]) > 1:
+            name += f'/{r.environ}'
+
+        ret.append(f'{name}:{r.perf_var}' if r.perf_var else name)
+
+    return ret
+
+
+def fleet_table(results):
+    '''``{node: {column: (value, unit, z)}}`` and the sorted columns.'''
+
+    columns = {}
+    for r, col in zip(results, column_names(results)):
+        # The last value wins if a check ran more than once on a node
+        columns.setdefault(col, {})[r.node] = (r.value, r.unit)
+
+    table = {}
+    for col, values in columns.items():
+        nodes = sorted(values)
+        z = zscores([values[n][0] for n in nodes])
+        for node, score in zip(nodes, z):
+            value, unit = values[node]
+            table.setdefault(node, {})[col] = (value, unit, score)
+
+    return table, sorted(columns)
+
+
+def print_table(table, columns, threshold=3.0, failed=(), file=None):
+    file = file or sys.stdout
+    failed_by_node = {}
+    for node, check in failed:
+        failed_by_node.setdefault(node, []).append(check)
+
+    def worst(node):
+        return max((abs(v[2]) for v in table.get(node, {}).values()),
+                   default=0.0)
+
+    nodes = sorted(set(table) | set(failed_by_node),
+                   key=lambda n: (-len(failed_by_node.get(n, [])),
+                                  -worst(n), n))
+    units = {}
+    for row in table.values():
+        for col, (_, unit, _) in row.items():
+            units[col] = unit
+
+    width = max([len(n) for n in nodes] + [4])
+    cells = [f'{c} [{units.get(c, "")}]' for c in columns]
+    cw = [max(len(c), 16) for c in cells]
+    print(f'{"node":<{width}}  ' +
+          '  '.join(f'{c:>{w}}' for c, w in zip(cells, cw)) + '  failed',
+          file=file)
+    for node in nodes:
+        line = []
+        for col, w in zip(columns, cw):
+            try:
+                value, _, z = table[node][col]
+            except KeyError:
+                line.append(f'{"-":>{w}}')
+                continue
+
+            mark = '*' if abs(z) > threshold else ' '
+            line.append(f'{f"{value:.4g} ({z:+.1f}){mark}":>{w}}')
+
+        print(f'{node:<{width}}  ' + '  '.join(line) + '  ' +
+              ','.join(sorted(set(failed_by_node.get(node, [])))), file=file)
+
+    outliers = sum(1 for n in table for v in table[n].values()
+                   if abs(v[2]) > threshold)
+    print(f'{len(nodes)} node(s), {outliers} value(s) beyond '
+          f'|z| > {threshold:g} (*), {len(failed_by_node)} node(s) with '
+          f'failures', file=file)
+
+
+def write_csv(filename, table):
+    with open(filename, 'w', newline='') as fp:
+        writer = csv.writer(fp)
+        writer.writerow(['node', 'column', 'value', 'unit', 'z'])
+        for node in sorted(table):
+            for col, (value, unit, z) in sorted(table[node].items()):
+                writer.writerow([node, col, value, unit, f'{z:.3f}'])
+
+
+def report_table(reports, threshold=3.0, csvfile=None):
+    results, failed = [], []
+    for filename in reports:
+        results += load_results(filename)
+        failed += failures(filename)
+
+    table, columns = fleet_table(results)
+    print_table(table, columns, threshold, failed)
+    if csvfile:
+        write_csv(csvfile, table)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m fasrclib.nodesweep')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run = subparsers.add_parser('run', help='run the checks on every node')
+    run.add_argument('-C', '--config', required=True,
+                     help='ReFrame configuration file')
+    run.add_argument('--system', required=True, metavar='SYSTEM:PARTITION')
+    where = run.add_mutually_exclusive_group()
+    where.add_argument('--nodelist', help='nodes to sweep, e.g. '
+                                          "'holy7c[0101-0148]'")
+    where.add_argument('--reservation', help='sweep the nodes of a '
+                                             'reservation')
+    run.add_argument('--state', default='avail',
+                     help='state of the nodes to sweep, as for '
+                          "ReFrame's --distribute (default: %(default)s)")
+    run.add_argument('--checks', default=','.join(DEFAULT_CHECKS),
+                     help=f'checks to run, of {", ".join(CHECKS)} '
+                          f'(default: %(default)s)')
+    run.add_argument('--report', help='run report (default: '
+                                      'nodesweep-SYSTEM-PARTITION-TIME.json)')
+    table = subparsers.add_parser('table', help='per-node table of reports')
+    table.add_argument('reports', nargs='+', metavar='REPORT')
+    for p in (run, table):
+        p.add_argument('--threshold', type=float, default=3.0,
+                       help='|z| beyond which a value is marked '
+                            '(default: %(default)s)')
+        p.add_argument('--csv', help='also write the table to this file')
+
+    run.add_argument('reframe_args', nargs=argparse.REMAINDER,
+                     help='more arguments of reframe, after --')
+    args = parser.parse_args(argv)
+    if args.command == 'table':
+        report_table(args.reports, args.threshold, args.csv)
+        return 0
+
+    checks = [c.strip() for c in args.checks.split(',') if c.strip()]
+    unknown = [c for c in checks if c not in CHECKS]
+    if unknown:
+        parser.error(f'unknown check(s): {", ".join(unknown)}')
+
+    report = args.report or os.path.abspath(
+        f'nodesweep-{args.system.replace(":", "-")}-'
+        f'{time.strftime("%Y%m%dT%H%M%S")}.json'
+    )
+    reframe_args = args.reframe_args
+    if reframe_args[:1] == ['--']:
+        reframe_args = reframe_args[1:]
+
+    cmd = reframe_cmd(args.config, args.system, checks, args.nodelist,
+                      args.reservation, args.state, report, reframe_args)
+    # Failing checks are expected on bad nodes; the table shows them
+    subprocess.run(cmd)
+    if not os.path.exists(report):
+        print(f'no run report in {report}', file=sys.stderr)
+        return 1
+
+    report_table([report], args.threshold, args.csv)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,204 @@
+# Copyright 2021 FAS Research Computing Harvard University
+# ReFrame Project Developers. See the top-level LICENSE file for details.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+'''Run the checks of a partition inside one Slurm allocation.
+
+Every check is normally submitted as its own ``sbatch`` job, so after a
+maintenance most of a session is spent waiting in the queue. In packed mode
+one allocation is requested per partition and ReFrame runs inside it: the
+partition is switched to the ``local`` scheduler and its jobs become job
+steps of the allocation, launched with ``srun --exact`` and the tasks, CPUs,
+memory and GPUs each check asks for. Every check keeps its own stage and
+output directories, job script, sanity and performance evaluation and
+perflog; only the submission changes, so the results are recorded under the
+same system and partition as in a normal session.
+
+Submit one allocation per partition with::
+
+   python -m fasrclib.packing -C config/cannon.py --system cannon:test \\
+       [--nodes N] [--time 2:00:00] [--max-jobs 1] -- -c checks/... -r
+
+Everything after ``--`` is passed to ``reframe``. Checks that do not fit in
+the allocation, i.e., that need more nodes or CPUs than it has once their
+hooks set their tasks, are skipped when their job step is launched. The
+checks run one after the other by default, so that the benchmarks have the
+nodes to themselves; raise ``--max-jobs`` to run independent checks
+concurrently.
+
+The configs enable it with::
+
+   site_configuration = packing.apply(site_configuration)
+
+which leaves the configuration unchanged outside a packed allocation.
+'''
+
+import functools
+import math
+import os
+import runpy
+import shlex
+
+from reframe.core.backends import register_launcher
+from reframe.core.exceptions import SkipTestError
+from reframe.core.launchers import JobLauncher
+
+
+# Set in the packed allocation to the partition it runs, e.g. cannon:test
+PACKED_ENV = 'FASRC_PACKED_PARTITION'
+
+# Concurrent job steps in the allocation
+MAX_JOBS_ENV = 'FASRC_PACKED_MAX_JOBS'
+
+# Job options that also apply to a job step
+STEP_OPTIONS = ('--mem', '--gres', '--gpus', '--cpus-per-gpu')
+
+
+def misfit(job, nodes=None, cpus_per_node=None):
+    '''Why ``job`` does not fit in the allocation of ``nodes`` nodes with
+    ``cpus_per_node`` CPUs each, or :obj:`None` if it does.
+
+    Both default to those of the enclosing allocation. The job must have its
+    final tasks, i.e., the hooks of its check must have run.
+    '''
+
+    if nodes is None:
+        nodes = int(os.environ.get('SLURM_JOB_NUM_NODES', 1))
+
+    if cpus_per_node is None:
+        cpus_per_node = int(os.environ.get('SLURM_CPUS_ON_NODE', 0))
+
+    if job.num_tasks is not None and job.num_tasks <= 0:
+        # Flexible; sized to the nodes the step gets
+        return None
+
+    num_tasks = job.num_tasks or 1
+
+    if job.num_tasks_per_node:
+        needed = math.ceil(num_tasks / job.num_tasks_per_node)
+        if needed > nodes:
+            return f'{needed} node(s) needed, {nodes} allocated'
+
+    cpus = num_tasks * (job.num_cpus_per_task or 1)
+    if cpus_per_node and cpus > nodes * cpus_per_node:
+        return f'{cpus} cpu(s) needed, {nodes * cpus_per_node} allocated'
+
+    return None
+
+
+class PackedSrunLauncher(JobLauncher):
+    '''Runs the job as a step of the enclosing allocation with the
+    resources of the job.'''
+
+    mpi = 'pmix'
+
+    def command(self, job):
+        reason = misfit(job)
+        if reason:
+            raise SkipTestError(f'does not fit in the packed allocation: '
+                                f'{reason}')
+
+        ret = ['srun', '--exact', f'--ntasks={job.num_tasks or 1}',
+               f'--cpus-per-task={job.num_cpus_per_task or 1}']
+        if job.num_tasks_per_node:
+            ret.append(f'--ntasks-per-node={job.num_tasks_per_node}')
+
+        ret += [opt for opt in job.options if opt.startswith(STEP_OPTIONS)]
+        ret.append(f'--mpi={self.mpi}')
+        return ret
+
+
+@register_launcher('srun-packed')
+class PackedSrunPmixLauncher(PackedSrunLauncher):
+    mpi = 'pmix'
+
+
+@register_launcher('srun-packed-pmi2')
+class PackedSrunPmi2Launcher(PackedSrunLauncher):
+    mpi = 'pmi2'
+
+
+# Launcher of a packed partition by launcher of the partition
+LAUNCHERS = {
+    'srun-harvard': 'srun-packed',
+    'srun-harvard-pmi2': 'srun-packed-pmi2',
+}
+
+
+def apply(site_configuration, packed=None, max_jobs=None):
+    '''Turn the partition ``packed`` (``$FASRC_PACKED_PARTITION`` by
+    default) of ``site_configuration`` into one that runs its jobs as steps
+    of the current allocation. The configuration is returned unchanged if
+    no partition is packed.'''
+
+    packed = packed or os.environ.get(PACKED_ENV)
+    if not packed:
+        return site_configuration
+
+    max_jobs = max_jobs or int(os.environ.get(MAX_JOBS_ENV, 1))
+    sysname, _, partname = packed.partition(':')
+    for system in site_configuration['systems']:
+        if system['name'] != sysname:
+            continue
+
+        for part in system['partitions']:
+            if part['name'] == partname:
+                part['scheduler'] = 'local'
+                part['launcher'] = LAUNCHERS.get(part['launcher'],
+                                                 part['launcher'])
+                part['access'] = []
+                part['max_jobs'] = max_jobs
+                part['descr'] = f"{part.get('descr', partname)} (packed)"
+
+    return site_configuration
+
+
+@functools.lru_cache()
+def load_config(filename):
+    # Once per process, since a config registers its launchers
+    return runpy.run_path(filename)['site_configuration']
+
+
+def find_partition(site_configuration, name):
+    sysname, _, partname = name.partition(':')
+    for system in site_configuration['systems']:
+        if system['name'] != sysname:
+            continue
+
+        for part in system['partitions']:
+            if part['name'] == partname:
+                return part
+
+    raise ValueError(f'no partition {name} in the configuration')
+
+
+def batch_script(config, name, reframe_args, nodes=1, time='2:00:00',
+                 max_jobs=1, gpus_per_node=None, sbatch_options=None,
+                 reframe='reframe'):
+    '''Job script of the allocation that runs ``reframe_args`` for
+    partition ``name`` of the config file ``config``.'''
+
+    part = find_partition(load_config(os.path.abspath(config)), name)
+    options = list(part.get('access', []))
+    options += [f'--job-name=rfm_packed_{name.replace(":", "_")}',
+                f'--nodes={nodes}', '--exclusive', f'--time={time}',
+                f'--output=rfm_packed_{name.replace(":", "_")}_%j.out']
+    if gpus_per_node:
+        for res in part.get('resources', []):
+            if res['name'] == '_rfm_gpu':
+                options += [opt.format(num_gpus_per_node=gpus_per_node)
+                            for opt in res['options']]
+
+    options += sbatch_options or []
+    cmd = [reframe, '-C', os.path.abspath(config), '--system', name,
+           *reframe_args]
+    lines = ['#!/bin/bash']
+    lines += [f'#SBATCH {opt}' for opt in options]
+    lines += [
+        f'export {PACKED_ENV}={name}',
+        f'export {MAX_JOBS_ENV}={max_jobs}',
+        f'cd {shlex.quote(os.getcwd())}',
+        ' '.join(shlex.quote(c) for c in cmd)
+    ]
+    return '\n'.join(lines) + '\n'
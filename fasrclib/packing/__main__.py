@@ -0,0 +1,78 @@
+# Copyright 2021 FAS Research Computing Harvard University
+# ReFrame Project Developers. See the top-level LICENSE file for details.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+'''Command line interface of allocation packing.
+
+Usage::
+
+   python -m fasrclib.packing -C CONFIG --system SYSTEM:PARTITION [...] -- REFRAME_ARGS
+'''
+
+import argparse
+import shutil
+import subprocess
+import sys
+
+from fasrclib.packing import batch_script
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m fasrclib.packing',
+        description='Submit one allocation per partition that runs the '
+                    'selected checks as job steps'
+    )
+    parser.add_argument('-C', '--config', required=True,
+                        help='ReFrame configuration file')
+    parser.add_argument('--system', action='append', required=True,
+                        metavar='SYSTEM:PARTITION',
+                        help='partition to run (repeat for more)')
+    parser.add_argument('--nodes', type=int, default=1,
+                        help='nodes per allocation (default: %(default)s)')
+    parser.add_argument('--time', default='2:00:00',
+                        help='time limit of the allocation '
+                             '(default: %(default)s)')
+    parser.add_argument('--max-jobs', type=int, default=1,
+                        help='concurrent checks (default: %(default)s)')
+    parser.add_argument('--gpus-per-node', type=int,
+                        help='GPUs to allocate per node')
+    parser.add_argument('--sbatch-option', action='append', default=[],
+                        metavar='OPT', help='extra sbatch option, e.g. '
+                                            '--reservation=maint')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='print the job scripts instead of submitting')
+    parser.add_argument('reframe_args', nargs=argparse.REMAINDER,
+                        help='arguments of reframe, after --')
+    args = parser.parse_args(argv)
+    reframe_args = args.reframe_args
+    if reframe_args[:1] == ['--']:
+        reframe_args = reframe_args[1:]
+
+    reframe = shutil.which('reframe') or 'reframe'
+    ret = 0
+    for name in args.system:
+        script = batch_script(args.config, name, reframe_args,
+                              nodes=args.nodes, time=args.time,
+                              max_jobs=args.max_jobs,
+                              gpus_per_node=args.gpus_per_node,
+                              sbatch_options=args.sbatch_option,
+                              reframe=reframe)
+        if args.dry_run:
+            print(script)
+            continue
+
+        proc = subprocess.run(['sbatch', '--parsable'], input=script,
+                              capture_output=True, text=True)
+        if proc.returncode:
+            print(f'{name}: {proc.stderr.strip()}', file=sys.stderr)
+            ret = 1
+        else:
+            print(f'{name}: job {proc.stdout.strip()}')
+
+    return ret
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,155 @@
+# Copyright 2021 FAS Research Computing Harvard University
+# ReFrame Project Developers. See the top-level LICENSE file for details.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+'''Theoretical double precision peak of a node.
+
+The peak is ``cores x flops per cycle x sustained all-core frequency``:
+
+- the cores and the instruction sets come from the fingerprint of the node
+  the job ran on (see :mod:`fasrclib.nodeinfo`);
+- the flops per cycle and core are those of one FMA unit of the widest
+  instruction set (AVX-512, AVX2, SVE, ...) times the FMA units per core,
+  which are looked up by model in :data:`FMA_UNITS`, with exceptions for
+  the models that execute wide vectors on narrower pipes;
+- the frequency is sampled from ``/proc/cpuinfo`` while all cores are busy,
+  with the maximum frequency reported by ``lscpu`` as a fallback, which
+  overstates the peak.
+
+Checks sample the frequency around their all-core run::
+
+   f'{peak.sample_frequency_cmd()}; {cmd}; {peak.stop_sampling_cmd()}'
+
+and compute the peak in their sanity function::
+
+   ghz = peak.sustained_frequency(self.stagedir) or peak.max_frequency(info)
+   gflops = peak.theoretical_peak(info, ghz)
+'''
+
+import os
+import re
+import statistics
+
+
+FREQUENCY_FILE = 'rfm_cpu_mhz.txt'
+
+# Double precision flops per cycle of one FMA unit by lscpu flag, widest
+# first; before AVX2 an add and a multiply unit count as one
+FLOPS_PER_FMA_UNIT = (
+    ('avx512f', 16),
+    ('avx2', 8),
+    ('avx', 4),
+    ('asimd', 4),
+    ('sse2', 2),
+)
+
+# FMA units per core by model, first match wins
+FMA_UNITS = (
+    # Skylake and Cascade Lake Bronze, Silver and Gold 5100/5200 have a
+    # single AVX-512 unit, except the Gold 5122 and 5222
+    (r'Xeon\(R\) Gold 5[12]22', 2),
+    (r'Xeon\(R\) (Bronze [34]|Silver 4|Gold 5)[12]\d\d', 1),
+)
+
+# FMA units per core of the models not in FMA_UNITS
+DEFAULT_FMA_UNITS = 2
+
+# Models whose vector pipes are narrower than their widest instruction set,
+# by flops per cycle and core
+MODEL_FLOPS_PER_CYCLE = (
+    # Zen 4 splits AVX-512 over two 256-bit pipes
+    (r'AMD EPYC \d{3}4', 16),
+    # Zen 1 splits AVX2 over two 128-bit pipes
+    (r'AMD EPYC 7\d\d1', 8),
+)
+
+
+def fma_units(info):
+    '''FMA units per core of the node described by ``info``.'''
+
+    for pattern, units in FMA_UNITS:
+        if re.search(pattern, info.get('cpu', '')):
+            return units
+
+    return DEFAULT_FMA_UNITS
+
+
+def flops_per_cycle(info, units=None):
+    '''Double precision flops per cycle and core of the node described by
+    ``info`` with ``units`` FMA units per core (looked up by default) or
+    :obj:`None` if its instruction sets are unknown.'''
+
+    for pattern, flops in MODEL_FLOPS_PER_CYCLE:
+        if re.search(pattern, info.get('cpu', '')):
+            return flops
+
+    units = units or fma_units(info)
+    flags = info.get('flags', '').split()
+    if 'sve' in flags and info.get('sve_vector_length'):
+        # An FMA of the vector length in bytes per unit
+        return units * 2 * info['sve_vector_length'] // 8
+
+    for flag, flops in FLOPS_PER_FMA_UNIT:
+        if flag in flags:
+            return units * flops
+
+    return None
+
+
+def num_cores(info):
+    '''Number of physical cores of the node or :obj:`None`.'''
+
+    try:
+        return info['sockets'] * info['cores_per_socket']
+    except KeyError:
+        return None
+
+
+def theoretical_peak(info, ghz, cores=None, flops=None, units=None):
+    '''Peak in Gflop/s of ``cores`` (all of the node by default) at ``ghz``
+    with ``flops`` per cycle and core (detected with ``units`` FMA units per
+    core by default) or :obj:`None` if anything is unknown.'''
+
+    cores = cores or num_cores(info)
+    flops = flops or flops_per_cycle(info, units)
+    if not (cores and flops and ghz):
+        return None
+
+    return cores * flops * ghz
+
+
+def sample_frequency_cmd(filename=FREQUENCY_FILE, interval=1):
+    '''Shell command that starts sampling the mean core frequency in MHz
+    into ``filename`` in the background.'''
+
+    return (
+        f'while true; do '
+        f'awk \'/^cpu MHz/ {{s += $4; n++}} '
+        f'END {{if (n) printf "%.0f\\n", s / n}}\' /proc/cpuinfo; '
+        f'sleep {interval}; done >> {filename} & rfm_sampler=$!'
+    )
+
+
+def stop_sampling_cmd():
+    return 'kill $rfm_sampler'
+
+
+def sustained_frequency(stagedir, filename=FREQUENCY_FILE):
+    '''Median of the sampled frequencies in GHz or :obj:`None` if there are
+    no samples, e.g., because ``/proc/cpuinfo`` has no frequencies.'''
+
+    try:
+        with open(os.path.join(stagedir, filename)) as fp:
+            samples = [float(line) for line in fp if line.strip()]
+    except FileNotFoundError:
+        return None
+
+    return statistics.median(samples) / 1000 if samples else None
+
+
+def max_frequency(info):
+    '''Maximum frequency in GHz reported by ``lscpu`` or :obj:`None`.'''
+
+    mhz = info.get('max_mhz')
+    return mhz / 1000 if mhz else None
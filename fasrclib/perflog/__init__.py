@@ -0,0 +1,12 @@
+# Copyright 2021 FAS Research Computing Harvard University
+# ReFrame Project Developers. See the top-level LICENSE file for details.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+'''Tools for the performance logs written by the ``filelog`` handler.'''
+
+from fasrclib.perflog.parser import PerflogRecord, parse_line, parse_lines
+from fasrclib.perflog.store import History, PerflogStore
+
+__all__ = ['History', 'PerflogRecord', 'PerflogStore',
+           'parse_line', 'parse_lines']
@@ -0,0 +1,250 @@
+# Copyright 2021 FAS Research Computing Harvard University
+# ReFrame Project Developers. See the top-level LICENSE file for details.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+'''Command line interface of the perflog tools.
+
+Usage::
+
+   python -m fasrclib.perflog --store STORE ingest [--full] [PERFLOG_DIR]
+   python -m fasrclib.perflog --store STORE query SYSTEM:PARTITION CHECK PERF_VAR
+   python -m fasrclib.perflog --store STORE detect [--since DAYS] [--all]
+   python -m fasrclib.perflog --store STORE calibrate [SYSTEM[:PARTITION]] [--write]
+   python -m fasrclib.perflog --store STORE sizing [SYSTEM[:PARTITION]] [--write]
+'''
+
+import argparse
+import sys
+import time
+
+from fasrclib.perflog.calibrate import (calibrate, expand_hostlist,
+                                        node_jobids, write_references)
+from fasrclib.perflog.detect import detect
+from fasrclib.perflog.ingest import ingest
+from fasrclib.perflog.sizing import size_jobs, write_sizes
+from fasrclib.perflog.store import PerflogStore
+
+
+def _fmt_time(t):
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(t))
+
+
+def cmd_ingest(args):
+    store = PerflogStore(args.store)
+    added = ingest(args.perflogs, store, incremental=not args.full)
+    print(f'{added} new record(s); {len(store)} record(s) in '
+          f'{len(store.keys())} series')
+
+
+def cmd_query(args):
+    store = PerflogStore(args.store)
+    system, _, partition = args.partition.partition(':')
+    keys = store.find(system=system, partition=partition or None,
+                      environ=args.environ, check=args.check,
+                      perf_var=args.perf_var)
+    if not keys:
+        sys.exit(f'no series found for {args.partition} '
+                 f'{args.check} {args.perf_var}')
+
+    for key in sorted(keys):
+        hist = store.history(key)
+        print(f'# {key[0]}:{key[1]}+{key[2]} {key[3]} {key[4]} '
+              f'[{hist.unit}]')
+        for t, v, j in zip(hist.time, hist.value, hist.jobid):
+            print(f'{_fmt_time(t)}  {v:<14g} jobid={j}')
+
+
+def cmd_detect(args):
+    store = PerflogStore(args.store)
+    changes = detect(store, window=args.window, threshold=args.threshold,
+                     min_change=args.min_change)
+    if args.since is not None:
+        oldest = time.time() - args.since*86400
+        changes = [cp for cp in changes if cp.onset >= oldest]
+
+    if not args.all:
+        changes = [cp for cp in changes if cp.regression]
+
+    for cp in changes:
+        system, partition, environ, check, perf_var = cp.key
+        kind = 'regression' if cp.regression else 'improvement'
+        print(f'{system}:{partition}+{environ} {check} {perf_var}: {kind} '
+              f'of {cp.change:+.1%} since {_fmt_time(cp.onset)} '
+              f'({cp.before:g} -> {cp.after:g} {cp.unit}, '
+              f'score {cp.score:.1f})')
+
+
+def _fmt_ref(ref):
+    return '(' + ', '.join('None' if x is None else f'{x:g}'
+                           for x in ref[:3]) + ')'
+
+
+def _fmt_rate(r):
+    return '  n/a' if r != r else f'{r:5.1%}'
+
+
+def cmd_calibrate(args):
+    store = PerflogStore(args.store)
+    system, _, partition = (args.partition or '').partition(':')
+    keys = store.find(system=system or None, partition=partition or None,
+                      environ=args.environ, check=args.check)
+    jobids = None
+    if args.node:
+        jobids = node_jobids(store, keys, expand_hostlist(args.nodelist))
+        print(f'{len(jobids)} job(s) ran on {args.nodelist} only')
+
+    proposals = calibrate(store, keys, days=args.days,
+                          lower_pct=args.lower_pct, upper_pct=args.upper_pct,
+                          margin=args.margin, jobids=jobids)
+    print(f'{"series":<60} {"reference":<28} {"false":>6} {"miss":>6}')
+    for p in sorted(proposals):
+        system, partition, environ, check, perf_var = p.key
+        name = f'{system}:{partition}+{environ} {check} {perf_var}'
+        for label, ref, (fa, miss) in (('now', p.current, p.current_rates),
+                                       ('new', p.proposed, p.proposed_rates)):
+            print(f'{name:<60} {label} {_fmt_ref(ref):<24} '
+                  f'{_fmt_rate(fa)} {_fmt_rate(miss)}')
+            name = ''
+
+    if args.write:
+        for filename in write_references(proposals, args.refdir, args.node):
+            print(f'wrote {filename}')
+
+
+def _fmt_secs(secs):
+    return f'{int(secs)//60}:{int(secs)%60:02d}'
+
+
+def cmd_sizing(args):
+    store = PerflogStore(args.store)
+    system, _, partition = (args.partition or '').partition(':')
+    keys = store.find(system=system or None, partition=partition or None)
+    proposals = size_jobs(store, keys, days=args.days,
+                          percentile=args.percentile,
+                          time_margin=args.time_margin,
+                          mem_margin=args.mem_margin,
+                          min_samples=args.min_samples,
+                          accounting=args.accounting, user=args.user)
+    pct = f'p{args.percentile:g}'
+    print(f'{"check":<60} {"jobs":>5} {pct + " time":>9} {"limit":>6} '
+          f'{pct + " mem":>9} {"request":>8}')
+    for p in proposals:
+        name = f'{p.key[0]}:{p.key[1]} {p.check}'
+        limit = p.time_limit or f'-({p.timeouts} TO)'
+        request = p.mem_request or (f'-({p.oom} OOM)' if p.oom else '-')
+        print(f'{name:<60} {p.samples:>5} {_fmt_secs(p.elapsed):>9} '
+              f'{limit:>6} {p.mem:>8.0f}M {request:>8}')
+
+    if args.write:
+        for filename in write_sizes(proposals, args.sizedir):
+            print(f'wrote {filename}')
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m fasrclib.perflog')
+    parser.add_argument('--store', default='perflogs.store',
+                        help='perflog store directory '
+                             '(default: %(default)s)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    p = subparsers.add_parser('ingest', help='ingest perflog files')
+    p.add_argument('perflogs', nargs='?', default='perflogs',
+                   help='perflog base directory (default: %(default)s)')
+    p.add_argument('--full', action='store_true',
+                   help='re-parse all files instead of only the lines '
+                        'appended since the last ingestion')
+    p.set_defaults(func=cmd_ingest)
+
+    p = subparsers.add_parser('query', help='print the history of a series')
+    p.add_argument('partition', metavar='SYSTEM[:PARTITION]')
+    p.add_argument('check')
+    p.add_argument('perf_var')
+    p.add_argument('-e', '--environ', help='programming environment')
+    p.set_defaults(func=cmd_query)
+
+    p = subparsers.add_parser('detect', help='detect step changes')
+    p.add_argument('--window', type=int, default=200,
+                   help='number of most recent points per series '
+                        '(default: %(default)s)')
+    p.add_argument('--threshold', type=float, default=6.0,
+                   help='minimum CUSUM statistic (default: %(default)s)')
+    p.add_argument('--min-change', type=float, default=0.03,
+                   help='minimum relative change (default: %(default)s)')
+    p.add_argument('--since', type=float, metavar='DAYS',
+                   help='only report changes starting in the last DAYS')
+    p.add_argument('--all', action='store_true',
+                   help='report improvements as well')
+    p.set_defaults(func=cmd_detect)
+
+    p = subparsers.add_parser(
+        'calibrate', help='derive reference tuples from the history'
+    )
+    p.add_argument('partition', nargs='?', metavar='SYSTEM[:PARTITION]')
+    p.add_argument('-n', '--check', help='only calibrate this check')
+    p.add_argument('-e', '--environ', help='programming environment')
+    p.add_argument('--days', type=float, default=90,
+                   help='history used for the calibration '
+                        '(default: %(default)s)')
+    p.add_argument('--lower-pct', type=float, default=1.0,
+                   help='percentile of the lower threshold '
+                        '(default: %(default)s)')
+    p.add_argument('--upper-pct', type=float, default=99.0,
+                   help='percentile of the upper threshold '
+                        '(default: %(default)s)')
+    p.add_argument('--margin', type=float, default=0.02,
+                   help='slack added to the thresholds '
+                        '(default: %(default)s)')
+    p.add_argument('--write', action='store_true',
+                   help='write the proposed tuples to the reference files')
+    p.add_argument('--refdir', help='reference file directory '
+                                    '(default: references/)')
+    p.add_argument('--node', metavar='SPEC',
+                   help='store the proposals under this node model, e.g. '
+                        '"cpu=Platinum 8268;sockets=2", instead of the '
+                        'partition; requires --nodelist')
+    p.add_argument('--nodelist', metavar='HOSTLIST',
+                   help='nodes of the model of --node, e.g. '
+                        '"holy7c[0101-0148]"; only the jobs that ran on '
+                        'them, according to sacct, are used')
+    p.set_defaults(func=cmd_calibrate)
+
+    p = subparsers.add_parser(
+        'sizing', help='derive job time limits and memory requests from '
+                       'the accounting data of past jobs'
+    )
+    p.add_argument('partition', nargs='?', metavar='SYSTEM[:PARTITION]')
+    p.add_argument('--days', type=float, default=30,
+                   help='history used for the sizing (default: %(default)s)')
+    p.add_argument('--percentile', type=float, default=95.0,
+                   help='percentile of the elapsed time and peak memory '
+                        '(default: %(default)s)')
+    p.add_argument('--time-margin', type=float, default=1.5,
+                   help='factor applied to the elapsed time '
+                        '(default: %(default)s)')
+    p.add_argument('--mem-margin', type=float, default=1.25,
+                   help='factor applied to the peak memory '
+                        '(default: %(default)s)')
+    p.add_argument('--min-samples', type=int, default=5,
+                   help='least number of completed jobs of a check '
+                        '(default: %(default)s)')
+    p.add_argument('--accounting', action='store_true',
+                   help='also size from all rfm_* jobs Slurm accounted in '
+                        'the partition, not only those in the perflogs')
+    p.add_argument('-u', '--user', help='with --accounting, only the jobs '
+                                        'of this user')
+    p.add_argument('--write', action='store_true',
+                   help='write the proposed sizes to the sizing files')
+    p.add_argument('--sizedir', help='sizing file directory '
+                                     '(default: sizing/)')
+    p.set_defaults(func=cmd_sizing)
+
+    args = parser.parse_args()
+    if getattr(args, 'node', None) and not args.nodelist:
+        parser.error('--node requires --nodelist')
+
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
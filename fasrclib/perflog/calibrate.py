@@ -0,0 +1,223 @@
+# Copyright 2021 FAS Research Computing Harvard University
+# ReFrame Project Developers. See the top-level LICENSE file for details.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+'''Derivation of reference tuples from the perflog history.
+
+For every series the reference value is the median of the recent history
+and the threshold on the "bad" side is taken from a low (or high) percentile
+of the same points, widened by a safety margin. Points after a regression
+found by :func:`~fasrclib.perflog.detect.detect` are excluded, so that a
+regression is not baked into the references.
+
+Before the proposal is applied, both the current and the proposed tuples are
+replayed against the whole history:
+
+- the *false-alarm rate* is the fraction of points not affected by a detected
+  regression that the tuple would fail;
+- the *miss rate* is the fraction of points after a detected regression that
+  the tuple would pass; it is undefined if no regression was detected.
+
+The perflogs do not record the nodes of a job. To calibrate a node model of
+a partition that mixes node generations, the points are restricted to the
+jobs that ran only on the given nodes of that model, as recorded by
+``sacct``.
+'''
+
+import math
+import re
+import subprocess
+import time
+from typing import NamedTuple
+
+import numpy as np
+
+import fasrclib.references as references
+from fasrclib.perflog.detect import detect, lower_is_better
+
+
+class Proposal(NamedTuple):
+    key: tuple
+    unit: str
+    npoints: int
+    current: tuple
+    current_rates: tuple
+    proposed: tuple
+    proposed_rates: tuple
+
+
+def _none(x):
+    return None if x is None or math.isnan(x) else float(x)
+
+
+def _round(x, digits=4):
+    if x == 0 or not math.isfinite(x):
+        return x
+
+    return round(x, digits - 1 - int(math.floor(math.log10(abs(x)))))
+
+
+def passes(values, ref, lower, upper):
+    '''Evaluate a reference tuple against an array of values the way
+    :func:`reframe.utility.sanity.assert_reference` does.'''
+
+    if ref is None:
+        return np.ones(len(values), dtype=bool)
+
+    scale = abs(ref) if ref != 0 else 1.0
+    offset = ref if ref != 0 else 0.0
+    lo = -np.inf if lower is None else offset + scale*lower
+    hi = np.inf if upper is None else offset + scale*upper
+    return (values >= lo) & (values <= hi)
+
+
+def rates(values, bad, ref):
+    '''Return the false-alarm and the miss rate of ``ref`` over ``values``.
+
+    :arg bad: boolean mask of the values after a detected regression.
+    '''
+
+    ok = passes(values, *ref[:3])
+    good = ~bad
+    false_alarm = float(np.mean(~ok[good])) if good.any() else math.nan
+    miss = float(np.mean(ok[bad])) if bad.any() else math.nan
+    return false_alarm, miss
+
+
+def expand_hostlist(hostlist):
+    '''Host names of a Slurm host list such as ``holy7c[0101-0103,0105]``.'''
+
+    ret = []
+    for item in re.findall(r'[^,\[]+(?:\[[^\]]*\][^,\[]*)*', hostlist):
+        match = re.match(r'^([^\[]*)\[([^\]]*)\](.*)$', item)
+        if not match:
+            ret.append(item)
+            continue
+
+        prefix, ranges, rest = match.groups()
+        for r in ranges.split(','):
+            lo, _, hi = r.partition('-')
+            for n in range(int(lo), int(hi or lo) + 1):
+                ret += expand_hostlist(f'{prefix}{n:0{len(lo)}d}{rest}')
+
+    return ret
+
+
+def job_nodes(jobids, batch=200):
+    '''Nodes of ``jobids`` by job id, from the accounting.'''
+
+    jobids = sorted({str(j) for j in jobids}, key=int)
+    ret = {}
+    for i in range(0, len(jobids), batch):
+        out = subprocess.run(
+            ['sacct', '-X', '-P', '-n', '-o', 'JobID,NodeList',
+             '-j', ','.join(jobids[i:i + batch])],
+            check=True, capture_output=True, text=True, timeout=300
+        ).stdout
+        for line in out.splitlines():
+            jobid, _, nodelist = line.partition('|')
+            if jobid.isdigit() and nodelist not in ('', 'None assigned'):
+                ret[int(jobid)] = set(expand_hostlist(nodelist))
+
+    return ret
+
+
+def node_jobids(store, keys, nodes):
+    '''Ids of the jobs of the series ``keys`` that ran only on ``nodes``.'''
+
+    jobids = set()
+    for key in keys:
+        jobids.update(int(j) for j in store.history(key).jobid if j > 0)
+
+    nodes = set(nodes)
+    return {jobid for jobid, used in job_nodes(jobids).items()
+            if used <= nodes}
+
+
+def calibrate(store, keys=None, days=90, lower_pct=1.0, upper_pct=99.0,
+              margin=0.02, min_points=10, jobids=None):
+    '''Propose reference tuples for the series ``keys`` of ``store``.
+
+    :arg days: length of the recent history used for the calibration.
+    :arg lower_pct: percentile defining the lower threshold of series where
+        higher is better.
+    :arg upper_pct: percentile defining the upper threshold of series where
+        lower is better.
+    :arg margin: relative slack added to the percentile thresholds.
+    :arg min_points: series with fewer usable points are skipped.
+    :arg jobids: if given, only the points of these jobs are used, e.g.,
+        those of :func:`node_jobids`.
+    :returns: a list of :class:`Proposal`.
+    '''
+
+    regressions = {cp.key: cp.onset
+                   for cp in detect(store) if cp.regression}
+    since = time.time() - days*86400
+    proposals = []
+    for key in (keys if keys is not None else store.keys()):
+        hist = store.history(key)
+        values = np.asarray(hist.value)
+        times = np.asarray(hist.time)
+        if jobids is not None:
+            keep = np.isin(np.asarray(hist.jobid), list(jobids))
+            values, times = values[keep], times[keep]
+
+        bad = times >= regressions.get(key, np.inf)
+        recent = values[(times >= since) & ~bad]
+        if len(recent) < min_points:
+            continue
+
+        current = (_none(hist.ref[-1]), _none(hist.lower[-1]),
+                   _none(hist.upper[-1]), hist.unit)
+        value = float(np.median(recent))
+        if value == 0:
+            continue
+
+        down = lower_is_better(np.array([hist.lower[-1]]),
+                               np.array([hist.upper[-1]]), [hist.unit])[0]
+        if down:
+            hi = np.percentile(recent, upper_pct)
+            proposed = (_round(value), None,
+                        _round(max(hi/value - 1, 0) + margin, 3), hist.unit)
+        else:
+            lo = np.percentile(recent, lower_pct)
+            proposed = (_round(value),
+                        _round(min(lo/value - 1, 0) - margin, 3), None,
+                        hist.unit)
+
+        proposals.append(Proposal(key, hist.unit, len(recent), current,
+                                  rates(values, bad, current), proposed,
+                                  rates(values, bad, proposed)))
+
+    return proposals
+
+
+def write_references(proposals, refdir=None, node=None):
+    '''Merge ``proposals`` into the reference files, one per system.
+
+    :arg node: if set, the proposals are stored under this node model spec
+        instead of their partition; they must have been calibrated from the
+        jobs of nodes of that model only.
+    :returns: the list of files written.
+    '''
+
+    by_system = {}
+    for p in proposals:
+        by_system.setdefault(p.key[0], []).append(p)
+
+    written = []
+    for system, props in sorted(by_system.items()):
+        data = references.load(system, refdir)
+        for p in props:
+            _, partition, environ, check, perf_var = p.key
+            scope = f'node:{node}' if node else f'{system}:{partition}'
+            entry = data.setdefault(check, {}).setdefault(
+                scope, {}
+            ).setdefault(environ or '*', {})
+            entry[perf_var] = list(p.proposed)
+
+        references.save(system, data, refdir)
+        written.append(references.reference_file(system, refdir))
+
+    return written
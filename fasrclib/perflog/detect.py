@@ -0,0 +1,147 @@
+# Copyright 2021 FAS Research Computing Harvard University
+# ReFrame Project Developers. See the top-level LICENSE file for details.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+'''Change-point detection over the perflog history.
+
+The most recent ``window`` points of every series are packed right-aligned
+into one ``(series, window)`` matrix padded with NaNs, and all series are
+processed at once.
+
+For every candidate split of a series the CUSUM statistic
+
+   |mean(after) - mean(before)| / (sigma * sqrt(1/n_before + 1/n_after))
+
+is computed from cumulative sums, where ``sigma`` is a robust estimate of the
+run-to-run noise (the MAD of the first differences, which a step change does
+not inflate). The split with the largest statistic is reported as a step
+change if the statistic exceeds ``threshold`` and the relative change exceeds
+``min_change``. A slow drift also builds up a large statistic and is reported
+as a step at the point where the history is best split in two.
+'''
+
+import math
+import warnings
+from typing import NamedTuple
+
+import numpy as np
+
+
+# Units for which a lower value is better, used when the reference of a
+# series does not tell
+LOWER_IS_BETTER_UNITS = {'s', 'ms', 'us', 'ns', 'clocks', 'degC'}
+
+
+class ChangePoint(NamedTuple):
+    key: tuple
+    unit: str
+    onset: int
+    before: float
+    after: float
+    change: float
+    score: float
+    regression: bool
+
+
+def history_matrix(store, window):
+    '''Pack the last ``window`` points of every series of ``store``.
+
+    :returns: a tuple of the ``time``, ``value``, ``lower`` and ``upper``
+        matrices, right-aligned and padded with ``0`` or NaN.
+    '''
+
+    start = store.index['start'].astype(np.int64)
+    stop = store.index['stop'].astype(np.int64)
+    rec = stop[:, None] - window + np.arange(window)[None, :]
+    valid = rec >= start[:, None]
+    rec = np.where(valid, rec, 0)
+
+    def _gather(name, fill):
+        col = store.column(name)
+        if len(col) == 0:
+            return np.full(rec.shape, fill, dtype=col.dtype)
+
+        return np.where(valid, np.asarray(col)[rec], fill)
+
+    return (_gather('time', 0), _gather('value', np.nan),
+            _gather('lower', np.nan), _gather('upper', np.nan))
+
+
+def lower_is_better(lower, upper, units):
+    '''Infer the direction of every series from its last reference
+    thresholds, falling back to its unit.'''
+
+    by_unit = np.array([u in LOWER_IS_BETTER_UNITS for u in units],
+                       dtype=bool)
+    only_upper = ~np.isnan(upper) & np.isnan(lower)
+    only_lower = np.isnan(upper) & ~np.isnan(lower)
+    return np.where(only_upper, True, np.where(only_lower, False, by_unit))
+
+
+def detect(store, window=200, threshold=6.0, min_change=0.03, min_size=5):
+    '''Detect the most significant step change of every series.
+
+    :arg window: number of most recent points of each series to consider.
+    :arg threshold: minimum CUSUM statistic of a reported change.
+    :arg min_change: minimum relative change of a reported change.
+    :arg min_size: minimum number of points on either side of a change.
+    :returns: a list of :class:`ChangePoint` sorted by decreasing score.
+    '''
+
+    if len(store.index) == 0:
+        return []
+
+    times, x, lower, upper = history_matrix(store, window)
+    mask = ~np.isnan(x)
+    n = mask.sum(axis=1)
+
+    # Robust noise estimate; padding is on the left only, so the
+    # differences involving it are NaN and ignored
+    with np.errstate(all='ignore'), warnings.catch_warnings():
+        # All-NaN rows of short series are expected here
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        d = np.diff(x, axis=1)
+        mad = np.nanmedian(
+            np.abs(d - np.nanmedian(d, axis=1, keepdims=True)), axis=1
+        )
+        sigma = 1.4826 * mad / math.sqrt(2)
+
+        # Guard against quantized or constant series
+        scale = np.nanmax(np.abs(x), axis=1, initial=0.0, where=mask)
+        sigma = np.maximum(sigma, 1e-3 * scale)
+
+        csum = np.cumsum(np.where(mask, x, 0.0), axis=1)
+        nleft = np.cumsum(mask, axis=1)
+        nright = n[:, None] - nleft
+        mleft = csum / nleft
+        mright = (csum[:, -1:] - csum) / nright
+        stat = (np.abs(mright - mleft) /
+                (sigma[:, None] * np.sqrt(1.0 / nleft + 1.0 / nright)))
+
+    ok = (nleft >= min_size) & (nright >= min_size) & mask
+    stat = np.where(ok & np.isfinite(stat), stat, -np.inf)
+    best = np.argmax(stat, axis=1)
+    rows = np.arange(len(best))
+    score = stat[rows, best]
+    before = mleft[rows, best]
+    after = mright[rows, best]
+    with np.errstate(all='ignore'):
+        change = (after - before) / np.abs(before)
+
+    units = [store.string(u) for u in store.index['unit']]
+    worse = lower_is_better(lower[:, -1], upper[:, -1], units)
+    regression = np.where(worse, change > 0, change < 0)
+    found = (score > threshold) & (np.abs(change) >= min_change)
+
+    # The onset is the first point after the split
+    onset = times[rows, np.minimum(best + 1, times.shape[1] - 1)]
+    keys = store.keys()
+    ret = [
+        ChangePoint(keys[i], units[i], int(onset[i]), float(before[i]),
+                    float(after[i]), float(change[i]), float(score[i]),
+                    bool(regression[i]))
+        for i in np.flatnonzero(found)
+    ]
+    ret.sort(key=lambda cp: cp.score, reverse=True)
+    return ret
@@ -0,0 +1,147 @@
+# Copyright 2021 FAS Research Computing Harvard University
+# ReFrame Project Developers. See the top-level LICENSE file for details.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+'''Ingestion of perflog files into a :class:`PerflogStore`.
+
+The perflog handlers are configured with ``'append': True``, so the files
+only ever grow. For every file we keep a checkpoint of its inode, the byte
+offset up to which it has been ingested and a hash of the last ingested line.
+The next ingestion only parses the bytes appended after that offset.
+
+A file is re-read from the start if it was truncated or rewritten, i.e., if
+it is shorter than the checkpoint or the line before the offset does not
+match the stored hash. When ReFrame moves a perflog aside after a header
+change (``<check>.log`` -> ``<check>.log.h<N>``), the checkpoint follows the
+inode to the new name and the new ``<check>.log`` is read from the start.
+
+Checkpoints are saved after the records are written to the store. Should
+ingestion be interrupted between the two, the next run parses those lines
+again and the store drops the duplicates.
+'''
+
+import hashlib
+import json
+import os
+from typing import NamedTuple
+
+from fasrclib.perflog.parser import (find_perflogs, parse_lines,
+                                     perflog_location)
+
+
+CHECKPOINT_FILE = 'checkpoints.json'
+
+# How far back to look for the start of the last ingested line
+_MAX_LINE_LENGTH = 64 * 1024
+
+
+class Checkpoint(NamedTuple):
+    inode: int
+    offset: int
+    last_line_hash: str
+
+
+def _hash(line):
+    return hashlib.sha1(line).hexdigest()
+
+
+def _last_line(fp, offset):
+    '''Return the complete line that ends at ``offset``.'''
+
+    start = max(0, offset - _MAX_LINE_LENGTH)
+    fp.seek(start)
+    data = fp.read(offset - start)
+    return data[data.rfind(b'\n', 0, len(data) - 1) + 1:]
+
+
+def _resume_offset(fp, size, checkpoint):
+    if checkpoint is None or checkpoint.offset > size:
+        return 0
+
+    if _hash(_last_line(fp, checkpoint.offset)) != checkpoint.last_line_hash:
+        # Rewritten in place
+        return 0
+
+    return checkpoint.offset
+
+
+def read_perflog(path, basedir, checkpoint=None):
+    '''Parse the lines of a perflog file appended after ``checkpoint``.
+
+    Only complete lines are consumed; a partially written last line is left
+    for the next call.
+
+    :returns: a tuple of the parsed records and the new :class:`Checkpoint`.
+    '''
+
+    system, partition = perflog_location(path, basedir)
+    with open(path, 'rb') as fp:
+        st = os.fstat(fp.fileno())
+        if checkpoint is not None and checkpoint.inode != st.st_ino:
+            checkpoint = None
+
+        offset = _resume_offset(fp, st.st_size, checkpoint)
+        fp.seek(offset)
+        data = fp.read()
+        data = data[:data.rfind(b'\n') + 1]
+        if not data:
+            return [], checkpoint or Checkpoint(st.st_ino, 0, _hash(b''))
+
+        records = parse_lines(data.decode(errors='replace').splitlines(),
+                              system, partition)
+        offset += len(data)
+        return records, Checkpoint(st.st_ino, offset,
+                                   _hash(_last_line(fp, offset)))
+
+
+def load_checkpoints(store):
+    try:
+        with open(os.path.join(store.path, CHECKPOINT_FILE)) as fp:
+            return {path: Checkpoint(*cp)
+                    for path, cp in json.load(fp).items()}
+    except FileNotFoundError:
+        return {}
+
+
+def save_checkpoints(store, checkpoints):
+    filename = os.path.join(store.path, CHECKPOINT_FILE)
+    with open(f'{filename}.tmp', 'w') as fp:
+        json.dump({path: list(cp) for path, cp in checkpoints.items()},
+                  fp, indent=2)
+
+    os.replace(f'{filename}.tmp', filename)
+
+
+def ingest(basedir, store, incremental=True):
+    '''Merge the perflogs below ``basedir`` into ``store``.
+
+    :arg incremental: only parse what was appended since the last
+        ingestion; if :obj:`False`, all files are parsed from the start.
+    :returns: the number of new records added to the store.
+    '''
+
+    with store.locked():
+        old_checkpoints = load_checkpoints(store) if incremental else {}
+        by_inode = {cp.inode: cp for cp in old_checkpoints.values()}
+        checkpoints = {}
+        records = []
+        for path in find_perflogs(basedir):
+            path = os.path.realpath(path)
+            try:
+                inode = os.stat(path).st_ino
+            except FileNotFoundError:
+                continue
+
+            checkpoint = old_checkpoints.get(path)
+            if checkpoint is None or checkpoint.inode != inode:
+                # Possibly renamed by ReFrame after a header change
+                checkpoint = by_inode.get(inode)
+
+            new_records, checkpoints[path] = read_perflog(path, basedir,
+                                                          checkpoint)
+            records += new_records
+
+        added = store.append(records)
+        save_checkpoints(store, checkpoints)
+        return added
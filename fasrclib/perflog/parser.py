@@ -0,0 +1,180 @@
+# Copyright 2021 FAS Research Computing Harvard University
+# ReFrame Project Developers. See the top-level LICENSE file for details.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+'''Parser for the pipe-delimited output of the ``filelog`` perflog handler.
+
+The handler configured in ``config/*.py`` writes one line per performance
+variable::
+
+   completion_time|reframe version|check_info|jobid=..|var=value|ref=.. (l=.., u=..)|image=..|unit
+
+under ``<basedir>/<system>/<partition>/<check>.log``. The first line of every
+file is a header generated by ReFrame, which is skipped. The ``image`` field
+holds the digest of the container image of the check, ``null`` for checks
+without one; it is missing in older files. The records of renamed checks are
+returned under their current names, see :data:`fasrclib.references.RENAMED`.
+'''
+
+import math
+import os
+import re
+from datetime import datetime
+from typing import NamedTuple
+
+from fasrclib.references import RENAMED
+
+
+class PerflogRecord(NamedTuple):
+    time: int
+    system: str
+    partition: str
+    environ: str
+    check: str
+    perf_var: str
+    value: float
+    ref: float
+    lower: float
+    upper: float
+    unit: str
+    jobid: int
+
+
+# ReFrame 4: 'StreamTest /cdf4820d @cannon:test+gnu'
+_INFO_RFM4 = re.compile(
+    r'^(?P<check>.+?)(?: /[0-9a-f]{8})?'
+    r'(?: @(?P<system>[^:+\s]+):(?P<partition>[^+\s]+)'
+    r'(?:\+(?P<environ>\S+))?)?$'
+)
+
+# ReFrame 3: 'StreamTest on cannon:test using gnu'
+_INFO_RFM3 = re.compile(
+    r'^(?P<check>\S+) on (?P<system>[^:\s]+):(?P<partition>\S+)'
+    r' using (?P<environ>\S+)$'
+)
+
+_REF_FIELD = re.compile(
+    r'^ref=(?P<ref>\S+) \(l=(?P<lower>[^,]+), u=(?P<upper>[^)]+)\)$'
+)
+
+_NULL_VALUES = {'', 'null', 'None', 'nan'}
+
+
+def _to_float(s):
+    s = s.strip()
+    if s in _NULL_VALUES:
+        return math.nan
+
+    try:
+        return float(s)
+    except ValueError:
+        return math.nan
+
+
+def _to_epoch(s):
+    return int(datetime.fromisoformat(s.strip()).timestamp())
+
+
+def parse_check_info(info):
+    '''Split a ``check_info`` field into its components.
+
+    :returns: a tuple ``(check, system, partition, environ)``; unknown
+        components are returned as empty strings.
+    '''
+
+    m = _INFO_RFM3.match(info) or _INFO_RFM4.match(info)
+    if not m:
+        return info, '', '', ''
+
+    return (m.group('check'), m.group('system') or '',
+            m.group('partition') or '', m.group('environ') or '')
+
+
+def parse_line(line, system='', partition=''):
+    '''Parse a single perflog line.
+
+    ``system`` and ``partition`` are used when they cannot be inferred from
+    the ``check_info`` field.
+
+    :returns: a :class:`PerflogRecord` or :obj:`None` if the line is a
+        header, is malformed or carries no performance value.
+    '''
+
+    fields = line.rstrip('\n').split('|')
+    if len(fields) < 7:
+        return None
+
+    try:
+        time = _to_epoch(fields[0])
+    except ValueError:
+        # Header line or garbage
+        return None
+
+    check, info_system, info_partition, environ = parse_check_info(fields[2])
+    jobid = -1
+    perf_var, value = None, math.nan
+    ref, lower, upper = math.nan, math.nan, math.nan
+    for f in fields[3:-1]:
+        if f.startswith('image='):
+            continue
+        elif f.startswith('jobid='):
+            try:
+                jobid = int(f[6:])
+            except ValueError:
+                pass
+        elif f.startswith('ref='):
+            m = _REF_FIELD.match(f)
+            if m:
+                ref = _to_float(m.group('ref'))
+                lower = _to_float(m.group('lower'))
+                upper = _to_float(m.group('upper'))
+        elif '=' in f and perf_var is None:
+            perf_var, _, val = f.partition('=')
+            value = _to_float(val)
+
+    if not perf_var or perf_var == 'null' or math.isnan(value):
+        return None
+
+    check, perf_var = RENAMED.get((check, perf_var), (check, perf_var))
+
+    return PerflogRecord(time, info_system or system,
+                         info_partition or partition, environ, check,
+                         perf_var, value, ref, lower, upper,
+                         fields[-1].strip(), jobid)
+
+
+def parse_lines(lines, system='', partition=''):
+    '''Parse an iterable of perflog lines, skipping unparsable ones.'''
+
+    records = []
+    for line in lines:
+        rec = parse_line(line, system, partition)
+        if rec is not None:
+            records.append(rec)
+
+    return records
+
+
+def perflog_location(path, basedir):
+    '''Infer the ``(system, partition)`` of a perflog file from its path.'''
+
+    parts = os.path.relpath(path, basedir).split(os.sep)
+    if len(parts) >= 3:
+        return parts[-3], parts[-2]
+
+    return '', ''
+
+
+def find_perflogs(basedir):
+    '''Yield the perflog files below ``basedir``.
+
+    Files moved aside by ReFrame after a header change (``*.log.h<N>``) are
+    also part of the history and are returned as well.
+    '''
+
+    for dirpath, dirnames, filenames in os.walk(basedir):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+        for name in sorted(filenames):
+            if re.search(r'\.log(\.h\d+)?$', name):
+                yield os.path.join(dirpath, name)
@@ -0,0 +1,274 @@
+# Copyright 2021 FAS Research Computing Harvard University
+# ReFrame Project Developers. See the top-level LICENSE file for details.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+'''Derivation of job time limits and memory requests from the accounting
+data of past runs.
+
+The jobs of a partition are those of the job ids in the perflog history,
+optionally together with all the ``rfm_*`` jobs Slurm accounted in the
+partition, which also covers the checks without performance variables.
+Their elapsed time and peak memory are read with ``sacct`` and grouped by
+job name, i.e., by the short name of the check. The peak memory of a job is
+the largest ``MaxRSS`` of its steps times the tasks a step ran per node,
+which bounds the memory the job used on a node from above.
+
+Only completed jobs are sized from. The time limit is a high percentile of
+the elapsed times times a margin, rounded up to whole minutes, and the
+memory request is computed the same way from the peak memory and rounded up
+to 256 MiB. A check that ran out of time (memory) in the period keeps the
+time limit (memory request) it defines itself.
+'''
+
+import math
+import subprocess
+import time
+from typing import NamedTuple
+
+import numpy as np
+
+import fasrclib.sizing as sizing
+
+
+SACCT_FIELDS = 'JobID,JobName,State,Elapsed,MaxRSS,NTasks,NNodes'
+
+# Job ids per sacct call, to keep the command line short
+_BATCH = 200
+
+_MEM_STEP = 256
+
+_UNITS = {'K': 1/1024, 'M': 1, 'G': 1024, 'T': 1024**2}
+
+
+class Usage(NamedTuple):
+    name: str
+    state: str
+
+    #: Elapsed time in seconds
+    elapsed: float
+
+    #: Peak memory per node in MiB
+    mem: float
+
+
+class Proposal(NamedTuple):
+    key: tuple
+    check: str
+    samples: int
+    timeouts: int
+    oom: int
+
+    #: Percentiles of the elapsed time in seconds and of the peak memory in
+    #: MiB
+    elapsed: float
+    mem: float
+
+    #: Job size; either may be :obj:`None`
+    time_limit: str
+    mem_request: str
+
+
+def parse_elapsed(text):
+    '''Seconds of a Slurm duration, ``[D-][HH:]MM:SS[.mmm]``.'''
+
+    days, _, rest = text.rpartition('-')
+    secs = 0.0
+    for part in rest.split(':'):
+        secs = secs*60 + float(part)
+
+    return secs + int(days or 0)*86400
+
+
+def parse_mem(text):
+    '''MiB of a Slurm memory value such as ``1234.50M``; 0 if empty.'''
+
+    text = text.strip()
+    if not text:
+        return 0.0
+
+    if text[-1] in _UNITS:
+        return float(text[:-1]) * _UNITS[text[-1]]
+
+    return float(text) / 1024**2
+
+
+def parse_sacct(out):
+    '''Usage by job id from the output of ``sacct -P -n -o``
+    :data:`SACCT_FIELDS`.'''
+
+    jobs, mem = {}, {}
+    for line in out.splitlines():
+        fields = line.split('|')
+        if len(fields) != 7:
+            continue
+
+        jobid, name, state, elapsed, maxrss, ntasks, nnodes = fields
+        base, _, step = jobid.partition('.')
+        if not step:
+            jobs[base] = (name, state.split()[0] if state else '',
+                          parse_elapsed(elapsed) if elapsed else 0.0)
+            continue
+
+        try:
+            per_node = math.ceil(int(ntasks) / max(int(nnodes), 1))
+        except ValueError:
+            per_node = 1
+
+        mem[base] = max(mem.get(base, 0.0), parse_mem(maxrss) * per_node)
+
+    return {jobid: Usage(name, state, elapsed, mem.get(jobid, 0.0))
+            for jobid, (name, state, elapsed) in jobs.items()}
+
+
+def _sacct(args):
+    return subprocess.run(['sacct', '-P', '-n', *args], check=True,
+                          capture_output=True, text=True, timeout=300).stdout
+
+
+def usage(jobids):
+    '''Usage of ``jobids`` from the accounting.'''
+
+    jobids = sorted(jobids, key=int)
+    ret = {}
+    for i in range(0, len(jobids), _BATCH):
+        batch = ','.join(jobids[i:i + _BATCH])
+        ret.update(parse_sacct(_sacct(['--units=M', '-j', batch,
+                                       '-o', SACCT_FIELDS])))
+
+    return ret
+
+
+def accounted_jobids(partition, since, user=None):
+    '''Ids of the ``rfm_*`` jobs accounted in Slurm ``partition`` since
+    ``since``.'''
+
+    args = ['-X', '-r', partition, '-o', 'JobID,JobName',
+            '-S', time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(since))]
+    if user:
+        args += ['-u', user]
+
+    ret = set()
+    for line in _sacct(args).splitlines():
+        jobid, _, name = line.partition('|')
+        if name.startswith('rfm_') and jobid.isdigit():
+            ret.add(jobid)
+
+    return ret
+
+
+def perflog_jobids(store, keys, since):
+    '''Job ids of the perflog history by ``(system, partition)``.'''
+
+    ret = {}
+    for key in keys:
+        hist = store.history(key)
+        recent = np.asarray(hist.jobid)[np.asarray(hist.time) >= since]
+        ret.setdefault(key[:2], set()).update(
+            str(j) for j in recent if j > 0
+        )
+
+    return ret
+
+
+def _percentile(values, pct):
+    return float(np.percentile(np.asarray(values), pct))
+
+
+def propose(usages, key, percentile=95.0, time_margin=1.5, mem_margin=1.25,
+            min_samples=5, min_time=2, min_mem=512):
+    '''Propose job sizes for the checks with ``usages`` of partition
+    ``key``.
+
+    :arg percentile: percentile of the elapsed times and peak memory.
+    :arg time_margin: factor applied to the elapsed time percentile.
+    :arg mem_margin: factor applied to the peak memory percentile.
+    :arg min_samples: checks with fewer completed jobs are skipped.
+    :arg min_time: the least time limit in minutes.
+    :arg min_mem: the least memory request in MiB.
+    :returns: a list of :class:`Proposal`.
+    '''
+
+    by_check = {}
+    for u in usages:
+        # Local runs have process ids in the perflogs, which may well be
+        # the ids of other users' jobs
+        if u.name.startswith('rfm_'):
+            by_check.setdefault(u.name[len('rfm_'):], []).append(u)
+
+    proposals = []
+    for check, jobs in sorted(by_check.items()):
+        done = [u for u in jobs if u.state == 'COMPLETED']
+        if len(done) < min_samples:
+            continue
+
+        timeouts = sum(1 for u in jobs if u.state == 'TIMEOUT')
+        oom = sum(1 for u in jobs if u.state == 'OUT_OF_MEMORY')
+        elapsed = _percentile([u.elapsed for u in done], percentile)
+        mem = _percentile([u.mem for u in done], percentile)
+        time_limit = mem_request = None
+        if not timeouts:
+            minutes = max(math.ceil(elapsed*time_margin / 60), min_time)
+            time_limit = f'{minutes}m'
+
+        # Without MaxRSS, e.g. if accounting does not gather it, the peak
+        # memory is 0 and nothing can be said
+        if not oom and mem > 0:
+            mib = max(math.ceil(mem*mem_margin / _MEM_STEP)*_MEM_STEP,
+                      min_mem)
+            mem_request = f'{mib}M'
+
+        proposals.append(Proposal(key, check, len(done), timeouts, oom,
+                                  elapsed, mem, time_limit, mem_request))
+
+    return proposals
+
+
+def size_jobs(store, keys, days=30, percentile=95.0, time_margin=1.5,
+              mem_margin=1.25, min_samples=5, accounting=False, user=None):
+    '''Propose job sizes for the partitions of the series ``keys``.
+
+    :arg accounting: also size from all ``rfm_*`` jobs accounted in the
+        Slurm partition of the same name as the partition.
+    '''
+
+    since = time.time() - days*86400
+    jobids = perflog_jobids(store, keys, since)
+    proposals = []
+    for key, ids in sorted(jobids.items()):
+        if accounting:
+            ids |= accounted_jobids(key[1], since, user)
+
+        proposals += propose(usage(ids).values(), key, percentile,
+                             time_margin, mem_margin, min_samples)
+
+    return proposals
+
+
+def write_sizes(proposals, sizedir=None):
+    '''Merge ``proposals`` into the sizing files, one per system.
+
+    :returns: the list of files written.
+    '''
+
+    by_system = {}
+    for p in proposals:
+        by_system.setdefault(p.key[0], []).append(p)
+
+    written = []
+    for system, props in sorted(by_system.items()):
+        data = sizing.load(system, sizedir)
+        for p in props:
+            entry = {'samples': p.samples}
+            if p.time_limit:
+                entry['time_limit'] = p.time_limit
+
+            if p.mem_request:
+                entry['mem'] = p.mem_request
+
+            data.setdefault(f'{system}:{p.key[1]}', {})[p.check] = entry
+
+        sizing.save(system, data, sizedir)
+        written.append(sizing.sizing_file(system, sizedir))
+
+    return written
@@ -0,0 +1,296 @@
+# Copyright 2021 FAS Research Computing Harvard University
+# ReFrame Project Developers. See the top-level LICENSE file for details.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+'''Columnar on-disk store for perflog records.
+
+Layout of a store directory::
+
+   CURRENT              name of the active generation
+   g<N>/manifest.json   interned strings and record count
+   g<N>/index.npy       one row per series: string ids + [start, stop)
+   g<N>/<column>.npy    one typed array per column
+
+Records are kept sorted by (series, time), so the history of a single
+(system, partition, environ, check, perf_var) series is a contiguous slice of
+every column. Columns are opened memory-mapped, so a query only touches the
+pages of the slice it returns.
+
+Every write produces a new generation directory and then atomically switches
+``CURRENT`` to it; readers never see a half-written store. The previous
+generation is removed only by the write after that, so that readers that
+loaded it just before the switch can still open its columns.
+'''
+
+import fcntl
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from typing import NamedTuple
+
+import numpy as np
+
+
+FORMAT_VERSION = 1
+
+SERIES_KEY = ('system', 'partition', 'environ', 'check', 'perf_var')
+
+COLUMNS = {
+    'time': np.int64,
+    'value': np.float64,
+    'ref': np.float64,
+    'lower': np.float64,
+    'upper': np.float64,
+    'jobid': np.int64,
+}
+
+INDEX_DTYPE = np.dtype(
+    [(k, np.int32) for k in SERIES_KEY + ('unit',)] +
+    [('start', np.int64), ('stop', np.int64)]
+)
+
+
+class History(NamedTuple):
+    '''The history of one series; every column is an array slice.'''
+
+    key: tuple
+    unit: str
+    time: np.ndarray
+    value: np.ndarray
+    ref: np.ndarray
+    lower: np.ndarray
+    upper: np.ndarray
+    jobid: np.ndarray
+
+
+class PerflogStore:
+    '''A columnar, indexed store of perflog records.
+
+    :arg path: the store directory; it is created on the first write.
+    '''
+
+    def __init__(self, path):
+        self._path = os.path.abspath(path)
+        self._load()
+
+    @property
+    def path(self):
+        return self._path
+
+    def __len__(self):
+        return len(self._columns['time'])
+
+    def _current(self):
+        try:
+            with open(os.path.join(self._path, 'CURRENT')) as fp:
+                return fp.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def _load(self):
+        self._generation = self._current()
+        if self._generation is None:
+            self._strings = []
+            self._index = np.zeros(0, dtype=INDEX_DTYPE)
+            self._columns = {name: np.zeros(0, dtype=dt)
+                             for name, dt in COLUMNS.items()}
+        else:
+            gendir = os.path.join(self._path, self._generation)
+            with open(os.path.join(gendir, 'manifest.json')) as fp:
+                manifest = json.load(fp)
+
+            if manifest['format'] != FORMAT_VERSION:
+                raise ValueError(
+                    f'{self._path}: unsupported store format '
+                    f'{manifest["format"]}'
+                )
+
+            self._strings = manifest['strings']
+            self._index = np.load(os.path.join(gendir, 'index.npy'))
+            self._columns = {
+                name: np.load(os.path.join(gendir, f'{name}.npy'),
+                              mmap_mode='r')
+                for name in COLUMNS
+            }
+
+        self._string_ids = {s: i for i, s in enumerate(self._strings)}
+        self._series_ids = {self._key(row): i
+                            for i, row in enumerate(self._index)}
+
+    def reload(self):
+        '''Pick up a generation written by another process.'''
+        if self._current() != self._generation:
+            self._load()
+
+    def _key(self, row):
+        return tuple(self._strings[row[k]] for k in SERIES_KEY)
+
+    @staticmethod
+    def _intern(s, strings, string_ids):
+        try:
+            return string_ids[s]
+        except KeyError:
+            strings.append(s)
+            string_ids[s] = len(strings) - 1
+            return string_ids[s]
+
+    def keys(self):
+        '''Return the keys of all series in the store.'''
+        return list(self._series_ids.keys())
+
+    def find(self, system=None, partition=None, environ=None,
+             check=None, perf_var=None):
+        '''Return the keys of the series matching the given components.
+
+        Components that are :obj:`None` match anything.
+        '''
+
+        query = (system, partition, environ, check, perf_var)
+        return [key for key in self._series_ids
+                if all(q is None or q == k for q, k in zip(query, key))]
+
+    def history(self, key):
+        '''Return the :class:`History` of the series ``key``.
+
+        :raises KeyError: if the series is not in the store.
+        '''
+
+        row = self._index[self._series_ids[tuple(key)]]
+        s = slice(row['start'], row['stop'])
+        return History(tuple(key), self._strings[row['unit']],
+                       *(self._columns[name][s] for name in COLUMNS))
+
+    def series_ids(self):
+        '''Return the series id of every record as an array.'''
+        return np.repeat(np.arange(len(self._index), dtype=np.int32),
+                         self._index['stop'] - self._index['start'])
+
+    def column(self, name):
+        '''Return a whole column, sorted by (series, time).'''
+        return self._columns[name]
+
+    @property
+    def index(self):
+        return self._index
+
+    def string(self, sid):
+        return self._strings[sid]
+
+    @contextmanager
+    def locked(self):
+        '''Hold an exclusive lock on the store for a read-modify-write.'''
+
+        os.makedirs(self._path, exist_ok=True)
+        with open(os.path.join(self._path, '.lock'), 'w') as fp:
+            fcntl.flock(fp, fcntl.LOCK_EX)
+            try:
+                self.reload()
+                yield self
+            finally:
+                fcntl.flock(fp, fcntl.LOCK_UN)
+
+    def append(self, records):
+        '''Merge ``records`` into the store and write a new generation.
+
+        Records already present, i.e., with the same series, completion time
+        and job id, are dropped.
+
+        :arg records: a sequence of
+            :class:`~fasrclib.perflog.parser.PerflogRecord`.
+        :returns: the number of records actually added.
+        '''
+
+        # The tables are extended on copies and replaced by those of the
+        # new generation once it is written; on failure or if there is
+        # nothing to add the store is left untouched
+        nold = len(self)
+        strings = list(self._strings)
+        string_ids = dict(self._string_ids)
+        series_ids = dict(self._series_ids)
+        units = list(self._index['unit'])
+        new_sids = np.empty(len(records), dtype=np.int32)
+        new_cols = {name: np.empty(len(records), dtype=dt)
+                    for name, dt in COLUMNS.items()}
+        for i, rec in enumerate(records):
+            key = tuple(getattr(rec, k) for k in SERIES_KEY)
+            sid = series_ids.get(key)
+            if sid is None:
+                sid = len(series_ids)
+                series_ids[key] = sid
+                units.append(0)
+
+            units[sid] = self._intern(rec.unit, strings, string_ids)
+            new_sids[i] = sid
+            for name in COLUMNS:
+                new_cols[name][i] = getattr(rec, name)
+
+        sids = np.concatenate([self.series_ids(), new_sids])
+        cols = {name: np.concatenate([self._columns[name], new_cols[name]])
+                for name in COLUMNS}
+
+        # Sort by (series, time, jobid); stable, so old records come first
+        # among duplicates and are the ones that are kept
+        order = np.lexsort((cols['jobid'], cols['time'], sids))
+        sids = sids[order]
+        cols = {name: c[order] for name, c in cols.items()}
+        keep = np.ones(len(sids), dtype=bool)
+        keep[1:] = ((sids[1:] != sids[:-1]) |
+                    (cols['time'][1:] != cols['time'][:-1]) |
+                    (cols['jobid'][1:] != cols['jobid'][:-1]))
+        sids = sids[keep]
+        cols = {name: c[keep] for name, c in cols.items()}
+        if len(sids) == nold and len(series_ids) == len(self._index):
+            # Nothing new; keep the current generation
+            return 0
+
+        index = np.zeros(len(series_ids), dtype=INDEX_DTYPE)
+        for key, sid in series_ids.items():
+            for k, s in zip(SERIES_KEY, key):
+                index[sid][k] = self._intern(s, strings, string_ids)
+
+        index['unit'] = units
+        series = np.arange(len(index))
+        index['start'] = np.searchsorted(sids, series, side='left')
+        index['stop'] = np.searchsorted(sids, series, side='right')
+        self._write(strings, index, cols)
+        return len(self) - nold
+
+    def _write(self, strings, index, columns):
+        os.makedirs(self._path, exist_ok=True)
+        if self._generation is None:
+            gen = 0
+        else:
+            gen = int(self._generation[1:]) + 1
+
+        name = f'g{gen}'
+        gendir = os.path.join(self._path, name)
+        shutil.rmtree(gendir, ignore_errors=True)
+        os.makedirs(gendir)
+        np.save(os.path.join(gendir, 'index.npy'), index)
+        for col, data in columns.items():
+            np.save(os.path.join(gendir, f'{col}.npy'), data)
+
+        with open(os.path.join(gendir, 'manifest.json'), 'w') as fp:
+            json.dump({'format': FORMAT_VERSION,
+                       'records': len(columns['time']),
+                       'strings': strings}, fp)
+
+        current = os.path.join(self._path, 'CURRENT')
+        with open(f'{current}.tmp', 'w') as fp:
+            fp.write(name)
+            fp.flush()
+            os.fsync(fp.fileno())
+
+        os.replace(f'{current}.tmp', current)
+        prev = self._generation
+        self._load()
+
+        # Readers may have loaded the previous generation just before the
+        # switch and not opened its columns yet; remove only the older ones
+        for entry in os.listdir(self._path):
+            if (entry.startswith('g') and entry[1:].isdigit() and
+                entry not in (name, prev)):
+                shutil.rmtree(os.path.join(self._path, entry),
+                              ignore_errors=True)
@@ -0,0 +1,178 @@
+# Copyright 2021 FAS Research Computing Harvard University
+# ReFrame Project Developers. See the top-level LICENSE file for details.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+'''Calibrated performance references.
+
+The references of the checks are defined in their modules. Values derived
+from the perflog history with ``python -m fasrclib.perflog calibrate`` are
+stored in ``references/<system>.json`` and take precedence over the literals
+of the modules. The files look like this::
+
+   {
+       "StreamTest": {
+           "cannon:test": {
+               "gnu": {"triad": [210000, -0.05, null, "MB/s"]},
+               "*": {...}
+           }
+       }
+   }
+
+where the check is keyed by its display name and the innermost level by the
+programming environment, ``"*"`` matching any environment.
+
+Next to the partitions, a check may have entries keyed by node model, e.g.
+``"node:cpu=Platinum 8268;sockets=2"`` (see :mod:`fasrclib.nodeinfo`). If the
+check captured the fingerprint of the node it ran on, the best matching node
+entry, i.e., the one matching most fields, takes precedence over the
+partition entry, which is only a fallback. This keeps thresholds tight on
+partitions that mix node generations.
+
+Checks that were renamed keep their history and calibrated references
+through :data:`RENAMED`: the perflog store files the records of the former
+names under the current ones, and the entries calibrated under a former name
+apply until the current name has its own.
+
+Checks load them by inheriting :class:`fasrclib.hooks.CalibratedReference`,
+whose hook calls :func:`apply` after the references of the check are set.
+'''
+
+import json
+import os
+import re
+
+import fasrclib.nodeinfo as nodeinfo
+
+
+REFERENCE_DIR = os.environ.get(
+    'FASRC_REFERENCE_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                 'references')
+)
+
+# The (check, performance variable) of the current name by that of a former
+# name
+RENAMED = {
+    ('StridedBandwidthTest', 'bandwidth'):
+        ('StridedBandwidthTest %threads=node', 'bandwidth_s1'),
+    ('StridedBandwidthTest64', 'bandwidth'):
+        ('StridedBandwidthTest %threads=node', 'bandwidth_s8'),
+    ('StridedBandwidthTest128', 'bandwidth'):
+        ('StridedBandwidthTest %threads=node', 'bandwidth_s16'),
+}
+
+_cache = {}
+
+
+def reference_file(system, refdir=None):
+    return os.path.join(refdir or REFERENCE_DIR, f'{system}.json')
+
+
+def load(system, refdir=None):
+    '''Load the calibrated references of ``system``.
+
+    The file is read only once per session. A missing file yields no
+    references.
+    '''
+
+    filename = reference_file(system, refdir)
+    try:
+        return _cache[filename]
+    except KeyError:
+        pass
+
+    try:
+        with open(filename) as fp:
+            _cache[filename] = json.load(fp)
+    except FileNotFoundError:
+        _cache[filename] = {}
+
+    return _cache[filename]
+
+
+def save(system, data, refdir=None):
+    '''Write the calibrated references of ``system``.'''
+
+    filename = reference_file(system, refdir)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    # Keep every reference tuple on a single line
+    text = re.sub(r'\[\s+([^\[\]{}]*?)\s+\]',
+                  lambda m: '[' + re.sub(r',\s+', ', ', m.group(1)) + ']',
+                  json.dumps(data, indent=4, sort_keys=True))
+    with open(f'{filename}.tmp', 'w') as fp:
+        fp.write(f'{text}\n')
+
+    os.replace(f'{filename}.tmp', filename)
+    _cache.pop(filename, None)
+
+
+def check_name(test):
+    return getattr(test, 'display_name', None) or test.name
+
+
+def check_entries(data, check):
+    '''Return the entries of ``check`` in the references ``data``,
+    including those calibrated under its former names.'''
+
+    ret = {}
+    for (old, old_var), (new, var) in RENAMED.items():
+        if new != check:
+            continue
+
+        for key, environs in data.get(old, {}).items():
+            for environ, refs in environs.items():
+                if old_var in refs:
+                    ret.setdefault(key, {}).setdefault(environ, {})[var] = (
+                        refs[old_var]
+                    )
+
+    for key, environs in data.get(check, {}).items():
+        for environ, refs in environs.items():
+            ret.setdefault(key, {}).setdefault(environ, {}).update(refs)
+
+    return ret
+
+
+def _environ_refs(entries, environ):
+    ret = dict(entries.get('*', {}))
+    ret.update(entries.get(environ, {}))
+    return ret
+
+
+def lookup(test, refdir=None, node=None):
+    '''Return the calibrated references of ``test`` for its current
+    partition, environment and node as a dictionary of reference tuples.
+
+    :arg node: the fingerprint of the node; if :obj:`None`, the one captured
+        by the test is used.
+    '''
+
+    part = test.current_partition
+    environ = test.current_environ.name
+    data = load(part.fullname.split(':')[0], refdir)
+    entries = check_entries(data, check_name(test))
+    ret = _environ_refs(entries.get(part.fullname, {}), environ)
+    if node is None:
+        node = nodeinfo.load(test)
+
+    if node:
+        matches = []
+        for key in entries:
+            if key.startswith('node:'):
+                score = nodeinfo.match(key[5:], node)
+                if score > 0:
+                    matches.append((score, key))
+
+        for _, key in sorted(matches):
+            ret.update(_environ_refs(entries[key], environ))
+
+    return {var: tuple(ref) for var, ref in ret.items()}
+
+
+def apply(test, refdir=None):
+    '''Override the references of ``test`` with the calibrated ones.'''
+
+    partname = test.current_partition.fullname
+    for var, ref in lookup(test, refdir).items():
+        test.reference[f'{partname}:{var}'] = ref
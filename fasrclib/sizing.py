@@ -0,0 +1,105 @@
+# Copyright 2021 FAS Research Computing Harvard University
+# ReFrame Project Developers. See the top-level LICENSE file for details.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+'''Job time limits and memory requests sized from the history of the
+checks.
+
+The checks hard-code generous time limits and memory requests, which keep
+their jobs out of the backfill windows of the scheduler. Requests derived
+from the run time and peak memory of past jobs with ``python -m
+fasrclib.perflog sizing`` are stored in ``sizing/<system>.json`` and replace
+those of the checks. The files look like this::
+
+   {
+       "cannon:test": {
+           "StreamTest": {"time_limit": "4m", "mem": "3072M", "samples": 24},
+           "IorCheck_7a9ce2d1": {"time_limit": "12m", "samples": 30}
+       }
+   }
+
+where the check is keyed by its short name, i.e., its job name without the
+``rfm_`` prefix, so that every variant of a parameterized check is sized on
+its own. Checks without an entry keep their own requests, as does a check
+for what its entry leaves out.
+
+Checks apply them by inheriting :class:`fasrclib.hooks.SizedJob`, whose hook
+calls :func:`apply` after all other hooks setting job options.
+'''
+
+import json
+import os
+
+
+SIZING_DIR = os.environ.get(
+    'FASRC_SIZING_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                 'sizing')
+)
+
+_cache = {}
+
+
+def sizing_file(system, sizedir=None):
+    return os.path.join(sizedir or SIZING_DIR, f'{system}.json')
+
+
+def load(system, sizedir=None):
+    '''Load the job sizes of ``system``.
+
+    The file is read only once per session. A missing file yields no
+    sizes.
+    '''
+
+    filename = sizing_file(system, sizedir)
+    try:
+        return _cache[filename]
+    except KeyError:
+        pass
+
+    try:
+        with open(filename) as fp:
+            _cache[filename] = json.load(fp)
+    except FileNotFoundError:
+        _cache[filename] = {}
+
+    return _cache[filename]
+
+
+def save(system, data, sizedir=None):
+    '''Write the job sizes of ``system``.'''
+
+    filename = sizing_file(system, sizedir)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(f'{filename}.tmp', 'w') as fp:
+        fp.write(json.dumps(data, indent=4, sort_keys=True) + '\n')
+
+    os.replace(f'{filename}.tmp', filename)
+    _cache.pop(filename, None)
+
+
+def lookup(test, sizedir=None):
+    '''The job size of ``test`` for its current partition as a dictionary
+    with the ``time_limit`` and ``mem`` to request, either of which may be
+    missing.'''
+
+    part = test.current_partition.fullname
+    data = load(part.split(':')[0], sizedir)
+    return data.get(part, {}).get(test.short_name, {})
+
+
+def apply(test, sizedir=None):
+    '''Replace the time limit of ``test`` and the memory request of its job
+    with the sized ones.'''
+
+    entry = lookup(test, sizedir)
+    if entry.get('time_limit'):
+        # The job takes the time limit of the test when it is run
+        test.time_limit = entry['time_limit']
+
+    if entry.get('mem'):
+        # The size is the memory of the node, whatever the check asked for
+        options = [opt for opt in test.job.options
+                   if not opt.startswith('--mem')]
+        test.job.options = options + [f'--mem={entry["mem"]}']
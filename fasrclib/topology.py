@@ -0,0 +1,321 @@
+# Copyright 2021 FAS Research Computing Harvard University
+# ReFrame Project Developers. See the top-level LICENSE file for details.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+'''Topology-aware sizing of the CPU checks.
+
+The number of tasks and threads of a check is derived from the core, socket,
+NUMA and SMT layout of the partition it runs on instead of per-partition
+tables in the checks. The layout is taken from, in this order:
+
+1. the processor info of the partition, i.e., the ``processor`` entry of the
+   configuration or the topology ReFrame detected for local partitions;
+2. a snapshot in ``topology/<system>-<partition>/processor.json`` or, failing
+   that, the one ReFrame keeps in its ``topology_prefix``
+   (``~/.reframe/topology`` by default); create one on a compute node of the
+   partition with::
+
+      reframe --detect-host-topology=topology/cannon-test/processor.json
+
+3. :data:`FALLBACK`, what the checks used to assume for unknown partitions.
+
+ReFrame ignores the snapshots of partitions with a ``processor`` entry, which
+holds the counts but not the caches and cpusets; these are then taken from
+the snapshot if it has as many CPUs.
+
+Checks size themselves in a hook, naming the kind of the benchmark::
+
+   @run_after('setup')
+   def set_num_threads(self):
+       topology.apply(self, 'memory')
+
+The kinds are:
+
+- ``memory``: one task with a thread per physical core, spread over the
+  sockets so that all memory controllers are used;
+- ``compute``: one task with a thread per physical core, packed;
+- ``mpi``: one single-threaded task per physical core;
+- ``hybrid``: one task per NUMA node with a thread per core of its node.
+'''
+
+import json
+import os
+from typing import NamedTuple
+
+import reframe.core.runtime as runtime
+import reframe.utility.osext as osext
+from reframe.core.exceptions import ReframeFatalError
+
+
+TOPOLOGY_DIR = os.environ.get(
+    'FASRC_TOPOLOGY_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                 'topology')
+)
+
+# Layout assumed for partitions without any topology information
+FALLBACK = {
+    'num_cpus': 32,
+    'num_cpus_per_core': 1,
+    'num_sockets': 2,
+    'num_cpus_per_socket': 16
+}
+
+# Last-level cache assumed per core if the layout has no cache information
+FALLBACK_LLC_PER_CORE = 4 * 1024**2
+
+KINDS = ('memory', 'compute', 'mpi', 'hybrid')
+
+
+def _cpuset(mask):
+    '''The CPUs of a hexadecimal cpuset mask, e.g. ``'0x5'``.'''
+
+    mask = int(mask, 16)
+    return [i for i in range(mask.bit_length()) if mask >> i & 1]
+
+
+class Topology:
+    '''Processor layout of the nodes of a partition.
+
+    :arg info: a processor info dictionary as described in the `ReFrame
+        configuration reference
+        <https://reframe-hpc.readthedocs.io/en/stable/config_reference.html#processor-info>`__.
+    '''
+
+    def __init__(self, info):
+        self.info = info
+
+    @property
+    def num_cpus(self):
+        return self.info['num_cpus']
+
+    @property
+    def num_cpus_per_core(self):
+        return self.info.get('num_cpus_per_core') or 1
+
+    @property
+    def num_sockets(self):
+        return self.info.get('num_sockets') or 1
+
+    @property
+    def num_cores(self):
+        return max(self.num_cpus // self.num_cpus_per_core, 1)
+
+    @property
+    def num_cores_per_socket(self):
+        return max(self.num_cores // self.num_sockets, 1)
+
+    @property
+    def num_numa_nodes(self):
+        nodes = self.info.get('topology', {}).get('numa_nodes')
+        return len(nodes) if nodes else self.num_sockets
+
+    @property
+    def num_cores_per_numa_node(self):
+        return max(self.num_cores // self.num_numa_nodes, 1)
+
+    def core_cpus(self, socket=None):
+        '''Return the first CPU of every physical core of ``socket``, or of
+        the whole node if :obj:`None`, i.e., the CPUs to pin one thread per
+        core to.
+
+        Without the cpusets of the layout, the cores of a socket are assumed
+        to be numbered consecutively and the SMT siblings after all cores.
+        '''
+
+        topo = self.info.get('topology', {})
+        if topo.get('sockets') and topo.get('cores'):
+            cpus = sorted(min(_cpuset(c)) for c in topo['cores'])
+            if socket is not None:
+                allowed = set(_cpuset(topo['sockets'][socket]))
+                cpus = [c for c in cpus if c in allowed]
+
+            return cpus
+
+        if socket is None:
+            return list(range(self.num_cores))
+
+        n = self.num_cores_per_socket
+        return list(range(socket * n, (socket + 1) * n))
+
+    def caches(self, level):
+        '''Return the caches of ``level`` (e.g., ``'L3'``) as a list of
+        ``(size, num_cpus)`` tuples, one per cache instance.'''
+
+        ret = []
+        for c in self.info.get('topology', {}).get('caches', []):
+            if c['type'] == level:
+                ret += [(c['size'], c['num_cpus'])] * len(c['cpusets'])
+
+        return ret
+
+    @property
+    def cache_levels(self):
+        '''The cache levels, e.g. ``['L1', 'L2', 'L3']``, or an empty list
+        if the layout has no cache information.'''
+
+        return sorted({c['type'] for c in self.info.get('topology', {}).get(
+            'caches', []) if c['type'].startswith('L')})
+
+    @property
+    def llc_size(self):
+        '''Combined size in bytes of all last-level cache instances.'''
+
+        if not self.cache_levels:
+            return self.num_cores * FALLBACK_LLC_PER_CORE
+
+        return sum(size for size, _ in self.caches(self.cache_levels[-1]))
+
+    @property
+    def platform(self):
+        return self.info.get('platform', 'x86_64')
+
+
+class Sizing(NamedTuple):
+    num_tasks_per_node: int
+    num_cpus_per_task: int
+    env_vars: dict
+
+
+def snapshot_file(system, partition, topodir=None):
+    return os.path.join(topodir or TOPOLOGY_DIR, f'{system}-{partition}',
+                        'processor.json')
+
+
+def reframe_snapshot_file(system, partition):
+    '''The snapshot ReFrame saves when it detects the topology of a
+    partition.'''
+
+    try:
+        prefix = runtime.runtime().get_option('general/0/topology_prefix')
+    except ReframeFatalError:
+        # Outside a ReFrame session
+        prefix = '${HOME}/.reframe/topology'
+
+    return os.path.join(osext.expandvars(prefix), f'{system}-{partition}',
+                        'processor.json')
+
+
+def load_snapshot(system, partition, topodir=None):
+    '''Return the processor info of the snapshot of the partition or
+    :obj:`None` if there is none.'''
+
+    for filename in (snapshot_file(system, partition, topodir),
+                     reframe_snapshot_file(system, partition)):
+        try:
+            with open(filename) as fp:
+                return json.load(fp)
+        except FileNotFoundError:
+            pass
+
+    return None
+
+
+def load(partition, topodir=None):
+    '''Return the :class:`Topology` of the nodes of ``partition``.'''
+
+    info = partition.processor.info
+    if info.get('num_cpus') and info.get('topology'):
+        return Topology(info)
+
+    system, name = partition.fullname.split(':')
+    snapshot = load_snapshot(system, name, topodir)
+    if not info.get('num_cpus'):
+        return Topology(snapshot or FALLBACK)
+
+    if (snapshot and snapshot.get('topology') and
+        snapshot.get('num_cpus') == info['num_cpus']):
+        # The configured counts with the caches and cpusets of the snapshot
+        info = dict(info, topology=snapshot['topology'])
+
+    return Topology(info)
+
+
+def sizing(topo, kind):
+    '''Return the :class:`Sizing` of a benchmark of ``kind`` on ``topo``.'''
+
+    if kind == 'memory':
+        return Sizing(1, topo.num_cores, {'OMP_NUM_THREADS': topo.num_cores,
+                                          'OMP_PLACES': 'cores',
+                                          'OMP_PROC_BIND': 'spread'})
+    elif kind == 'compute':
+        return Sizing(1, topo.num_cores, {'OMP_NUM_THREADS': topo.num_cores,
+                                          'OMP_PLACES': 'cores',
+                                          'OMP_PROC_BIND': 'close'})
+    elif kind == 'mpi':
+        return Sizing(topo.num_cores, 1, {'OMP_NUM_THREADS': 1})
+    elif kind == 'hybrid':
+        threads = topo.num_cores_per_numa_node
+        return Sizing(topo.num_numa_nodes, threads,
+                      {'OMP_NUM_THREADS': threads,
+                       'OMP_PLACES': 'cores',
+                       'OMP_PROC_BIND': 'close'})
+
+    raise ValueError(f'unknown benchmark kind: {kind!r}')
+
+
+def thread_sweep(topo):
+    '''Thread counts of a scaling sweep: the powers of two up to the number
+    of cores plus the cores of one socket and of the whole node.'''
+
+    ret = {topo.num_cores_per_socket, topo.num_cores}
+    n = 1
+    while n < topo.num_cores:
+        ret.add(n)
+        n *= 2
+
+    return sorted(ret)
+
+
+def stream_array_size(topo, ratio=4, minimum=10000000):
+    '''Number of elements per STREAM array, so that every array is at least
+    ``ratio`` times larger than all last-level caches of a node together.
+
+    :arg minimum: the default ``STREAM_ARRAY_SIZE`` of ``stream.c``.
+    '''
+
+    return max(minimum, -(-ratio * topo.llc_size // 8))
+
+
+def size_stream(test, ratio=4):
+    '''Size the arrays of the STREAM build of ``test`` for the last-level
+    cache of its partition.
+
+    :returns: the memory the job needs for the arrays, e.g. ``'2560M'``.
+    '''
+
+    topo = load(test.current_partition)
+    size = stream_array_size(topo, ratio)
+    test.build_system.cppflags = [f'-DSTREAM_ARRAY_SIZE={size}']
+    footprint = 3 * 8 * size
+    if footprint >= 2 * 1024**3 and topo.platform == 'x86_64':
+        # Static arrays beyond 2 GiB need the medium code model, which the
+        # static Intel runtime libraries are not built for
+        flags = ['-mcmodel=medium']
+        if test.current_environ.name.startswith('intel'):
+            flags.append('-shared-intel')
+
+        test.build_system.cflags = test.build_system.cflags + flags
+
+    # The arrays plus 10% and some slack for the runtime
+    return f'{int(footprint * 1.1) // 1024**2 + 512}M'
+
+
+def apply(test, kind, num_nodes=None):
+    '''Size ``test`` for the nodes of its current partition.
+
+    :arg kind: the kind of the benchmark, one of :data:`KINDS`.
+    :arg num_nodes: if set, ``num_tasks`` is set to fill that many nodes.
+    :returns: the :class:`Sizing` applied.
+    '''
+
+    ret = sizing(load(test.current_partition), kind)
+    test.num_tasks_per_node = ret.num_tasks_per_node
+    test.num_cpus_per_task = ret.num_cpus_per_task
+    if num_nodes:
+        test.num_tasks = num_nodes * ret.num_tasks_per_node
+
+    test.env_vars = dict(test.env_vars,
+                         **{k: str(v) for k, v in ret.env_vars.items()})
+    return ret
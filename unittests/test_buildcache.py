@@ -0,0 +1,28 @@
+# Copyright 2021 FAS Research Computing Harvard University
+# ReFrame Project Developers. See the top-level LICENSE file for details.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+import os
+import types
+
+import fasrclib.buildcache as buildcache
+
+
+def test_sources_key_follows_symlinked_dirs(tmp_path):
+    # Laid out as the GPU checks, which share Xdevice through a symlink
+    xdevice = tmp_path / 'Xdevice'
+    xdevice.mkdir()
+    (xdevice / 'blas.hpp').write_text('#pragma once\n')
+    src = tmp_path / 'shmem' / 'src'
+    src.mkdir(parents=True)
+    (src / 'shmem.cu').write_text('#include "Xdevice/blas.hpp"\n')
+    os.symlink(os.path.join('..', '..', 'Xdevice'), src / 'Xdevice')
+
+    test = types.SimpleNamespace(prefix=str(tmp_path / 'shmem'),
+                                 sourcesdir='src')
+    key = buildcache.sources_key(test)
+    with open(xdevice / 'blas.hpp', 'a') as fp:
+        fp.write('// changed\n')
+
+    assert buildcache.sources_key(test) != key